@@ -0,0 +1,62 @@
+# ------------------------------------------------------------
+# ewlc
+#
+# The extended WHILE language compiler as a library
+#
+#   import ewlc
+#   ast = ewlc.parse(code)
+#   cfg = ewlc.lower(ast)
+#   summaries = ewlc.analyze(cfg)
+#
+# Importing the package loads none of its modules (nor PLY or SymPy): every
+# while_* module is imported the first time it is used, as ewlc.while_cfg
+# and so on, and the functions below import what they need when called
+# ------------------------------------------------------------
+import importlib, threading
+
+__all__ = ['parse', 'lower', 'analyze', 'parser', 'scope']
+
+MODULES = ('while_analysis', 'while_ast', 'while_bench', 'while_cache', 'while_calls', 'while_cfg', 'while_cost',
+           'while_diff', 'while_exec', 'while_expr', 'while_fuzz', 'while_interval', 'while_lexer', 'while_opt',
+           'while_parser', 'while_profile', 'while_search', 'while_ssa', 'while_structure', 'while_unit', 'while_unparser')
+
+def __getattr__(name):
+  if name not in MODULES: raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+  return importlib.import_module('.' + name, __name__)
+
+def __dir__():
+  return sorted(set(globals()) | set(MODULES))
+
+# The parser every thread shares (each parse runs in a session of its own),
+# built on first use
+PARSER, LOCK = None, threading.Lock()
+def parser():
+  global PARSER
+  with LOCK:
+    if PARSER is None: PARSER = __getattr__('while_parser').WhileParser()
+  return PARSER
+
+# The AST of a function, raising ParsingError at its first error, or with
+# recover set the AST of what could be parsed and every error as (line,
+# ParsingError) pairs. Safe to call from many threads at once
+def parse(code, recover=False):
+  return parser().recover(code) if recover else parser().parse(code)
+
+# The control flow graph of a function, from its AST or its text
+def lower(ast):
+  return __getattr__('while_cfg').construct_cfg(parse(ast) if isinstance(ast, str) else ast)
+
+# The summary of every loop of a function (from its text, AST or graph) by
+# the label of its header, as while_analysis.analyze gives them; nothing is
+# printed or drawn unless log is given. The graph is compressed in place
+def analyze(target, cache=None, calls=None, budget=None, log=None):
+  cfg = target if isinstance(target, __getattr__('while_cfg').Graph) else lower(target)
+  return __getattr__('while_analysis').analyze(cfg, cache, calls, budget, log or (lambda *args : None), draw=False)
+
+# Expressions live in one table shared by every analysis, which only grows;
+# a caller that keeps running scopes each piece of work so that what it made
+# is dropped at the end, and must not use any of it afterwards
+#
+#   with ewlc.scope(): summaries = ewlc.analyze(code)
+def scope():
+  return __getattr__('while_expr').scope()
@@ -1,44 +1,245 @@
-import argparse
+import argparse, importlib, os, sys
+
+# The modules an option needs are imported once it is given, from the
+# package when run as python -m ewlc and from this directory otherwise
+def load(name):
+  return importlib.import_module(('.' if __package__ else '') + name, __package__ or None)
+
+# Everything the command line reports is cited as file:line:col
+def cite(file, line, col=None):
+  return f"{file}:{line}" + (f":{col}" if col else "")
+
+# ewlc diff OLD NEW compares the loops of two versions of a program, or of
+# every .ewl file that two folders share
+if sys.argv[1:2] == ["diff"]:
+  differ = argparse.ArgumentParser(prog=f"{os.path.basename(sys.argv[0])} diff",
+                                   description="Compare the loops of two versions of an eWL program")
+  differ.add_argument("old", help="The old version of a .ewl file, or a folder of them")
+  differ.add_argument("new", help="The new version of the .ewl file, or a folder of them")
+  differ.add_argument("--cache", dest="cache", default=None,
+                      help="A file that keeps loop summaries between runs, as with --analyze.")
+  args = differ.parse_args(sys.argv[2:])
+  if os.path.isdir(args.old) and os.path.isdir(args.new):
+    names = [sorted(f for f in os.listdir(folder) if f.endswith(".ewl")) for folder in (args.old, args.new)]
+    for name in sorted(set(names[0]) ^ set(names[1])):
+      print(f"Only in {args.old if name in names[0] else args.new}: {name}")
+    pairs = [(os.path.join(args.old, f), os.path.join(args.new, f)) for f in names[0] if f in names[1]]
+  else: pairs = [(args.old, args.new)]
+  cache = load("while_cache").SummaryCache(args.cache)
+  failed = False
+  for old, new in pairs:
+    changes = load("while_diff").diff(old, new, cache)
+    if changes.changes or changes.errors:
+      print(f"Comparing {old} with {new}:\n")
+      print(changes.report())
+      print()
+    for file, line, error in changes.errors:
+      print(f"{cite(file, line, error.col)}: {type(error).__name__}: {error}")
+    failed = failed or bool(changes.regressed() or changes.errors)
+  cache.save()
+  print(cache.report())
+  sys.exit(1 if failed else 0)
+
 parser = argparse.ArgumentParser(description="Extended While Language Parser and Analyzer")
-parser.add_argument("file", help="A .ewl file to be parsed")
+parser.add_argument("file", nargs="+", help="A .ewl file to be parsed (or several with --check)")
+parser.add_argument("--check", dest="check", action="store_true",
+                    help="Only check that the files parse, printing every error and exiting with 1 if there are any.")
 parser.add_argument("-a", "--ast", dest="ast", action="store_true",
                     help="Generate the abstract syntax tree for the eWL program.")
 parser.add_argument("-c", "--cfg", dest="cfg", action="store_true",
                     help="Generate the control flow graph for the eWL program.")
 parser.add_argument("-z", "--analyze", dest="analyze", action="store_true",
                     help="Analyze the eWL program's recursive structure.")
+parser.add_argument("-i", "--intervals", dest="intervals", action="store_true",
+                    help="Bound the range of every variable at each label of the eWL program.")
+parser.add_argument("--cache", dest="cache", default=None,
+                    help="A file that keeps loop summaries between runs of --analyze.")
+parser.add_argument("-O", "--optimize", dest="optimize", action="store_true",
+                    help="Optimize the control flow graph before printing or analyzing it.")
+parser.add_argument("--passes", dest="passes", default="fold,copy,prune,dce",
+                    help="Comma separated optimization passes to run with --optimize.")
+parser.add_argument("--max-states", dest="max_states", type=int, default=64,
+                    help="Merge the states tracked at a label once --analyze reaches this many.")
+parser.add_argument("--max-seconds", dest="max_seconds", type=float, default=None,
+                    help="Stop analyzing a function with --analyze after this many seconds.")
+parser.add_argument("--cost", dest="cost", action="store_true",
+                    help="Count what each function costs in a new last output and bound it.")
+parser.add_argument("--cost-model", dest="cost_model", default="assign=1,cond=1,iteration=1",
+                    help="Comma separated weights of assign, cond, iteration and operators (+,-,*,/,<,>,==,call) for --cost.")
+parser.add_argument("--search", dest="search", type=int, default=None, metavar="BOUND",
+                    help="Search for the inputs in [-BOUND, BOUND] that make each function take the most steps.")
+parser.add_argument("--rounds", dest="rounds", type=int, default=20,
+                    help="Rounds of mutation that --search runs.")
+parser.add_argument("--fuel", dest="fuel", type=int, default=100000,
+                    help="Steps a run of --search may take before it is stopped.")
+parser.add_argument("--workers", dest="workers", type=int, default=None,
+                    help="Processes that --search runs inputs on (one per core by default).")
+parser.add_argument("--max-size", dest="max_size", type=int, default=256,
+                    help="Treat expressions with more operations than this as unbounded.")
+parser.add_argument("--profile", dest="profile", default=None, metavar="FILE",
+                    help="With --inputs, save how often each label and edge runs to FILE, otherwise read them from it; --cfg draws them over the graph.")
+parser.add_argument("--inputs", dest="inputs", default=None,
+                    help="Semicolon separated input tuples to run each function of matching arity on for --profile, e.g. '1 5; 2 100'.")
+parser.add_argument("--top", dest="top", type=int, default=5,
+                    help="Hottest loops that --profile reports.")
+parser.add_argument("--accelerate", dest="accelerate", action="store_true",
+                    help="Run loops of affine updates in closed form in --search and --profile.")
 
 args = parser.parse_args()
-eWL = args.file
-with open(eWL, 'r') as file:
-  code = file.read()
+
+# Checking runs the lexer and parser alone, so nothing past them is imported
+if args.check:
+  parse_unit = load('while_unit').parse_unit
+  WhileChecker = load('while_parser').WhileChecker
+  checker, failed = WhileChecker(), False
+  for eWL in args.file:
+    for line, error in parse_unit(eWL).check(checker):
+      print(f"{cite(eWL, line, error.col)}: {error}")
+      failed = True
+  sys.exit(1 if failed else 0)
+if len(args.file) > 1: parser.error("only --check takes more than one file")
+
+eWL = args.file[0]
 cmd_ast = args.ast
 cmd_cfg = args.cfg
 cmd_analyze = args.analyze
+cmd_optimize = args.optimize
 
-from while_parser import WhileParser
-from while_cfg import construct_cfg, visualize_cfg
-from while_analysis import analyze
+parse_unit = load('while_unit').parse_unit
+construct_cfg = load('while_cfg').construct_cfg
+calls = load('while_calls').CallGraph()
+cache = load('while_cache').SummaryCache(args.cache) if args.cache else None
+if args.cost:
+  cost = load('while_cost')
+  try: model = cost.CostModel.parse(args.cost_model)
+  except ValueError as e: parser.error(str(e))
 
-parser = WhileParser()
-ast = parser.parse(code)
-cfg = construct_cfg(ast)
+# Profiles are recorded on the graphs as printed and analyzed, so they are
+# keyed on the function and the passes run over it
+profiles, recorded = {}, []
+if args.profile:
+  profiling = load('while_profile')
+  try:
+    runs = [tuple(map(int, run.split())) for run in args.inputs.split(';')] if args.inputs is not None else None
+    if runs is None: profiles = profiling.load(args.profile)
+  except (OSError, ValueError) as e: parser.error(str(e))
 
-if cmd_ast:
-  print(f"The Abstract Syntax Tree for {eWL} is:\n")
-  print(ast)
-  print()
+def process(count, ast):
+  name = eWL if count == 0 else f"{eWL} ({ast.node.fun})"
+  png = "cfg.png" if count == 0 else f"cfg_{ast.node.fun}.png"
+  cfg = construct_cfg(ast)
+  cfg.source = eWL
 
-if cmd_cfg:
-  print(f"The bytecode for {eWL} is:\n")
-  print(cfg)
-  visualize_cfg(cfg, "cfg.png")
-  print()
-  print(f"The control flow graph is stored in cfg.png")
-  print()
+  if cmd_optimize:
+    optimize = load('while_opt').optimize
+    manager = optimize(cfg, args.passes.split(','), out=ast.node.out)
+    print(f"Optimization passes for {name}:\n")
+    print(manager.summary())
+    print()
+
+  profile, hot = None, []
+  if args.profile:
+    key = calls.key(ast.node.fun) + (f" {args.passes}" if cmd_optimize else "")
+    if runs is not None:
+      arity = len(ast.node.inp)
+      profile = profiling.record(ast, cfg, [run for run in runs if len(run) == arity], calls, args.fuel,
+                                 accelerate=args.accelerate, key=key)
+      recorded.append(profile)
+    elif ast.node.fun in profiles:
+      profile = profiles[ast.node.fun]
+      if not profile.fits(cfg, key):
+        print(f"The profile of {name} in {args.profile} is of another version of it, so it is ignored.\n")
+        profile = None
+  if profile is not None:
+    print(f"The execution profile of {name} over {profile.runs} runs ({profile.failed} failed) is:\n")
+    print(f"  {profile.steps()} steps")
+    for line in profile.summary(cfg, args.top): print(f"  {line}")
+    print()
+    hot = [(cfg.index(h)+1, steps) for h, _, steps in profile.hottest(cfg, args.top)]
 
-if cmd_analyze:
-  print(f"Recursive structure analysis for {eWL} is:\n")
-  analyze(cfg)
+  if cmd_ast:
+    print(f"The Abstract Syntax Tree for {name} is:\n")
+    print(ast)
+    print()
+
+  if cmd_cfg:
+    print(f"The bytecode for {name} is:\n")
+    print(cfg)
+    load('while_cfg').visualize_cfg(cfg, png, profile.heat(cfg, args.top) if profile is not None else None)
+    print()
+    print(f"The control flow graph is stored in {png}")
+    print()
+
+  if args.intervals:
+    intervals = load('while_interval').intervals
+    ranges = intervals(cfg, calls=calls)
+    print(f"Variable ranges for {name} are:\n")
+    places = [cfg.cite(u) for u in cfg]
+    width = max(map(len, places))
+    for i, u in enumerate(cfg):
+      env, place = ranges.env.get(u), places[i]
+      if env is None: print(f"  {i+1:>3}  {place:<{width}} unreachable"); continue
+      bounds = ", ".join(f"{k} in {v}" for k, v in sorted(env.items(), key=str))
+      print(f"  {i+1:>3}  {place:<{width}} {bounds if bounds else 'unbounded'}")
+    for h, trips in ranges.trips.items():
+      if trips is not None: print(f"  The loop at label {cfg.index(h)+1} ({cfg.cite(h)}) runs for at most {trips} iterations")
+    print()
+
+  if args.cost:
+    intervals = load('while_interval').intervals
+    bound = intervals(cfg, calls=calls).range(cfg[-1], ast.node.out[-1])
+    print(f"The cost of {name} is in {bound}")
+    print()
+
+  if args.search is not None:
+    Search = load('while_search').Search
+    finder = Search(calls, ast.node.fun, args.search, args.workers, args.fuel, cfg=cfg,
+                    passes=args.passes.split(',') if cmd_optimize else (), accelerate=args.accelerate)
+    best = finder.run(args.rounds)
+    print(f"The slowest inputs found for {name} with every input in [-{args.search}, {args.search}] are:\n")
+    print(f"  {best.inputs} taking {best.steps} steps" + (f" ({best.error})" if best.error else ""))
+    print(f"  {len(finder.covered)} of {finder.branches} branches were covered in {finder.runs} runs")
+    for label, count in sorted(best.loops.items()):
+      print(f"  The loop at label {label} ({finder.cfg.cite(finder.cfg[label-1])}) ran {count} iterations")
+    print()
+
+  if cmd_analyze:
+    print(f"Recursive structure analysis for {name} is:\n")
+    analysis = load('while_analysis')
+    summaries = analysis.analyze(cfg, cache, calls, analysis.Budget(args.max_states, args.max_seconds, args.max_size))
+    print()
+    # What the analysis found for the loops that take the most steps
+    for label, steps in hot:
+      summary = summaries.get(label, {"breaks" : []})
+      found = (f"at most {summary['trips']} iterations" if "trips" in summary else
+               f"breakpoints at labels {summary['breaks']}" if summary["breaks"] else "no breakpoints")
+      print(f"  The loop at label {label} takes {100 * steps / (profile.steps() or 1):.1f}% of the steps and has {found}")
+    if hot: print()
+    print(f"The steps in compressing the control flow graph is stored in cfg_<label>.png")
+
+# A file may hold many functions; they are parsed and processed one at a
+# time, resolving calls and summarizing callees as they are first needed. A
+# function that calls one defined further down waits for the end of the file
+unit, waiting = parse_unit(eWL), []
+for count, ast in enumerate(unit):
+  if args.cost:
+    try: ast = cost.instrument(ast, model)
+    except ValueError as e: parser.error(str(e))
+  if not calls.add(ast): continue
+  if calls.ready(ast.node.fun): process(count, ast)
+  else: waiting.append((count, ast))
+calls.close()
+for count, ast in waiting: process(count, ast)
+
+if recorded:
+  profiling.save(recorded, args.profile)
+  print(f"The execution profile is stored in {args.profile}")
   print()
-  print(f"The steps in compressing the control flow graph is stored in cfg_<label>.png")
\ No newline at end of file
+
+if cmd_analyze and len(calls.defs) > 1:
+  print(calls.report())
+
+errors = sorted(unit.errors + calls.errors, key=lambda e : e[0])
+for line, error in errors:
+  print(f"{cite(eWL, line, error.col)}: {type(error).__name__}: {error}")
+if errors: sys.exit(1)
@@ -6,9 +6,9 @@ _tabversion = '3.10'
 
 _lr_method = 'LALR'
 
-_lr_signature = 'ASSIGN BOOL BREAK CONTINUE DEF DIVIDE ELLIPSES ELSE EQUALS FOR GREATER ID IF IN LBRACK LCURLY LESS LPAREN MINUS NUMBER PLUS RBRACK RCURLY RPAREN SEMICOLON SKIP TIMES TO WHILEprog : DEF ID LPAREN vars RPAREN TO LPAREN _begin_scope vars _end_scope RPAREN bodyvars :vars : var varsbody : LCURLY _begin_scope exp _end_scope RCURLY_begin_scope :_end_scope :exp :\n           | stmtexp : ctrl exp\n           | stmt SEMICOLON expstmt : SKIP\n            | var ASSIGN aexpstmt : BREAK\n            | CONTINUEctrl : IF bexp body\n            | IF bexp body ELSE bodyctrl : WHILE bexp _begin_loop body _end_loop\n            | FOR idx IN LBRACK aexp ELLIPSES aexp RBRACK _push_idx _begin_loop body _end_loop _pop_idx_begin_loop :_end_loop :idx : new_var_pop_idx :_push_idx :aexp : term\n            | aexp PLUS term\n            | aexp MINUS termterm : fact\n            | term TIMES fact\n            | term DIVIDE factfact : old_var\n            | num\n            | MINUS aexp\n            | LPAREN aexp RPARENnum : NUMBERbexp : BOOL\n            | aexp rel aexprel : EQUALS\n           | LESS\n           | GREATERvar : IDnew_var : IDold_var : ID'
+_lr_signature = 'ASSIGN BOOL BREAK CONTINUE DEF DIVIDE ELLIPSES ELSE EQUALS FOR GREATER ID IF IN LBRACK LCURLY LESS LPAREN MINUS NUMBER PLUS RBRACK RCURLY RPAREN SEMICOLON SKIP TIMES TO WHILEprog : DEF ID LPAREN vars RPAREN TO LPAREN _begin_scope vars _end_scope RPAREN bodyprog : DEF error bodyvars :vars : var varsbody : LCURLY _begin_scope exp _end_scope RCURLY_begin_scope :_end_scope :exp :\n           | stmtexp : ctrl exp\n           | stmt SEMICOLON expstmt : SKIP\n            | var ASSIGN aexpstmt : BREAK\n            | CONTINUEstmt : errorctrl : IF error body\n            | IF error body ELSE body\n            | WHILE error body\n            | FOR error body\n            | FOR idx IN LBRACK error RBRACK _push_idx _begin_loop body _end_loop _pop_idxctrl : IF bexp body\n            | IF bexp body ELSE bodyctrl : WHILE bexp _begin_loop body _end_loop\n            | FOR idx IN LBRACK aexp ELLIPSES aexp RBRACK _push_idx _begin_loop body _end_loop _pop_idx_begin_loop :_end_loop :idx : new_var_pop_idx :_push_idx :aexp : term\n            | aexp PLUS term\n            | aexp MINUS termterm : fact\n            | term TIMES fact\n            | term DIVIDE factfact : old_var\n            | num\n            | MINUS aexp\n            | LPAREN aexp RPARENfact : ID LPAREN args RPARENargs :\n            | arg argsarg : old_var\n           | num\n           | LPAREN aexp RPARENnum : NUMBERbexp : BOOL\n            | aexp rel aexprel : EQUALS\n           | LESS\n           | GREATERvar : IDnew_var : IDold_var : ID'
     
-_lr_action_items = {'DEF':([0,],[2,]),'$end':([1,16,48,],[0,-1,-4,]),'ID':([2,4,5,7,11,12,17,18,21,26,27,28,30,32,37,41,48,51,52,53,54,55,56,57,58,59,71,72,73,74,76,81,82,83,],[3,5,-40,5,-5,5,-5,5,5,42,42,47,5,42,42,42,-4,-15,42,42,42,-37,-38,-39,42,42,-20,42,-16,-17,42,-20,-22,-18,]),'LPAREN':([3,10,26,27,32,37,41,52,53,54,55,56,57,58,59,72,76,],[4,11,41,41,41,41,41,41,41,41,-37,-38,-39,41,41,41,41,]),'RPAREN':([4,5,6,7,9,11,12,13,14,36,38,39,40,42,43,60,61,66,67,68,69,70,],[-2,-40,8,-2,-3,-5,-2,-6,15,-24,-27,-30,-31,-42,-34,-32,70,-25,-26,-28,-29,-33,]),'ASSIGN':([5,23,],[-40,32,]),'TO':([8,],[10,]),'LCURLY':([15,33,34,36,38,39,40,42,43,44,60,62,64,65,66,67,68,69,70,78,79,80,],[17,17,-35,-24,-27,-30,-31,-42,-34,-19,-32,17,17,-36,-25,-26,-28,-29,-33,-23,-19,17,]),'SKIP':([17,18,21,30,48,51,71,73,74,81,82,83,],[-5,22,22,22,-4,-15,-20,-16,-17,-20,-22,-18,]),'BREAK':([17,18,21,30,48,51,71,73,74,81,82,83,],[-5,24,24,24,-4,-15,-20,-16,-17,-20,-22,-18,]),'CONTINUE':([17,18,21,30,48,51,71,73,74,81,82,83,],[-5,25,25,25,-4,-15,-20,-16,-17,-20,-22,-18,]),'IF':([17,18,21,30,48,51,71,73,74,81,82,83,],[-5,26,26,26,-4,-15,-20,-16,-17,-20,-22,-18,]),'WHILE':([17,18,21,30,48,51,71,73,74,81,82,83,],[-5,27,27,27,-4,-15,-20,-16,-17,-20,-22,-18,]),'FOR':([17,18,21,30,48,51,71,73,74,81,82,83,],[-5,28,28,28,-4,-15,-20,-16,-17,-20,-22,-18,]),'RCURLY':([17,18,19,20,21,22,24,25,29,30,31,36,38,39,40,42,43,48,49,50,51,60,66,67,68,69,70,71,73,74,81,82,83,],[-5,-7,-6,-8,-7,-11,-13,-14,48,-7,-9,-24,-27,-30,-31,-42,-34,-4,-10,-12,-15,-32,-25,-26,-28,-29,-33,-20,-16,-17,-20,-22,-18,]),'SEMICOLON':([20,22,24,25,36,38,39,40,42,43,50,60,66,67,68,69,70,],[30,-11,-13,-14,-24,-27,-30,-31,-42,-34,-12,-32,-25,-26,-28,-29,-33,]),'BOOL':([26,27,],[34,34,]),'MINUS':([26,27,32,35,36,37,38,39,40,41,42,43,50,52,53,54,55,56,57,58,59,60,61,65,66,67,68,69,70,72,75,76,77,],[37,37,37,54,-24,37,-27,-30,-31,37,-42,-34,54,37,37,37,-37,-38,-39,37,37,54,54,54,-25,-26,-28,-29,-33,37,54,37,54,]),'NUMBER':([26,27,32,37,41,52,53,54,55,56,57,58,59,72,76,],[43,43,43,43,43,43,43,43,-37,-38,-39,43,43,43,43,]),'PLUS':([35,36,38,39,40,42,43,50,60,61,65,66,67,68,69,70,75,77,],[53,-24,-27,-30,-31,-42,-34,53,53,53,53,-25,-26,-28,-29,-33,53,53,]),'EQUALS':([35,36,38,39,40,42,43,60,66,67,68,69,70,],[55,-24,-27,-30,-31,-42,-34,-32,-25,-26,-28,-29,-33,]),'LESS':([35,36,38,39,40,42,43,60,66,67,68,69,70,],[56,-24,-27,-30,-31,-42,-34,-32,-25,-26,-28,-29,-33,]),'GREATER':([35,36,38,39,40,42,43,60,66,67,68,69,70,],[57,-24,-27,-30,-31,-42,-34,-32,-25,-26,-28,-29,-33,]),'TIMES':([36,38,39,40,42,43,60,66,67,68,69,70,],[58,-27,-30,-31,-42,-34,-32,58,58,-28,-29,-33,]),'DIVIDE':([36,38,39,40,42,43,60,66,67,68,69,70,],[59,-27,-30,-31,-42,-34,-32,59,59,-28,-29,-33,]),'ELLIPSES':([36,38,39,40,42,43,60,66,67,68,69,70,75,],[-24,-27,-30,-31,-42,-34,-32,-25,-26,-28,-29,-33,76,]),'RBRACK':([36,38,39,40,42,43,60,66,67,68,69,70,77,],[-24,-27,-30,-31,-42,-34,-32,-25,-26,-28,-29,-33,78,]),'IN':([45,46,47,],[63,-21,-41,]),'ELSE':([48,51,],[-4,64,]),'LBRACK':([63,],[72,]),}
+_lr_action_items = {'DEF':([0,],[2,]),'$end':([1,6,49,102,],[0,-2,-5,-1,]),'ID':([2,5,7,8,10,11,16,22,23,24,27,29,35,39,41,48,49,52,53,54,55,56,57,58,59,60,61,64,65,67,69,78,79,81,82,83,84,85,87,88,92,96,98,105,107,109,110,111,112,],[3,8,-6,-53,8,8,8,40,40,47,8,40,40,40,-47,-6,-5,-17,-22,40,40,40,-50,-51,-52,40,40,78,-19,-20,8,-55,40,78,-44,-45,-27,40,-18,-23,-24,-46,40,-27,-29,-21,-27,-29,-25,]),'error':([2,7,11,16,22,23,24,27,49,52,53,65,67,84,85,87,88,92,105,107,109,110,111,112,],[4,-6,21,21,30,42,44,21,-5,-17,-22,-19,-20,-27,93,-18,-23,-24,-27,-29,-21,-27,-29,-25,]),'LPAREN':([3,22,23,25,29,35,39,40,41,54,55,56,57,58,59,60,61,64,78,79,81,82,83,85,96,98,],[5,39,39,48,39,39,39,64,-47,39,39,39,-50,-51,-52,39,39,79,-55,39,79,-44,-45,39,-46,39,]),'LCURLY':([4,30,31,32,34,36,37,38,40,41,42,43,44,62,66,70,71,72,73,74,75,76,77,90,97,99,100,103,104,106,108,],[7,7,7,-48,-31,-34,-37,-38,-55,-47,7,-26,7,-39,7,7,7,-49,-32,-33,-35,-36,-40,-41,-30,7,-26,7,-30,-26,7,]),'RPAREN':([5,8,9,10,13,34,36,37,38,40,41,48,62,63,64,69,73,74,75,76,77,78,80,81,82,83,86,89,90,91,95,96,],[-3,-53,12,-3,-4,-31,-34,-37,-38,-55,-47,-6,-39,77,-42,-3,-32,-33,-35,-36,-40,-55,90,-42,-44,-45,-7,96,-41,-43,99,-46,]),'SKIP':([7,11,16,27,49,52,53,65,67,84,87,88,92,105,107,109,110,111,112,],[-6,17,17,17,-5,-17,-22,-19,-20,-27,-18,-23,-24,-27,-29,-21,-27,-29,-25,]),'BREAK':([7,11,16,27,49,52,53,65,67,84,87,88,92,105,107,109,110,111,112,],[-6,19,19,19,-5,-17,-22,-19,-20,-27,-18,-23,-24,-27,-29,-21,-27,-29,-25,]),'CONTINUE':([7,11,16,27,49,52,53,65,67,84,87,88,92,105,107,109,110,111,112,],[-6,20,20,20,-5,-17,-22,-19,-20,-27,-18,-23,-24,-27,-29,-21,-27,-29,-25,]),'IF':([7,11,16,27,49,52,53,65,67,84,87,88,92,105,107,109,110,111,112,],[-6,22,22,22,-5,-17,-22,-19,-20,-27,-18,-23,-24,-27,-29,-21,-27,-29,-25,]),'WHILE':([7,11,16,27,49,52,53,65,67,84,87,88,92,105,107,109,110,111,112,],[-6,23,23,23,-5,-17,-22,-19,-20,-27,-18,-23,-24,-27,-29,-21,-27,-29,-25,]),'FOR':([7,11,16,27,49,52,53,65,67,84,87,88,92,105,107,109,110,111,112,],[-6,24,24,24,-5,-17,-22,-19,-20,-27,-18,-23,-24,-27,-29,-21,-27,-29,-25,]),'RCURLY':([7,11,14,15,16,17,19,20,21,26,27,28,34,36,37,38,40,41,49,50,51,52,53,62,65,67,73,74,75,76,77,84,87,88,90,92,105,107,109,110,111,112,],[-6,-8,-7,-9,-8,-12,-14,-15,-16,49,-8,-10,-31,-34,-37,-38,-55,-47,-5,-11,-13,-17,-22,-39,-19,-20,-32,-33,-35,-36,-40,-27,-18,-23,-41,-24,-27,-29,-21,-27,-29,-25,]),'ASSIGN':([8,18,],[-53,29,]),'TO':([12,],[25,]),'SEMICOLON':([15,17,19,20,21,34,36,37,38,40,41,51,62,73,74,75,76,77,90,],[27,-12,-14,-15,-16,-31,-34,-37,-38,-55,-47,-13,-39,-32,-33,-35,-36,-40,-41,]),'BOOL':([22,23,],[32,32,]),'MINUS':([22,23,29,33,34,35,36,37,38,39,40,41,51,54,55,56,57,58,59,60,61,62,63,72,73,74,75,76,77,79,85,89,90,94,98,101,],[35,35,35,56,-31,35,-34,-37,-38,35,-55,-47,56,35,35,35,-50,-51,-52,35,35,56,56,56,-32,-33,-35,-36,-40,35,35,56,-41,56,35,56,]),'NUMBER':([22,23,29,35,39,41,54,55,56,57,58,59,60,61,64,78,79,81,82,83,85,96,98,],[41,41,41,41,41,-47,41,41,41,-50,-51,-52,41,41,41,-55,41,41,-44,-45,41,-46,41,]),'PLUS':([33,34,36,37,38,40,41,51,62,63,72,73,74,75,76,77,89,90,94,101,],[55,-31,-34,-37,-38,-55,-47,55,55,55,55,-32,-33,-35,-36,-40,55,-41,55,55,]),'EQUALS':([33,34,36,37,38,40,41,62,73,74,75,76,77,90,],[57,-31,-34,-37,-38,-55,-47,-39,-32,-33,-35,-36,-40,-41,]),'LESS':([33,34,36,37,38,40,41,62,73,74,75,76,77,90,],[58,-31,-34,-37,-38,-55,-47,-39,-32,-33,-35,-36,-40,-41,]),'GREATER':([33,34,36,37,38,40,41,62,73,74,75,76,77,90,],[59,-31,-34,-37,-38,-55,-47,-39,-32,-33,-35,-36,-40,-41,]),'TIMES':([34,36,37,38,40,41,62,73,74,75,76,77,90,],[60,-34,-37,-38,-55,-47,-39,60,60,-35,-36,-40,-41,]),'DIVIDE':([34,36,37,38,40,41,62,73,74,75,76,77,90,],[61,-34,-37,-38,-55,-47,-39,61,61,-35,-36,-40,-41,]),'ELLIPSES':([34,36,37,38,40,41,62,73,74,75,76,77,90,94,],[-31,-34,-37,-38,-55,-47,-39,-32,-33,-35,-36,-40,-41,98,]),'RBRACK':([34,36,37,38,40,41,62,73,74,75,76,77,90,93,101,],[-31,-34,-37,-38,-55,-47,-39,-32,-33,-35,-36,-40,-41,97,104,]),'IN':([45,46,47,],[68,-28,-54,]),'ELSE':([49,52,53,],[-5,70,71,]),'LBRACK':([68,],[85,]),}
 
 _lr_action = {}
 for _k, _v in _lr_action_items.items():
@@ -17,7 +17,7 @@ for _k, _v in _lr_action_items.items():
       _lr_action[_x][_k] = _y
 del _lr_action_items
 
-_lr_goto_items = {'prog':([0,],[1,]),'vars':([4,7,12,],[6,9,13,]),'var':([4,7,12,18,21,30,],[7,7,7,23,23,23,]),'_begin_scope':([11,17,],[12,18,]),'_end_scope':([13,19,],[14,29,]),'body':([15,33,62,64,80,],[16,51,71,73,81,]),'exp':([18,21,30,],[19,31,49,]),'stmt':([18,21,30,],[20,20,20,]),'ctrl':([18,21,30,],[21,21,21,]),'bexp':([26,27,],[33,44,]),'aexp':([26,27,32,37,41,52,72,76,],[35,35,50,60,61,65,75,77,]),'term':([26,27,32,37,41,52,53,54,72,76,],[36,36,36,36,36,36,66,67,36,36,]),'fact':([26,27,32,37,41,52,53,54,58,59,72,76,],[38,38,38,38,38,38,38,38,68,69,38,38,]),'old_var':([26,27,32,37,41,52,53,54,58,59,72,76,],[39,39,39,39,39,39,39,39,39,39,39,39,]),'num':([26,27,32,37,41,52,53,54,58,59,72,76,],[40,40,40,40,40,40,40,40,40,40,40,40,]),'idx':([28,],[45,]),'new_var':([28,],[46,]),'rel':([35,],[52,]),'_begin_loop':([44,79,],[62,80,]),'_end_loop':([71,81,],[74,82,]),'_push_idx':([78,],[79,]),'_pop_idx':([82,],[83,]),}
+_lr_goto_items = {'prog':([0,],[1,]),'body':([4,30,31,42,44,66,70,71,99,103,108,],[6,52,53,65,67,84,87,88,102,105,110,]),'vars':([5,10,69,],[9,13,86,]),'var':([5,10,11,16,27,69,],[10,10,18,18,18,10,]),'_begin_scope':([7,48,],[11,69,]),'exp':([11,16,27,],[14,28,50,]),'stmt':([11,16,27,],[15,15,15,]),'ctrl':([11,16,27,],[16,16,16,]),'_end_scope':([14,86,],[26,95,]),'bexp':([22,23,],[31,43,]),'aexp':([22,23,29,35,39,54,79,85,98,],[33,33,51,62,63,72,89,94,101,]),'term':([22,23,29,35,39,54,55,56,79,85,98,],[34,34,34,34,34,34,73,74,34,34,34,]),'fact':([22,23,29,35,39,54,55,56,60,61,79,85,98,],[36,36,36,36,36,36,36,36,75,76,36,36,36,]),'old_var':([22,23,29,35,39,54,55,56,60,61,64,79,81,85,98,],[37,37,37,37,37,37,37,37,37,37,82,37,82,37,37,]),'num':([22,23,29,35,39,54,55,56,60,61,64,79,81,85,98,],[38,38,38,38,38,38,38,38,38,38,83,38,83,38,38,]),'idx':([24,],[45,]),'new_var':([24,],[46,]),'rel':([33,],[54,]),'_begin_loop':([43,100,106,],[66,103,108,]),'args':([64,81,],[80,91,]),'arg':([64,81,],[81,81,]),'_end_loop':([84,105,110,],[92,107,111,]),'_push_idx':([97,104,],[100,106,]),'_pop_idx':([107,111,],[109,112,]),}
 
 _lr_goto = {}
 for _k, _v in _lr_goto_items.items():
@@ -27,46 +27,59 @@ for _k, _v in _lr_goto_items.items():
 del _lr_goto_items
 _lr_productions = [
   ("S' -> prog","S'",1,None,None,None),
-  ('prog -> DEF ID LPAREN vars RPAREN TO LPAREN _begin_scope vars _end_scope RPAREN body','prog',12,'p_prog','while_parser.py',32),
-  ('vars -> <empty>','vars',0,'p_vars','while_parser.py',42),
-  ('vars -> var vars','vars',2,'p_vars_chain','while_parser.py',46),
-  ('body -> LCURLY _begin_scope exp _end_scope RCURLY','body',5,'p_body','while_parser.py',55),
-  ('_begin_scope -> <empty>','_begin_scope',0,'p__begin_scope','while_parser.py',59),
-  ('_end_scope -> <empty>','_end_scope',0,'p__end_scope','while_parser.py',63),
-  ('exp -> <empty>','exp',0,'p_exp','while_parser.py',69),
-  ('exp -> stmt','exp',1,'p_exp','while_parser.py',70),
-  ('exp -> ctrl exp','exp',2,'p_exp_chain','while_parser.py',74),
-  ('exp -> stmt SEMICOLON exp','exp',3,'p_exp_chain','while_parser.py',75),
-  ('stmt -> SKIP','stmt',1,'p_stmt','while_parser.py',82),
-  ('stmt -> var ASSIGN aexp','stmt',3,'p_stmt','while_parser.py',83),
-  ('stmt -> BREAK','stmt',1,'p_stmt_jump','while_parser.py',87),
-  ('stmt -> CONTINUE','stmt',1,'p_stmt_jump','while_parser.py',88),
-  ('ctrl -> IF bexp body','ctrl',3,'p_ctrl','while_parser.py',95),
-  ('ctrl -> IF bexp body ELSE body','ctrl',5,'p_ctrl','while_parser.py',96),
-  ('ctrl -> WHILE bexp _begin_loop body _end_loop','ctrl',5,'p_ctrl_loop','while_parser.py',101),
-  ('ctrl -> FOR idx IN LBRACK aexp ELLIPSES aexp RBRACK _push_idx _begin_loop body _end_loop _pop_idx','ctrl',13,'p_ctrl_loop','while_parser.py',102),
-  ('_begin_loop -> <empty>','_begin_loop',0,'p__begin_loop','while_parser.py',107),
-  ('_end_loop -> <empty>','_end_loop',0,'p__end_loop','while_parser.py',111),
-  ('idx -> new_var','idx',1,'p_idx','while_parser.py',115),
-  ('_pop_idx -> <empty>','_pop_idx',0,'p__pop_idx','while_parser.py',120),
-  ('_push_idx -> <empty>','_push_idx',0,'p__push_idx','while_parser.py',125),
-  ('aexp -> term','aexp',1,'p_aexp','while_parser.py',132),
-  ('aexp -> aexp PLUS term','aexp',3,'p_aexp','while_parser.py',133),
-  ('aexp -> aexp MINUS term','aexp',3,'p_aexp','while_parser.py',134),
-  ('term -> fact','term',1,'p_term','while_parser.py',138),
-  ('term -> term TIMES fact','term',3,'p_term','while_parser.py',139),
-  ('term -> term DIVIDE fact','term',3,'p_term','while_parser.py',140),
-  ('fact -> old_var','fact',1,'p_fact','while_parser.py',144),
-  ('fact -> num','fact',1,'p_fact','while_parser.py',145),
-  ('fact -> MINUS aexp','fact',2,'p_fact','while_parser.py',146),
-  ('fact -> LPAREN aexp RPAREN','fact',3,'p_fact','while_parser.py',147),
-  ('num -> NUMBER','num',1,'p_num','while_parser.py',151),
-  ('bexp -> BOOL','bexp',1,'p_bexp','while_parser.py',157),
-  ('bexp -> aexp rel aexp','bexp',3,'p_bexp','while_parser.py',158),
-  ('rel -> EQUALS','rel',1,'p_rel','while_parser.py',162),
-  ('rel -> LESS','rel',1,'p_rel','while_parser.py',163),
-  ('rel -> GREATER','rel',1,'p_rel','while_parser.py',164),
-  ('var -> ID','var',1,'p_var','while_parser.py',169),
-  ('new_var -> ID','new_var',1,'p_new_var','while_parser.py',178),
-  ('old_var -> ID','old_var',1,'p_old_var','while_parser.py',186),
+  ('prog -> DEF ID LPAREN vars RPAREN TO LPAREN _begin_scope vars _end_scope RPAREN body','prog',12,'p_prog','while_parser.py',53),
+  ('prog -> DEF error body','prog',3,'p_prog_error','while_parser.py',60),
+  ('vars -> <empty>','vars',0,'p_vars','while_parser.py',66),
+  ('vars -> var vars','vars',2,'p_vars_chain','while_parser.py',70),
+  ('body -> LCURLY _begin_scope exp _end_scope RCURLY','body',5,'p_body','while_parser.py',79),
+  ('_begin_scope -> <empty>','_begin_scope',0,'p__begin_scope','while_parser.py',83),
+  ('_end_scope -> <empty>','_end_scope',0,'p__end_scope','while_parser.py',88),
+  ('exp -> <empty>','exp',0,'p_exp','while_parser.py',94),
+  ('exp -> stmt','exp',1,'p_exp','while_parser.py',95),
+  ('exp -> ctrl exp','exp',2,'p_exp_chain','while_parser.py',99),
+  ('exp -> stmt SEMICOLON exp','exp',3,'p_exp_chain','while_parser.py',100),
+  ('stmt -> SKIP','stmt',1,'p_stmt','while_parser.py',107),
+  ('stmt -> var ASSIGN aexp','stmt',3,'p_stmt','while_parser.py',108),
+  ('stmt -> BREAK','stmt',1,'p_stmt_jump','while_parser.py',112),
+  ('stmt -> CONTINUE','stmt',1,'p_stmt_jump','while_parser.py',113),
+  ('stmt -> error','stmt',1,'p_stmt_error','while_parser.py',119),
+  ('ctrl -> IF error body','ctrl',3,'p_ctrl_error','while_parser.py',124),
+  ('ctrl -> IF error body ELSE body','ctrl',5,'p_ctrl_error','while_parser.py',125),
+  ('ctrl -> WHILE error body','ctrl',3,'p_ctrl_error','while_parser.py',126),
+  ('ctrl -> FOR error body','ctrl',3,'p_ctrl_error','while_parser.py',127),
+  ('ctrl -> FOR idx IN LBRACK error RBRACK _push_idx _begin_loop body _end_loop _pop_idx','ctrl',11,'p_ctrl_error','while_parser.py',128),
+  ('ctrl -> IF bexp body','ctrl',3,'p_ctrl','while_parser.py',134),
+  ('ctrl -> IF bexp body ELSE body','ctrl',5,'p_ctrl','while_parser.py',135),
+  ('ctrl -> WHILE bexp _begin_loop body _end_loop','ctrl',5,'p_ctrl_loop','while_parser.py',140),
+  ('ctrl -> FOR idx IN LBRACK aexp ELLIPSES aexp RBRACK _push_idx _begin_loop body _end_loop _pop_idx','ctrl',13,'p_ctrl_loop','while_parser.py',141),
+  ('_begin_loop -> <empty>','_begin_loop',0,'p__begin_loop','while_parser.py',146),
+  ('_end_loop -> <empty>','_end_loop',0,'p__end_loop','while_parser.py',150),
+  ('idx -> new_var','idx',1,'p_idx','while_parser.py',155),
+  ('_pop_idx -> <empty>','_pop_idx',0,'p__pop_idx','while_parser.py',160),
+  ('_push_idx -> <empty>','_push_idx',0,'p__push_idx','while_parser.py',164),
+  ('aexp -> term','aexp',1,'p_aexp','while_parser.py',189),
+  ('aexp -> aexp PLUS term','aexp',3,'p_aexp','while_parser.py',190),
+  ('aexp -> aexp MINUS term','aexp',3,'p_aexp','while_parser.py',191),
+  ('term -> fact','term',1,'p_term','while_parser.py',195),
+  ('term -> term TIMES fact','term',3,'p_term','while_parser.py',196),
+  ('term -> term DIVIDE fact','term',3,'p_term','while_parser.py',197),
+  ('fact -> old_var','fact',1,'p_fact','while_parser.py',201),
+  ('fact -> num','fact',1,'p_fact','while_parser.py',202),
+  ('fact -> MINUS aexp','fact',2,'p_fact','while_parser.py',203),
+  ('fact -> LPAREN aexp RPAREN','fact',3,'p_fact','while_parser.py',204),
+  ('fact -> ID LPAREN args RPAREN','fact',4,'p_fact_call','while_parser.py',211),
+  ('args -> <empty>','args',0,'p_args','while_parser.py',215),
+  ('args -> arg args','args',2,'p_args','while_parser.py',216),
+  ('arg -> old_var','arg',1,'p_arg','while_parser.py',220),
+  ('arg -> num','arg',1,'p_arg','while_parser.py',221),
+  ('arg -> LPAREN aexp RPAREN','arg',3,'p_arg','while_parser.py',222),
+  ('num -> NUMBER','num',1,'p_num','while_parser.py',226),
+  ('bexp -> BOOL','bexp',1,'p_bexp','while_parser.py',232),
+  ('bexp -> aexp rel aexp','bexp',3,'p_bexp','while_parser.py',233),
+  ('rel -> EQUALS','rel',1,'p_rel','while_parser.py',237),
+  ('rel -> LESS','rel',1,'p_rel','while_parser.py',238),
+  ('rel -> GREATER','rel',1,'p_rel','while_parser.py',239),
+  ('var -> ID','var',1,'p_var','while_parser.py',244),
+  ('new_var -> ID','new_var',1,'p_new_var','while_parser.py',253),
+  ('old_var -> ID','old_var',1,'p_old_var','while_parser.py',259),
 ]
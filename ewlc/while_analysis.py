@@ -3,42 +3,149 @@
 #
 # Big-O value analysis for the extended WHILE language
 # ------------------------------------------------------------
-import while_cfg as CFG
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_structure as STRUCT
+  from . import while_interval as INTERVAL
+  from . import while_cache as CACHE
+  from . import while_expr as E
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_structure as STRUCT
+  import while_interval as INTERVAL
+  import while_cache as CACHE
+  import while_expr as E
+import time
 from collections import defaultdict
+from sympy import Max, oo, count_ops, default_sort_key
 
-class BigO(dict):
+# Limits on the work spent per analysis; once a label runs over a limit its
+# states are merged into a coarser one instead of being tracked separately
+class Budget(object):
+  LIMITS = {'states' : 'states per label', 'time' : 'wall time', 'size' : 'expression size'}
+  EFFECTS = {'states' : 'its states were merged', 'time' : 'its analysis stopped', 'size' : 'what outgrew it was taken as unbounded'}
+  def __init__(self, states=64, seconds=None, size=256):
+    self.states, self.seconds, self.size = states, seconds, size
+    self.start = time.monotonic()
+    self.hits = defaultdict(set)
+  def expired(self):
+    return self.seconds is not None and time.monotonic() - self.start > self.seconds
+  def hit(self, label, limit):
+    self.hits[label].add(limit)
+  def bound(self, expr, label):
+    if self.size is None or not hasattr(expr, 'free_symbols'): return expr
+    if (E.size(expr) if isinstance(expr, E.Expr) else count_ops(expr)) <= self.size: return expr
+    self.hit(label, 'size'); return oo
+  def report(self, cfg=None):
+    return [f'Label {label}{f" ({cfg.cite(cfg[label-1])})" if cfg is not None else ""} hit the limit on {", ".join(self.LIMITS[k] for k in sorted(limits))}, '
+            f'so {" and ".join(self.EFFECTS[k] for k in sorted(limits))}' for label, limits in sorted(self.hits.items())]
+
+# Joins are kept unevaluated as a flat Max of the joined terms, in SymPy
+def terms(v):
+  v = E.to_sympy(v)
+  return set(v.args) if isinstance(v, Max) else {v}
+
+# A persistent map from variables to expressions. A state only holds the
+# bindings it changed over the state it was derived from, so branching is
+# O(1) and updates share structure; chains are compacted once they grow
+# deeper than LIMIT. Missing variables map to themselves.
+class BigO(object):
+  LIMIT = 16
+  __slots__ = ('parent', 'local', 'depth', 'branch')
   def __init__(self, branch=None, *args, **kwargs):
-    super(BigO, self).__init__(*args, **kwargs)
+    self.parent, self.local, self.depth = None, dict(*args, **kwargs), 0
     self.branch = branch
+  def derive(self, changes, branch=None):
+    res = BigO(branch if branch else self.branch)
+    if not changes: res.parent, res.local, res.depth = self.parent, self.local, self.depth
+    elif self.depth >= self.LIMIT: res.local = {**self.flatten(), **changes}
+    else: res.parent, res.local, res.depth = self, changes, self.depth + 1
+    return res
+  def lookup(self, key):
+    O = self
+    while O is not None:
+      if key in O.local: return True, O.local[key]
+      O = O.parent
+    return False, key
   def __getitem__(self, key):
-    try: return super().__getitem__(key)
-    except Exception: super().__setitem__(key, key); return key
+    return self.lookup(key)[1]
+  def get(self, key, default=None):
+    found, value = self.lookup(key)
+    return value if found else default
+  def __contains__(self, key):
+    return self.lookup(key)[0]
+  def has_key(self, key):
+    return key in self
+  def flatten(self):
+    chain, O = [], self
+    while O is not None: chain.append(O.local); O = O.parent
+    res = {}
+    for local in reversed(chain): res.update(local)
+    return res
+  def items(self):
+    return self.flatten().items()
+  def values(self):
+    return self.flatten().values()
+  def __iter__(self):
+    return iter(self.flatten())
+  def __len__(self):
+    return len(self.flatten())
+  # The variables two states may bind differently: those changed since the
+  # last state both were derived from (a chain level is known by its local
+  # bindings, which no other level shares)
+  def changed(self, obj):
+    mine, O = set(), self
+    while O is not None: mine.add(id(O.local)); O = O.parent
+    keys, O = set(), obj
+    while O is not None and id(O.local) not in mine: keys.update(O.local); O = O.parent
+    common, O = O.local if O is not None else None, self
+    while O is not None and O.local is not common: keys.update(O.local); O = O.parent
+    return keys
+  def __eq__(self, obj):
+    return isinstance(obj, BigO) and all(self[key] == obj[key] for key in self.changed(obj))
+  __hash__ = None
+  def __repr__(self):
+    return repr(self.flatten())
+  def set(self, key, value):
+    return self.derive({key : value})
+  # Compose with O: the bindings of self are evaluated in O on top of O
   def __call__(self, O):
     assert isinstance(O, BigO)
-    res = self.copy()
-    for key in res:
-      res[key] = res[key].subs(O)
-    for key in O:
-      if not res.has_key(key): res[key] = O[key]
-    return res
+    return O.derive({key : E.substitute(value, O) for key, value in self.items()})
   def copy(self, branch=None):
-    res = BigO(branch=branch if branch else self.branch)
-    for k,v in self.items():
-      res[k] = v
-    return res
-  def has_key(self, key):
-    try: self[key]; return True
-    except Exception: return False
+    return self.derive({}, branch)
+  def join(self, O, budget, label, widen=False):
+    changes = {}
+    for key in self.changed(O):
+      old, new = self[key], O[key]
+      args = terms(old) | terms(new)
+      if args == terms(old): continue
+      elif widen: changes[key] = oo
+      else: changes[key] = budget.bound(Max(*sorted(args, key=default_sort_key), evaluate=False), label)
+    return self.derive(changes)
 
-def extract_BigO(root, cfg):
-  Os = [[] for _ in cfg]
+# Calls are replaced by what their callees return, where calls knows it
+def extract_BigO(root, cfg, budget=None, calls=None):
+  budget = budget if budget is not None else Budget()
+  Os, merges = [[] for _ in cfg], [0 for _ in cfg]
   queue = [(root, BigO())]
   while queue:
     u, O = queue.pop()
-    Os[cfg.index(u)].append(O)
+    i = cfg.index(u)
+    if budget.expired(): budget.hit(i+1, 'time'); break
+    if len(Os[i]) < budget.states: Os[i].append(O)
+    else:
+      # Past the limit, the label keeps a single merged state that is only
+      # propagated further when it grows, and is widened if it keeps growing
+      budget.hit(i+1, 'states')
+      O = Os[i][-1].join(O, budget, i+1, merges[i] >= budget.states)
+      merges[i] += 1
+      if O == Os[i][-1]: continue
+      Os[i][-1] = O
     if isinstance(u, CFG.ASSIGN):
-      f = BigO(); f[u.node.var] = u.node.aexp
-      queue.append((u.exit, f(O)))
+      aexp = u.node.aexp if calls is None else calls.inline(u.node.aexp)
+      aexp = budget.bound(E.substitute(aexp, O), i+1)
+      queue.append((u.exit, O.set(u.node.var, aexp)))
     elif isinstance(u, CFG.CONDJUMP):
       if u.loops:
         if O.branch == u: pass
@@ -52,38 +159,47 @@ def extract_BigO(root, cfg):
       pass
   return Os
 
-def analyze(cfg):
-  CFG.visualize_cfg(cfg, 'cfg_start.png')
-
-  # Identify loops and precompute their recurrence relationship
-  loops, visited = defaultdict(list), set([None])
-  def trace_loop(u, end=None, depth=0):
-    nonlocal cfg, loops, visited
-
-    branches = []
-    valid = lambda w : w not in visited and w != end
-    to_visit = set([u.exit] if valid(u.exit) else [])
-    while to_visit:
-      v = to_visit.pop(); visited.add(v)
-      if isinstance(v, CFG.CONDJUMP):
-        if not v.loops: branches.append(v)
-        else: loops[depth].append((v, trace_loop(v, v.diverge, depth+1)))
-        if valid(v.diverge): to_visit.add(v.diverge)
-      if valid(v.exit): to_visit.add(v.exit)
-    
-    return branches
+# Summarizes the loops of the graph, innermost first, reporting each one
+# through log and drawing the graph as it is compressed if draw is set.
+# Returns the summary of every loop by the label of its header: the bound on
+# its iterations ('trips') or the labels of its breakpoints ('breaks')
+def analyze(cfg, cache=None, calls=None, budget=None, log=print, draw=True):
+  if draw: CFG.visualize_cfg(cfg, 'cfg_start.png')
+
+  # Look up loops and the branches they own in the structural index, which
+  # takes them from the loop table of lowering while the graph is unchanged,
+  # and where in the source each loop is
+  loops, places = defaultdict(list), {}
+  index = STRUCT.structure(cfg)
+  for h in index.headers():
+    loop = index.loops[h]
+    loops[loop.depth].append((h, loop.branches))
+    places[h] = cfg.cite(h)
+
+  # Loops whose trip count the interval analysis bounds need no recurrence
+  ranges = INTERVAL.intervals(cfg, calls=calls)
+  trips = {h : t for h, t in ranges.trips.items() if t is not None}
 
   # Identify breakpoints in loop
+  budget = budget if budget is not None else Budget()
   def find_breakpoints(u, branches):
-    # Trace the relationship between conditional jumps
-    queue, trace = [(u, False, u.exit)], []
+    branches = set(branches)
+    # Trace the relationship between conditional jumps, merging the paths
+    # that reach a branch once it has been reached too many times
+    queue, trace, states = [(u, False, u.exit)], [], defaultdict(int)
     while queue:
       cond, diverged, end = queue.pop()
       if end == u: continue
+      if budget.expired(): budget.hit(cfg.index(u)+1, 'time'); break
       if not (end == u.diverge or end in branches): queue.append((cond, diverged, end.exit))
       else:
+        states[end] += 1
+        if states[end] > budget.states:
+          budget.hit(cfg.index(end)+1, 'states')
+          if (cond, diverged, end) in trace: continue
         trace.append((cond, diverged, end)); cond.may_recur = 2
-        if end in branches: queue.extend([(end, False, end.exit), (end, True, end.diverge)])
+        if end in branches and states[end] <= budget.states:
+          queue.extend([(end, False, end.exit), (end, True, end.diverge)])
 
     # Backpropagate loop breaks up the trace
     trace.reverse()
@@ -101,46 +217,80 @@ def analyze(cfg):
         cond.node = cond.node._replace(cond = CFG.negate(cond.node.cond))
         flip.append(cond)
     
-    return [branch for branch in ([u] + branches) if branch.loops]
+    return [branch for branch in ([u] + sorted(branches, key=cfg.index)) if branch.loops]
+
+  # memoize the result
+  def memoize(u, key=None):
+    i = cfg.index(u)
+    memo = CFG.MEMO(cond=u.node.cond)
+    memo.span = u.span
+    cfg[i] = memo
+    cfg[i].key = key
+    cfg[i].enter, cfg[i].exit = u.enter, u.diverge
+    for w in cfg[i].enter:
+      if w.exit == u: w.exit = cfg[i]
+      else: w.diverge = cfg[i]
 
   def compute_recurrence(u):
     # find_divergences(u, branches)
     pass
 
-  trace_loop(cfg[0])
-  loops = list(loops.values()); loops.reverse()
+  loops = [loops[depth] for depth in sorted(loops, reverse=True)]
   if not loops:
-    print("  No loops were found.")
+    log("  No loops were found.")
 
+  # Summaries are keyed on the loop's subgraph and the context it is entered
+  # in (including the keys of the functions it calls), so only loops that
+  # changed since the last run are analyzed again
+  summaries = cache if cache is not None else CACHE.SummaryCache()
+  def context(u, order):
+    env = ranges.env.get(u) or {}
+    known = sorted(f'{k} in {env[k]}' for k in CACHE.symbols(order) if k in env)
+    callees = set()
+    for v in order:
+      for field in v.node:
+        if calls is not None: callees |= set(e.name for e in E.walk(field) if e.op == E.CALL)
+    callees = sorted(f'{f}={calls.keys.get(f)}' for f in callees)
+    return f'{trips.get(u)} | {", ".join(known)}' + (f' | {", ".join(callees)}' if callees else '')
+
+  results = {}
   for level in loops:
     for u, branches in level:
-      breaks = find_breakpoints(u, branches)
-      CFG.visualize_cfg(cfg, f'cfg_{cfg.index(u)+1}.png')
-      print(f"  Analyzing loop at label {cfg.index(u)+1}")
-      if not breaks:
-        print(f"    - There are no cycles and hence no breakpoints.")
-        continue
+      order, _ = CACHE.canonical(u)
+      key = CACHE.loop_key(u, context(u, order))
+      summary = summaries.get(key, cfg.index(u)+1)
+      if summary is None:
+        hits = sum(map(len, budget.hits.values()))
+        # A trip bound past the size limit leaves the loop unbounded
+        if u in trips and budget.bound(trips[u].bound, cfg.index(u)+1) is not oo: summary = {'trips' : str(trips[u])}
+        else: summary = {'breaks' : [order.index(brk) for brk in find_breakpoints(u, branches)]}
+        # Summaries degraded by the budget are not worth keeping
+        if hits == sum(map(len, budget.hits.values())): summaries.put(key, summary)
 
-      # end = CFG.NODE('END')
-      # for v in u.diverge.enter:
-      #   if v.exit == u: v.exit = end
-      #   else: v.diverge = end
-      #   if 
-
-      # u.diverge
-      # compute_recurrence(u, cfg)
-      print(f"    + The breakpoints are at labels: {[cfg.index(brk)+1 for brk in breaks]}")
-
-      # memoize the result
-      i = cfg.index(u)
-      cfg[i] = CFG.MEMO(cond=u.node.cond)
-      cfg[i].enter, cfg[i].exit = u.enter, u.diverge
-      for w in cfg[i].enter:
-        if w.exit == u: w.exit = cfg[i]
-        else: w.diverge = cfg[i]      
+      label = cfg.index(u)+1
+      if draw: CFG.visualize_cfg(cfg, f'cfg_{label}.png')
+      log(f"  Analyzing loop at label {label} ({places[u]})")
+      if 'trips' in summary:
+        results[label] = {'trips' : summary['trips']}
+        log(f"    + The loop runs for at most {summary['trips']} iterations, so no recurrence is needed.")
+      elif not summary['breaks']:
+        results[label] = {'breaks' : []}
+        log(f"    - There are no cycles and hence no breakpoints.")
+        continue
+      else:
+        # compute_recurrence(u, cfg)
+        results[label] = {'breaks' : [cfg.index(order[i])+1 for i in summary['breaks']]}
+        log(f"    + The breakpoints are at labels {', '.join(f'{b} ({cfg.cite(cfg[b-1])})' for b in results[label]['breaks'])}.")
+      memoize(u, key)
 
+  for line in budget.report(cfg):
+    log(f"  ! {line}.")
+  if cache is not None:
+    cache.save()
+    log(f"  {cache.report()}")
   # print(f"{loops}")
-  CFG.visualize_cfg(cfg, 'cfg_end.png')
+  if draw: CFG.visualize_cfg(cfg, 'cfg_end.png')
+  return results
 
 # Test on a simple program
 if __name__ == '__main__':
@@ -3,9 +3,12 @@
 #
 # Abstract Syntax Tree for the extended WHILE language
 # ------------------------------------------------------------
-import while_cfg as CFG
-from collections import namedtuple
-from sympy import Symbol, Eq, parse_expr
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_expr as E
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_expr as E
 
 def unparse(v):
   if isinstance(v, NODE):
@@ -15,9 +18,9 @@ def unparse(v):
   return str(v)
 
 class NODE(object):
-  def __init__(self, line=None, label='NODE', **kwargs):
-    self.line, self.label = line, label
-    self.node = namedtuple(label, kwargs.keys())(**kwargs)
+  def __init__(self, line=None, label='NODE', col=None, **kwargs):
+    self.line, self.col, self.label = line, col, label
+    self.node = CFG.record(label, tuple(kwargs))(**kwargs)
   def __eq__(self, obj):
     return repr(self) == repr(obj)
   def __repr__(self):
@@ -26,15 +29,20 @@ class NODE(object):
     raise NotImplementedError
   def bytecode(self):
     raise NotImplementedError
+  # Give bytecode the source span of this node
+  def at(self, *nodes):
+    span = CFG.span(self.line, self.col)
+    for u in nodes: u.span = span
+    return list(nodes)
 
 class DEF(NODE):
-  def __init__(self, fun, inp, out, body, line=None):
-    super().__init__(line, 'DEF', fun=fun, inp=inp, out=out, body=body)
+  def __init__(self, fun, inp, out, body, line=None, col=None):
+    super().__init__(line, 'DEF', col, fun=fun, inp=inp, out=out, body=body)
   def unparse(self):
     fun, inp, out, body = map(unparse, self.node)
     return f'def {fun} ({" ".join(inp)}) -> ({" ".join(out)}) {body}'
   def bytecode(self):
-    return self.node.body.bytecode() + [CFG.NODE('END')]
+    return self.node.body.bytecode() + self.at(CFG.NODE('END'))
 
 class BODY(NODE):
   def __init__(self, exp):
@@ -46,76 +54,88 @@ class BODY(NODE):
     return sum(map(lambda v : v.bytecode(), self.node.exp), [])
 
 class SKIP(NODE):
-  def __init__(self, line=None):
-    super().__init__(line, 'SKIP')
+  def __init__(self, line=None, col=None):
+    super().__init__(line, 'SKIP', col)
   def unparse(self):
     return 'skip;'
   def bytecode(self):
     return []
 
 class ASSIGN(NODE):
-  def __init__(self, var, aexp, line=None):
-    super().__init__(line, 'ASSIGN', var=var, aexp=aexp)
+  def __init__(self, var, aexp, line=None, col=None):
+    super().__init__(line, 'ASSIGN', col, var=var, aexp=aexp)
   def unparse(self):
     var, aexp = map(unparse, self.node)
     return f'{var} := {aexp};'
   def bytecode(self):
-    return [CFG.ASSIGN(self.node.var.reify(), self.node.aexp.reify())]
+    return self.at(CFG.ASSIGN(self.node.var.reify(), self.node.aexp.reify()))
 
 class JUMP(NODE):
-  def __init__(self, kind, line=None):
-    super().__init__(line, kind.upper())
+  def __init__(self, kind, line=None, col=None):
+    super().__init__(line, kind.upper(), col)
   def unparse(self):
     return f'{self.label.lower()};'
   def bytecode(self):
     return [self.label]
 
 class IF(NODE):
-  def __init__(self, cond, if_true, if_false, line=None):
-    super().__init__(line, 'IF', cond=cond, if_true=if_true, if_false=if_false)
+  def __init__(self, cond, if_true, if_false, line=None, col=None):
+    super().__init__(line, 'IF', col, cond=cond, if_true=if_true, if_false=if_false)
   def unparse(self):
     cond, if_true, if_false = map(unparse, self.node)
     return f'if {cond} {if_true} else {if_false}'
   def bytecode(self):
     if_false = self.node.if_false.bytecode()
     if_true = self.node.if_true.bytecode() + [CFG.JUMP(len(if_false)+1)]
-    cond = [CFG.CONDJUMP(self.node.cond.reify(), len(if_true)+1)]
+    cond = self.at(CFG.CONDJUMP(self.node.cond.reify(), len(if_true)+1))
     return cond + if_true + if_false
 
 class WHILE(NODE):
-  def __init__(self, cond, while_true, line=None):
-    super().__init__(line, 'WHILE', cond=cond, while_true=while_true)
+  def __init__(self, cond, while_true, line=None, col=None):
+    super().__init__(line, 'WHILE', col, cond=cond, while_true=while_true)
   def unparse(self):
     cond, while_true = map(unparse, self.node)
     return f'while {cond} {while_true}'
   def bytecode(self):
     while_true = self.node.while_true.bytecode()
     while_true += [CFG.JUMP(-len(while_true)-1)]
+    breaks, continues = [], []
     for i in range(len(while_true)):
-      if while_true[i] == 'CONTINUE': while_true[i] = CFG.JUMP(-i-1)
-      if while_true[i] == 'BREAK': while_true[i] = CFG.JUMP(len(while_true)-i)
-    cond = [CFG.CONDJUMP(self.node.cond.reify(), len(while_true)+1, loops=True)]
+      if while_true[i] == 'CONTINUE':
+        while_true[i] = CFG.JUMP(-i-1); continues.append(while_true[i])
+      if while_true[i] == 'BREAK':
+        while_true[i] = CFG.JUMP(len(while_true)-i); breaks.append(while_true[i])
+    cond = self.at(CFG.CONDJUMP(self.node.cond.reify(), len(while_true)+1, loops=True))
+    # Record the loop for the side table of construct_cfg, adopting the
+    # loops emitted in its body that are not nested in another one yet
+    body = [u for u in while_true if not isinstance(u, CFG.JUMP)]
+    cond[0].lowered = CFG.LoopInfo(cond[0], body, breaks, continues, self.line)
+    for u in body:
+      inner = getattr(u, 'lowered', None)
+      if inner is not None and inner.parent is None: inner.parent = cond[0].lowered
     return cond + while_true
 
 class FOR(NODE):
-  def __init__(self, idx, start, end, for_each, line=None):
-    super().__init__(line, 'FOR', idx=idx, start=start, end=end, for_each=for_each)
+  def __init__(self, idx, start, end, for_each, line=None, col=None):
+    super().__init__(line, 'FOR', col, idx=idx, start=start, end=end, for_each=for_each)
   def unparse(self):
     idx, start, end, for_each = map(unparse, self.node)
     return f'for {idx} in [{start}..{end}] {for_each}'
   def bytecode(self):
     idx, start, end, for_each = self.node
     k, lim = VAR(idx.id + '_k'), VAR(idx.id + '_lim')
+    # The counters and the loop all come from the for statement
+    at = (self.line, self.col)
     desugar = BODY([
-      ASSIGN(k, start),
-      ASSIGN(lim, AEXP(end, '+', NUM(1))),
+      ASSIGN(k, start, *at),
+      ASSIGN(lim, AEXP(end, '+', NUM(1)), *at),
       WHILE(
         BEXP(k, '<', lim),
         BODY([
-          ASSIGN(idx, k),
-          ASSIGN(k, AEXP(k, '+', NUM(1)))
+          ASSIGN(idx, k, *at),
+          ASSIGN(k, AEXP(k, '+', NUM(1)), *at)
         ] + for_each.node.exp),
-        self.line
+        *at
       )
     ])
     return desugar.bytecode()
@@ -127,16 +147,33 @@ class AEXP(NODE):
     left, op, right = map(unparse, self.node)
     return f'({left} {op} {right})'
   def reify(self):
-    op = {'+' : lambda l, r : l + r,
-          '-' : lambda l, r : l - r,
-          '*' : lambda l, r : l * r,
-          '/' : lambda l, r : l / r}
+    # A chain of + and - is summed at once, so no partial sum is interned
+    if self.node.op in '+-':
+      terms, v = [], self
+      while isinstance(v, AEXP) and v.node.op in '+-':
+        right = v.node.right.reify()
+        terms.append(right if v.node.op == '+' else E.mul(-1, right))
+        v = v.node.left
+      return E.add(v.reify(), *terms)
+    op = {'+' : E.add,
+          '-' : E.sub,
+          '*' : E.mul,
+          '/' : E.div}
     return op[self.node.op](self.node.left.reify(), self.node.right.reify())
 
+class CALL(NODE):
+  def __init__(self, fun, args, line=None, col=None):
+    super().__init__(line, 'CALL', col, fun=fun, args=args)
+  def unparse(self):
+    args = [f'({unparse(v)})' if isinstance(v, CALL) else unparse(v) for v in self.node.args]
+    return f'{self.node.fun}({" ".join(args)})'
+  def reify(self):
+    return E.call(self.node.fun, [v.reify() for v in self.node.args])
+
 class VAR(object):
-  def __init__(self, id, line=None):
-    self.id, self.line = id, line
-    self.sym = Symbol(self.id)
+  def __init__(self, id, line=None, col=None):
+    self.id, self.line, self.col = id, line, col
+    self.sym = E.symbol(self.id)
   def __repr__(self):
     return self.id
   def reify(self):
@@ -144,11 +181,11 @@ class VAR(object):
 
 class NUM(object):
   def __init__(self, val):
-    self.val = parse_expr(repr(val))
+    self.val = val
   def __repr__(self):
     return repr(self.val)
   def reify(self):
-    return self.val
+    return E.number(self.val)
 
 class BEXP(NODE):
   def __init__(self, left, rel, right):
@@ -157,9 +194,9 @@ class BEXP(NODE):
     left, rel, right = map(unparse, self.node)
     return f'{left} {rel} {right}'
   def reify(self):
-    rel = {'==' : lambda l, r : Eq(l,r),
-            '<' : lambda l, r : l < r,
-            '>' : lambda l, r : l > r}
+    rel = {'==' : E.eq,
+            '<' : E.lt,
+            '>' : E.gt}
     cond = rel[self.node.rel](self.node.left.reify(), self.node.right.reify())
     return cond
 
@@ -0,0 +1,91 @@
+# ------------------------------------------------------------
+# while_bench.py
+#
+# Benchmarks for the extended WHILE language analysis
+# ------------------------------------------------------------
+import importlib, resource, subprocess, sys, time
+
+# The modules of the package, imported from it when this is (as ewlc does
+# for ewlc.while_bench) and from this directory when run as a script
+def load(name):
+  return importlib.import_module(('.' if __package__ else '') + name, __package__ or None)
+
+# A straight-line program with n blocks of arithmetic, branches and loops
+def generate(n):
+  lines = ['def big (a b) -> (x0) {', '  x0 := a;']
+  for k in range(1, n+1):
+    lines.append(f'  x{k} := x{k-1} * 3 + a - b / 2;')
+    lines.append(f'  if x{k} < b {{x{k} := x{k} + {k};}} else {{x0 := x0 - x{k};}}')
+    if k % 10 == 0: lines.append(f'  for i{k} in [1 .. x{k}] {{x0 := x0 + i{k} * a;}}')
+  lines.append('}')
+  return '\n'.join(lines)
+
+def rss():
+  return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # KiB on Linux
+
+# The expressions of an AST are the operands of its statements
+def expressions(v):
+  AST = load('while_ast')
+  if isinstance(v, list):
+    for w in v: yield from expressions(w)
+  elif isinstance(v, AST.NODE) and not hasattr(v, 'reify'):
+    for w in v.node: yield from expressions(w)
+  elif hasattr(v, 'reify'): yield v
+
+# SymPy trees built straight from the AST, as bytecode used to hold them
+def sympy_reify(v):
+  AST = load('while_ast')
+  import sympy
+  if isinstance(v, AST.VAR): return sympy.Symbol(v.id)
+  if isinstance(v, AST.NUM): return sympy.Integer(v.val)
+  if isinstance(v, AST.BOOL): return v.val
+  if isinstance(v, AST.CALL): return sympy.Function(v.node.fun)(*map(sympy_reify, v.node.args))
+  left, right = sympy_reify(v.node.left), sympy_reify(v.node.right)
+  if isinstance(v, AST.BEXP):
+    return {'==' : sympy.Eq, '<' : sympy.Lt, '>' : sympy.Gt}[v.node.rel](left, right)
+  return {'+' : lambda l, r : l + r, '-' : lambda l, r : l - r,
+          '*' : lambda l, r : l * r, '/' : lambda l, r : l / r}[v.node.op](left, right)
+
+# Reify every expression of the program either into the hash-consed DAG or
+# into SymPy trees, and report how much the peak RSS grew
+def footprint(kind, n):
+  import sympy
+  E, WhileParser = load('while_expr'), load('while_parser').WhileParser
+  roots = list(expressions(WhileParser().parse(generate(n))))
+  start = rss()
+  kept = [v.reify() if kind == 'dag' else sympy_reify(v) for v in roots]
+  return rss() - start, len(kept), len(E.TABLE)
+
+# Programs parsed per second by one parser shared by a pool of threads, each
+# parse running in a session of its own
+def throughput(threads, codes):
+  from concurrent.futures import ThreadPoolExecutor
+  WhileParser = load('while_parser').WhileParser
+  parser = WhileParser()
+  with ThreadPoolExecutor(threads) as pool:
+    list(pool.map(parser.parse, codes[:threads])) # start the threads
+    start = time.perf_counter()
+    list(pool.map(parser.parse, codes))
+    return len(codes) / (time.perf_counter() - start)
+
+# Every measurement runs in a fresh process, as peak RSS never goes down
+def measure(kind, n):
+  out = subprocess.run([sys.executable, __file__, kind, str(n)], capture_output=True, text=True, check=True)
+  return tuple(map(int, out.stdout.split()))
+
+if __name__ == '__main__':
+  if sys.argv[1:2] == ['parse']:
+    Generator = load('while_fuzz').Generator
+    codes = [Generator(seed).program() for seed in range(int(sys.argv[2]) if len(sys.argv) > 2 else 400)]
+    single = throughput(1, codes)
+    for threads in (1, 2, 4, 8):
+      rate = single if threads == 1 else throughput(threads, codes)
+      print(f'{threads} thread{" " if threads == 1 else "s"} parsed {rate:7.0f} programs per second ({rate / single:.2f}x)')
+    sys.exit()
+  if len(sys.argv) == 3:
+    print(*footprint(sys.argv[1], int(sys.argv[2])))
+    sys.exit()
+  n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+  for kind in ('dag', 'sympy'):
+    peak, nodes, exprs = measure(kind, n)
+    print(f'{kind:<6} expressions grew peak RSS by {peak:>7} KiB for {nodes} statement operands ({exprs} in the DAG)')
@@ -0,0 +1,68 @@
+# ------------------------------------------------------------
+# while_cache.py
+#
+# Persistent loop summaries for the extended WHILE language analysis
+# ------------------------------------------------------------
+import hashlib, json, os
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_expr as E
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_expr as E
+
+# Number the nodes of the loop headed by u in depth-first order, following
+# the exit edge before the diverging one and stopping at the loop's exit
+def canonical(u):
+  order, number, stack = [], {}, [u]
+  while stack:
+    v = stack.pop()
+    if v is None or v in number or v is u.diverge: continue
+    number[v] = len(order); order.append(v)
+    if isinstance(v, CFG.MEMO): stack.append(v.exit); continue
+    stack.extend(reversed(CFG.successors(v)))
+  return order, number
+
+def encode(v, number, exit):
+  succ = ['exit' if w is exit else number.get(w, 'out') for w in CFG.successors(v)]
+  if isinstance(v, CFG.MEMO): text = f'MEMO {getattr(v, "key", E.srepr(v.node.cond))}'
+  elif isinstance(v, CFG.ASSIGN): text = f'ASSIGN {E.srepr(v.node.var)} {E.srepr(v.node.aexp)}'
+  elif isinstance(v, CFG.CONDJUMP): text = f'CONDJUMP {E.srepr(v.node.cond)} {v.loops}'
+  else: text = v.label
+  return f'{text} -> {succ}'
+
+def symbols(order):
+  res = set()
+  for v in order:
+    for field in v.node: res |= getattr(field, 'free_symbols', set())
+  return res
+
+# The key of a loop hashes its subgraph (with nested loops standing in by
+# their own keys) together with the context the loop is entered in
+def loop_key(u, context=''):
+  order, number = canonical(u)
+  text = '\n'.join(encode(v, number, u.diverge) for v in order)
+  return hashlib.sha1(f'{text}\n{context}'.encode()).hexdigest()
+
+class SummaryCache(object):
+  def __init__(self, file=None):
+    self.file, self.summaries = file, {}
+    self.reused, self.recomputed = [], []
+    if file and os.path.exists(file):
+      with open(file, 'r') as f: self.summaries = json.load(f)
+
+  def get(self, key, label=None):
+    summary = self.summaries.get(key)
+    (self.recomputed if summary is None else self.reused).append(label)
+    return summary
+
+  def put(self, key, summary):
+    self.summaries[key] = summary
+
+  def save(self):
+    if not self.file: return
+    with open(self.file, 'w') as f: json.dump(self.summaries, f, indent=1, sort_keys=True)
+
+  def report(self):
+    reused, recomputed = len(self.reused), len(self.recomputed)
+    return f'Reused {reused} loop summar{"y" if reused == 1 else "ies"} and recomputed {recomputed}.'
@@ -0,0 +1,226 @@
+# ------------------------------------------------------------
+# while_calls.py
+#
+# Call graph and function summaries for the extended WHILE language
+# ------------------------------------------------------------
+import hashlib
+if __package__:
+  from . import while_ast as AST
+  from . import while_cfg as CFG
+  from . import while_interval as INTERVAL
+  from . import while_structure as STRUCT
+  from . import while_expr as E
+  from .while_parser import ParsingError
+else: # run as a script, or with ewlc/ on sys.path
+  import while_ast as AST
+  import while_cfg as CFG
+  import while_interval as INTERVAL
+  import while_structure as STRUCT
+  import while_expr as E
+  from while_parser import ParsingError
+
+# Yield every call in an AST in source order
+def find_calls(v):
+  if isinstance(v, list):
+    for w in v: yield from find_calls(w)
+  elif isinstance(v, AST.NODE):
+    if isinstance(v, AST.CALL): yield v
+    for w in v.node: yield from find_calls(w)
+
+# A summary is what a call site needs to know about its callee: the range of
+# the value it returns (its first output), that value as an expression of
+# its inputs when the callee has no loops, and the trip counts of its loops
+class Summary(object):
+  def __init__(self, fun, key, value=INTERVAL.TOP, integral=False, trips=None, inputs=(), bound=None):
+    self.fun, self.key, self.value, self.integral = fun, key, value, integral
+    self.trips, self.inputs, self.bound = trips or {}, inputs, bound
+  def __repr__(self):
+    trips = ', '.join(f'{h}: {t}' for h, t in self.trips.items())
+    returns = f'{self.bound} in {self.value}' if self.bound is not None else self.value
+    return f'returns {returns}' + (f' (trips {trips})' if trips else '')
+
+# The call graph of a unit, built as its functions are parsed. Calls are
+# resolved, and functions keyed and summarized, when they are first needed:
+# a function is ready once every function it reaches is defined, and a
+# function calling one defined later in the unit waits until the unit is
+# closed. Summaries are memoized by key, so each is computed once
+class CallGraph(object):
+  def __init__(self, defs=()):
+    self.defs, self.errors, self.closed = {}, [], False
+    self.called, self.callees, self.keys, self.order = {}, {}, {}, []
+    self.summaries, self.computed = {}, 0
+    for ast in defs: self.add(ast)
+
+  # Add a function of the unit; one that is already defined is reported and
+  # left out
+  def add(self, ast):
+    fun = ast.node.fun
+    if fun in self.defs:
+      self.errors.append((ast.line, ParsingError(f'Function {fun} at line {ast.line} is already defined', ast.line, ast.col)))
+      return False
+    self.defs[fun] = ast
+    self.called[fun] = list(find_calls(ast.node.body))
+    return True
+
+  # No function is added after this; the calls still unresolved are errors
+  def close(self):
+    self.closed = True
+    for fun in self.defs: self.key(fun)
+    return self
+
+  # Every function reachable from fun through its calls, fun included
+  def reach(self, fun):
+    seen, work = [fun], [fun]
+    while work:
+      for call in self.called[work.pop()]:
+        if call.node.fun in self.defs and call.node.fun not in seen:
+          seen.append(call.node.fun); work.append(call.node.fun)
+    return seen
+
+  def ready(self, fun):
+    return self.closed or all(call.node.fun in self.defs for f in self.reach(fun) for call in self.called[f])
+
+  # Resolve the calls of a function against the functions of the unit
+  def resolve(self, fun):
+    if fun in self.callees: return self.callees[fun]
+    callees = self.callees[fun] = []
+    for call in self.called[fun]:
+      callee = self.defs.get(call.node.fun)
+      if callee is None:
+        msg = f'Function {call.node.fun} at line {call.line} is undefined'
+      elif len(callee.node.inp) != len(call.node.args):
+        msg = f'Function {call.node.fun} at line {call.line} takes {len(callee.node.inp)} arguments but {len(call.node.args)} were given'
+      elif not callee.node.out:
+        msg = f'Function {call.node.fun} at line {call.line} has no output to return'
+      else:
+        if call.node.fun not in callees: callees.append(call.node.fun)
+        continue
+      self.errors.append((call.line, ParsingError(msg, call.line, call.col)))
+    return callees
+
+  # Tarjan's strongly connected components of the functions fun reaches that
+  # have no key yet, which come out callees first
+  def components(self, fun):
+    index, low, stack, order = {}, {}, [], []
+    def visit(f):
+      index[f] = low[f] = len(index); stack.append(f)
+      for g in self.resolve(f):
+        if g in self.keys: continue
+        if g not in index: visit(g); low[f] = min(low[f], low[g])
+        elif g in stack: low[f] = min(low[f], index[g])
+      if low[f] == index[f]:
+        scc = []
+        while not scc or scc[-1] != f: scc.append(stack.pop())
+        order.append(scc[::-1])
+    visit(fun)
+    return order
+
+  def recursive(self, scc):
+    return len(scc) > 1 or scc[0] in self.callees[scc[0]]
+
+  # Functions are keyed by their text without their name and by the keys of
+  # their callees, so renaming a function or editing an unrelated one keeps
+  # its key; the members of a recursive component share their text
+  def key(self, fun):
+    if fun in self.keys: return self.keys[fun]
+    if not self.ready(fun): raise ValueError(f'Function {fun} calls a function that is not defined yet')
+    def text(f):
+      ast = self.defs[f]
+      inp, out = ' '.join(map(repr, ast.node.inp)), ' '.join(map(repr, ast.node.out))
+      return f'({inp}) -> ({out}) {ast.node.body.unparse()}'
+    for scc in self.components(fun):
+      outside = sorted(f'{g}={self.keys[g]}' for f in scc for g in self.callees[f] if g not in scc)
+      shared = '\n'.join(sorted(map(text, scc)) + outside)
+      for f in scc:
+        self.keys[f] = hashlib.sha1(f'{text(f)}\n{shared}'.encode()).hexdigest()
+      if self.recursive(scc): self.summaries.update((self.keys[f], Summary(f, self.keys[f])) for f in scc)
+      self.order.append(scc)
+    return self.keys[fun]
+
+  # The summary of a function, computed the first time it is asked for (its
+  # callees are summarized as its analysis reaches their calls); calls
+  # within a recursive component are left unbounded
+  def summary(self, fun):
+    if fun not in self.keys and (fun not in self.defs or not self.ready(fun)): return None
+    key = self.key(fun)
+    if key not in self.summaries:
+      ast = self.defs[fun]
+      cfg = CFG.construct_cfg(ast)
+      ranges = INTERVAL.intervals(cfg, calls=self)
+      value = ranges.range(cfg[-1], ast.node.out[0])
+      trips = {cfg.index(h)+1 : t for h, t in ranges.trips.items() if t is not None}
+      inputs = [v.sym for v in ast.node.inp]
+      self.summaries[key] = Summary(fun, key, value or INTERVAL.TOP, ast.node.out[0].sym not in ranges.fractional,
+                                    trips, inputs, self.returns(ast, cfg))
+      self.computed += 1
+    return self.summaries[key]
+
+  # The value a function without loops returns, as an expression of its
+  # inputs joined over the paths through it
+  def returns(self, ast, cfg):
+    if STRUCT.structure(cfg).loops: return None
+    if __package__: from .while_analysis import extract_BigO, terms
+    else: from while_analysis import extract_BigO, terms
+    values = list(dict.fromkeys(O[ast.node.out[0].sym] for O in extract_BigO(cfg[0], cfg, calls=self)[-1]))
+    if len(values) < 2: return values[0] if values else None
+    from sympy import Max, default_sort_key
+    return Max(*sorted(set().union(*map(terms, values)), key=default_sort_key), evaluate=False)
+
+  # Replace every call in an expression by what its callee returns, in terms
+  # of the arguments of the call, where that is known
+  def inline(self, expr):
+    if not isinstance(expr, E.Expr): return expr
+    found = {}
+    for e in E.walk(expr):
+      if e.op != E.CALL: continue
+      summary = self.summary(e.name)
+      if summary is not None and summary.bound is not None:
+        found[e] = E.substitute(summary.bound, dict(zip(summary.inputs, map(self.inline, e.args))))
+    return E.substitute(expr, found) if found else expr
+
+  # Apply the callee's summary at a call site
+  def apply(self, fun):
+    summary = self.summary(fun)
+    return INTERVAL.TOP if summary is None else summary.value
+
+  def integral(self, fun):
+    summary = self.summary(fun)
+    return summary is not None and summary.integral
+
+  def report(self):
+    total, summarized = len(self.defs), sum(self.keys.get(f) in self.summaries for f in self.defs)
+    return f'Summarized {summarized} of {total} function{"" if total == 1 else "s"} by analyzing {self.computed}.'
+
+# The call graph of a whole unit, every call of it resolved
+def link(defs):
+  return CallGraph(defs).close()
+
+# Test on a simple program
+if __name__ == '__main__':
+  from while_unit import parse_unit
+  code = """
+    def main (n) -> (x y) {
+      x := sum(1 10);
+      y := 0;
+      while y < count(1 (x + 5)) {y := y + 1;}
+    }
+    def sum (a b) -> (s) {
+      s := 0;
+      for i in [a .. b] {s := s + 1;}
+    }
+    def count (a b) -> (s) {
+      s := 0;
+      for i in [a .. b] {s := s + 1;}
+    }
+    def loop (n) -> (x) {
+      x := loop(n);
+    }
+  """
+  calls = CallGraph()
+  for ast in parse_unit(code=code):
+    calls.add(ast)
+    print(ast.node.fun, 'is ready' if calls.ready(ast.node.fun) else 'waits for the unit to be closed')
+  calls.close()
+  print([scc for scc in calls.order])
+  for fun in calls.defs: print(f'{fun}: {calls.summary(fun)}')
+  print(calls.report())
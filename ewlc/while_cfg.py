@@ -3,15 +3,20 @@
 #
 # Control Flow Graph for the extended WHILE language
 # ------------------------------------------------------------
+import threading
+from array import array
 from collections import namedtuple, defaultdict
+from functools import lru_cache
 
 def construct_cfg(ast):
-  cfg, bytecode = [], ast.bytecode()
+  cfg, bytecode = Graph(), ast.bytecode()
+  routed = defaultdict(list) # the nodes whose edges go through each jump
   for i, u in enumerate(bytecode[:-1]):
     if isinstance(u, JUMP): continue
 
     j = i+1
     while isinstance(bytecode[j], JUMP):
+      routed[bytecode[j]].append(u)
       j += bytecode[j].node.delta
     bytecode[j].enter.append(u)
     u.exit = bytecode[j] # if_true / while_true
@@ -19,6 +24,7 @@ def construct_cfg(ast):
     if isinstance(u, CONDJUMP):
       j = i+u.node.delta
       while isinstance(bytecode[j], JUMP):
+        routed[bytecode[j]].append(u)
         j += bytecode[j].node.delta
       bytecode[j].enter.append(u)
       u.diverge = bytecode[j] # if_false / while_break
@@ -26,9 +32,38 @@ def construct_cfg(ast):
     cfg.append(u)
 
   cfg.append(bytecode[-1])
+
+  # The loops lowering recorded, with their jumps resolved to the nodes
+  # that take them, are kept until the graph changes
+  table = [u.lowered for u in cfg if getattr(u, 'lowered', None) is not None]
+  for loop in table:
+    loop.exit = loop.header.diverge
+    loop.breaks = list(dict.fromkeys(w for jump in loop.breaks for w in routed[jump]))
+    loop.continues = list(dict.fromkeys(w for jump in loop.continues for w in routed[jump]))
+  cfg.cache['lowered'] = table
   return cfg
 
-def visualize_cfg(cfg, file='cfg.png'):
+# Source spans are interned into parallel arrays of lines and columns shared
+# by every graph, so a node only keeps the index of its span; span 0 is for
+# nodes that come from no source. Spans are added under the lock, so that
+# threads lowering at once agree on their indices
+LINES, COLS, SPANS, LOCK = array('l', [0]), array('l', [0]), {}, threading.Lock()
+
+def span(line, col=None):
+  if line is None: return 0
+  key = (line, col or 0)
+  index = SPANS.get(key)
+  if index is None:
+    with LOCK:
+      if key not in SPANS:
+        LINES.append(key[0]); COLS.append(key[1])
+        SPANS[key] = len(LINES) - 1
+      index = SPANS[key]
+  return index
+
+# With heat, the (node attributes by index, edge attributes by index pair,
+# graph label) of a profile are drawn over the graph
+def visualize_cfg(cfg, file='cfg.png', heat=None):
   try:
     import pygraphviz as pgv
   except Exception:
@@ -36,35 +71,133 @@ def visualize_cfg(cfg, file='cfg.png'):
     return
 
   G = pgv.AGraph(directed=True)
+  nodes, edges, label = heat if heat is not None else ({}, {}, None)
   
   to_visit, visited = set([(0,cfg[0])]), set()
   while to_visit:
     i, u = to_visit.pop(); visited.add(u)
     if not u.exit: continue
     j, v = cfg.index(u.exit), u.exit
-    G.add_edge(f'[{u}]^{i+1}', f'[{v}]^{j+1}', color='black')
+    G.add_edge(f'[{u}]^{i+1}', f'[{v}]^{j+1}', **{'color' : 'black', **edges.get((i, j), {})})
     G.get_node(f'[{u}]^{i+1}').attr['label'] = ''
     G.get_node(f'[{v}]^{j+1}').attr['label'] = ''
     if not (v in visited): to_visit.add((j,v))
     if isinstance(u, CONDJUMP):
       j, v = cfg.index(u.diverge), u.diverge
-      G.add_edge(f'[{u}]^{i+1}', f'[{v}]^{j+1}', color='red' if u.loops else 'blue')
+      G.add_edge(f'[{u}]^{i+1}', f'[{v}]^{j+1}', **{'color' : 'red' if u.loops else 'blue', **edges.get((i, j), {})})
       G.get_node(f'[{u}]^{i+1}').attr['label'] = ''
       G.get_node(f'[{v}]^{j+1}').attr['label'] = ''
       if not (v in visited): to_visit.add((j,v))
+  for i, attrs in nodes.items():
+    if G.has_node(f'[{cfg[i]}]^{i+1}'): G.get_node(f'[{cfg[i]}]^{i+1}').attr.update(attrs)
   
   G.node_attr['shape'] = 'circle'
   G.node_attr['width'] = '.2'
   G.node_attr['height'] = '.2'
+  if label is not None: G.graph_attr.update(label=label, labelloc='t', labeljust='l')
   G.draw(file, args='-Gratio=1', prog='dot')
 
 def negate(cond):
   return not cond if isinstance(cond, bool) else ~cond
 
+def successors(u):
+  succ = [u.exit] if u.exit else []
+  if isinstance(u, CONDJUMP) and u.diverge: succ.append(u.diverge)
+  if isinstance(u, MEMO): succ.extend(u.cont)
+  return succ
+
+# The CFG is a list of nodes that remembers the structures derived from it
+# (dominators, loops, ...) until either the list or an edge is modified.
+class Graph(list):
+  source = None # the file the graph was lowered from
+  def __init__(self, *args):
+    super().__init__(*args)
+    self.cache = {}
+    for u in self: u.graph = self
+  def invalidate(self):
+    self.cache.clear()
+  # The loop table of lowering, while the graph is still as it was lowered
+  def lowered(self):
+    return self.cache.get('lowered')
+  # The source lines and columns of the nodes, label by label
+  def spans(self):
+    if 'spans' not in self.cache:
+      self.cache['spans'] = (array('l', (LINES[u.span] for u in self)), array('l', (COLS[u.span] for u in self)))
+    return self.cache['spans']
+  # Where a node comes from, as file:line:col (the file is left out when the
+  # graph does not know its source)
+  def cite(self, u):
+    lines, cols = self.spans()
+    i = self.index(u)
+    place = f'{lines[i]}:{cols[i]}' if lines[i] else '?'
+    return f'{self.source}:{place}' if self.source else place
+  def adopt(self, nodes):
+    for u in nodes: u.graph = self
+    self.invalidate()
+  def __setitem__(self, i, u):
+    nodes = list(u) if isinstance(i, slice) else [u]
+    super().__setitem__(i, nodes if isinstance(i, slice) else u)
+    self.adopt(nodes)
+  def __delitem__(self, i):
+    super().__delitem__(i); self.invalidate()
+  def __iadd__(self, nodes):
+    self.extend(nodes); return self
+  def append(self, u):
+    super().append(u); self.adopt([u])
+  def extend(self, nodes):
+    nodes = list(nodes)
+    super().extend(nodes); self.adopt(nodes)
+  def insert(self, i, u):
+    super().insert(i, u); self.adopt([u])
+  def pop(self, *args):
+    u = super().pop(*args); self.invalidate(); return u
+  def remove(self, u):
+    super().remove(u); self.invalidate()
+
+  # Delete u, sending the edges that entered it on to v (u.exit by default).
+  # END stays last: an entry sent straight to it leaves nothing else to run
+  def bypass(self, u, v=None):
+    v = u.exit if v is None else v
+    for w in successors(u):
+      w.enter = [x for x in w.enter if x is not u]
+    for w in set(u.enter):
+      if w.exit is u: w.exit = v; v.enter.append(w)
+      if getattr(w, 'diverge', None) is u: w.diverge = v; v.enter.append(w)
+      if isinstance(w, MEMO) and u in w.cont: w.cont = [v if x is u else x for x in w.cont]
+    if self[0] is u and v is self[-1]:
+      v.enter = []; self[:] = [v]; return
+    if self[0] is u and v is not None:
+      super().remove(v); super().insert(0, v)
+    self.remove(u)
+
+  # Delete the nodes that cannot be reached from the entry (END always stays,
+  # and stays last)
+  def prune(self):
+    end, reached, to_visit = self[-1], set(), [self[0]]
+    while to_visit:
+      u = to_visit.pop()
+      if u in reached: continue
+      reached.add(u); to_visit.extend(successors(u))
+    for u in self:
+      if u not in reached: continue
+      u.enter = [w for w in u.enter if w in reached]
+    self[:] = [u for u in self if u in reached and u is not end] + [end]
+
+# Nodes with the same label and fields share one tuple class
+@lru_cache(maxsize=None)
+def record(label, fields):
+  return namedtuple(label, fields)
+
 class NODE(object):
+  span = 0 # see span()
   def __init__(self, label='NODE', **kwargs):
     self.label, self.enter, self.exit = label, [], None
-    self.node = namedtuple(label, kwargs.keys())(**kwargs)
+    self.node = record(label, tuple(kwargs))(**kwargs)
+  def __setattr__(self, key, value):
+    super().__setattr__(key, value)
+    if key in ('exit', 'diverge', 'loops', 'node'):
+      graph = self.__dict__.get('graph')
+      if graph is not None: graph.invalidate()
   def __repr__(self):
     return repr(self.node)
 
@@ -85,6 +218,19 @@ class CONDJUMP(NODE):
   def __repr__(self):
     return f'{self.node.cond}'
 
+# A loop as lowering emits it: the header, the nodes of its body (nested
+# loops included) in order, the loop it is nested in, the node it exits to,
+# the nodes that break out of it or continue it and the line of the statement
+class LoopInfo(object):
+  def __init__(self, header, body, breaks, continues, line=None):
+    self.header, self.body, self.line = header, body, line
+    self.breaks, self.continues = breaks, continues
+    self.parent, self.exit = None, None
+  def depth(self):
+    return 0 if self.parent is None else self.parent.depth() + 1
+  def __repr__(self):
+    return f'LoopInfo({self.header}, size={len(self.body)}, line={self.line})'
+
 class MEMO(NODE):
   def __init__(self, cond):
     super().__init__('MEMO', cond=cond)
@@ -0,0 +1,127 @@
+# ------------------------------------------------------------
+# while_cost.py
+#
+# Step counting instrumentation for the extended WHILE language
+# ------------------------------------------------------------
+if __package__:
+  from . import while_ast as AST
+else: # run as a script, or with ewlc/ on sys.path
+  import while_ast as AST
+
+COUNTER = '_cost'
+
+# What a program is charged for: every assignment, every test of a condition
+# and every loop iteration, plus a weight per operator in the expressions
+# they evaluate (call is the weight of a function call, not of its body)
+class CostModel(object):
+  OPS = ('+', '-', '*', '/', '<', '>', '==', 'call')
+  def __init__(self, assign=1, cond=1, iteration=1, ops=None):
+    self.assign, self.cond, self.iteration = assign, cond, iteration
+    self.ops = dict(ops or {})
+    unknown = set(self.ops) - set(self.OPS)
+    if unknown: raise ValueError(f'Operators {", ".join(sorted(unknown))} have no cost')
+
+  # A model from text like 'assign=1,cond=0,*=3,call=10'
+  @classmethod
+  def parse(cls, text):
+    weights, ops = {}, {}
+    for item in filter(None, text.split(',')):
+      name, _, weight = item.partition('=')
+      name = name.strip()
+      (weights if name in ('assign', 'cond', 'iteration') else ops)[name] = int(weight)
+    return cls(ops=ops, **weights)
+
+  def weigh(self, v):
+    if isinstance(v, AST.AEXP) or isinstance(v, AST.BEXP):
+      op = v.node.op if isinstance(v, AST.AEXP) else v.node.rel
+      return self.ops.get(op, 0) + self.weigh(v.node.left) + self.weigh(v.node.right)
+    if isinstance(v, AST.CALL):
+      return self.ops.get('call', 0) + sum(map(self.weigh, v.node.args))
+    return 0
+
+def names(v):
+  if isinstance(v, list):
+    for w in v: yield from names(w)
+  elif isinstance(v, AST.VAR): yield v.id
+  elif isinstance(v, AST.NODE):
+    for w in v.node: yield from names(w)
+
+# Returns a copy of the function that counts what it costs under the model in
+# a new last output, so the value analyses bound its cost like any other
+# output and running it returns its cost. The counter is charged once per
+# straight run of assignments, before the run; a loop charges the first test
+# of its condition before it and every other test with each iteration, so a
+# loop left by a break is charged for one test more than it made
+def instrument(ast, model=None, counter=COUNTER):
+  model = model if model is not None else CostModel()
+  if counter in set(names(ast)):
+    raise ValueError(f'Function {ast.node.fun} already uses the cost counter {counter}')
+  cost = AST.VAR(counter, ast.line, ast.col)
+
+  def charge(weight, at):
+    return AST.ASSIGN(cost, AST.AEXP(cost, '+', AST.NUM(weight)), at.line, at.col)
+
+  def body(v, weight=0, at=None):
+    exp, run = [], []
+    def flush(weight, at):
+      if weight: exp.append(charge(weight, at))
+      exp.extend(run); run.clear()
+    for s in v.node.exp:
+      at = at if at is not None else s
+      if isinstance(s, AST.SKIP): run.append(s); continue
+      if isinstance(s, AST.ASSIGN):
+        weight += model.assign + model.weigh(s.node.aexp)
+        run.append(s); continue
+      if isinstance(s, AST.JUMP):
+        flush(weight, at); exp.append(s)
+      elif isinstance(s, AST.IF):
+        cond, if_true, if_false = s.node
+        flush(weight + model.cond + model.weigh(cond), at)
+        exp.append(AST.IF(cond, body(if_true), body(if_false), s.line, s.col))
+      elif isinstance(s, AST.WHILE):
+        cond, while_true = s.node
+        test = model.cond + model.weigh(cond)
+        flush(weight + test, at)
+        exp.append(AST.WHILE(cond, body(while_true, test + model.iteration, s), s.line, s.col))
+      else:
+        idx, start, end, for_each = s.node
+        flush(weight + model.weigh(start) + model.weigh(end) + model.cond, at)
+        exp.append(AST.FOR(idx, start, end, body(for_each, model.cond + model.iteration, s), s.line, s.col))
+      weight, at = 0, None
+    flush(weight, at)
+    return AST.BODY(exp)
+
+  # The counter starts at the first charge, or at 0 if the function starts
+  # with a control statement
+  fun, inp, out, main = ast.node
+  main = body(main)
+  first = main.node.exp[0] if main.node.exp else None
+  if isinstance(first, AST.ASSIGN) and first.node.var is cost:
+    main.node.exp[0] = AST.ASSIGN(cost, first.node.aexp.node.right, first.line, first.col)
+  else: main.node.exp.insert(0, AST.ASSIGN(cost, AST.NUM(0), ast.line, ast.col))
+  return AST.DEF(fun, inp, out + [cost], main, ast.line, ast.col)
+
+# Test on a simple program
+if __name__ == '__main__':
+  from while_parser import WhileParser
+  from while_exec import execute
+  from while_interval import intervals
+  import while_cfg as CFG
+  code = """
+    def func (a b) -> (x) {
+      x := 0;
+      for i in [1 .. 10] {
+        x := x + i * a;
+        if x > b {break;}
+      }
+      while x < b {x := x * 2 + 1;}
+    }
+  """
+  ast = WhileParser().parse(code)
+  for model in [CostModel(), CostModel.parse('assign=0,cond=0,iteration=1'), CostModel.parse('*=3,+=1')]:
+    counted = instrument(ast, model)
+    print(counted.unparse())
+    cfg = CFG.construct_cfg(counted)
+    print('  cost at most', intervals(cfg).range(cfg[-1], counted.node.out[-1]))
+    for inputs in [(1, 5), (2, 100)]:
+      print(' ', inputs, '->', execute(counted, inputs))
@@ -0,0 +1,192 @@
+# ------------------------------------------------------------
+# while_diff.py
+#
+# Compare the loops of two versions of an extended WHILE program
+# ------------------------------------------------------------
+import re
+from collections import namedtuple
+from difflib import SequenceMatcher
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_structure as STRUCT
+  from . import while_cache as CACHE
+  from .while_analysis import analyze
+  from .while_calls import link
+  from .while_unit import parse_unit
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_structure as STRUCT
+  import while_cache as CACHE
+  from while_analysis import analyze
+  from while_calls import link
+  from while_unit import parse_unit
+
+# A loop of one version: the label and place of its header, the hash of its
+# subgraph (which is blind to labels and source positions) and its summary,
+# with the breakpoints numbered within the loop so that they compare across
+# versions
+Loop = namedtuple('Loop', 'label place key summary')
+
+def describe(summary):
+  if 'trips' in summary: return f"at most {summary['trips']} iterations"
+  breaks = len(summary['breaks'])
+  return 'no breakpoints' if not breaks else f'{breaks} breakpoint{"" if breaks == 1 else "s"} {summary["breaks"]}'
+
+# How fast an expression grows with its symbols, as (degree, degree of its
+# logarithms): a polynomial has its total degree, a logarithm grows slower
+# than any power and an exponential faster. None where it is not known
+def degree(e):
+  import sympy
+  if e.is_number: return (0, 0) if e.is_finite else None
+  if e.is_polynomial(*e.free_symbols): return (sympy.Poly(e, *e.free_symbols).total_degree(), 0)
+  if isinstance(e, (sympy.floor, sympy.ceiling)): return degree(e.args[0])
+  parts = [degree(a) for a in e.args]
+  if None in parts: return None
+  if isinstance(e, sympy.log): return (0, int(parts[0] > (0, 0)))
+  if e.is_Pow and e.base.is_number: return (sympy.oo, 0) if e.base > 1 and parts[1] > (0, 0) else None
+  if isinstance(e, (sympy.Max, sympy.Add)): return max(parts)
+  if isinstance(e, sympy.Min): return min(parts)
+  if e.is_Mul: return tuple(map(sum, zip(*parts)))
+  if e.is_Pow and e.exp.is_number: return tuple(d * e.exp for d in parts[0])
+  return None
+
+# The growth of a trip bound as summaries print it: a bound under a limit
+# grows no faster than either. Every name not called is a symbol, so that
+# variables named like SymPy's constants stay variables
+def growth(trips):
+  import sympy
+  res = []
+  for part in trips.split(' <= '):
+    names = {w : sympy.Symbol(w) for w in re.findall(r'\b[A-Za-z_]\w*\b(?!\s*\()', part) if w != 'oo'}
+    try: res.append(degree(sympy.sympify(part, locals=names)))
+    except (sympy.SympifyError, TypeError, ValueError): return None
+  return None if None in res else min(res)
+
+# How a loop changed: a loop that loses its bound on the iterations or gains
+# breakpoints regressed, and one that gains a bound or loses breakpoints
+# improved, as did one whose bound grows faster or slower than it did
+def verdict(old, new):
+  if old is None: return 'added'
+  if new is None: return 'removed'
+  if old.summary == new.summary: return 'unchanged' if old.key == new.key else 'edited'
+  if ('trips' in old.summary) != ('trips' in new.summary): return 'improved' if 'trips' in new.summary else 'regressed'
+  if 'trips' in old.summary:
+    before, after = growth(old.summary['trips']), growth(new.summary['trips'])
+    if before is None or after is None or before == after: return 'bound changed'
+    return 'regressed' if after > before else 'improved'
+  shift = len(new.summary['breaks']) - len(old.summary['breaks'])
+  return 'regressed' if shift > 0 else 'improved' if shift < 0 else 'breakpoints moved'
+
+class Change(namedtuple('Change', 'fun old new verdict')):
+  def __str__(self):
+    if self.old is None: return f'  + loop at {self.new.place}: {describe(self.new.summary)}'
+    if self.new is None: return f'  - loop at {self.old.place}: {describe(self.old.summary)}'
+    res = f'  {"=" if self.verdict in ("unchanged", "edited") else "~"} loop at {self.old.place} -> {self.new.place}: '
+    if self.old.summary == self.new.summary: return res + f'{describe(self.new.summary)} ({self.verdict})'
+    return res + f'{describe(self.old.summary)} -> {describe(self.new.summary)} ({self.verdict})'
+
+# Every loop of a function, in the order of its source, with the summaries
+# the analysis gives them (reusing those in the cache)
+def loops(ast, calls, cache, source):
+  cfg = CFG.construct_cfg(ast)
+  cfg.source = source
+  headers = sorted(STRUCT.structure(cfg).headers(), key=cfg.index)
+  nodes, numbers = list(cfg), {h : CACHE.canonical(h)[1] for h in headers}
+  found = {h : (cfg.index(h)+1, cfg.cite(h), CACHE.loop_key(h)) for h in headers}
+  summaries = analyze(cfg, cache, calls, log=lambda *args : None, draw=False)
+  res = []
+  for h in headers:
+    label, place, key = found[h]
+    summary = dict(summaries.get(label, {'breaks' : []}))
+    if 'breaks' in summary: summary['breaks'] = sorted(numbers[h][nodes[b-1]] for b in summary['breaks'])
+    res.append(Loop(label, place, key, summary))
+  return res
+
+# Loops are aligned by their hashes in source order: runs of identical loops
+# pair up as unchanged, a run of loops replaced by another pairs up loop by
+# loop, and what is left over was added or removed
+def align(fun, old, new):
+  res = []
+  matcher = SequenceMatcher(None, [u.key for u in old], [u.key for u in new], autojunk=False)
+  for tag, i, j, k, l in matcher.get_opcodes():
+    pairs = list(zip(old[i:j], new[k:l]))
+    pairs += [(u, None) for u in old[i+len(pairs):j]] + [(None, u) for u in new[k+len(pairs):l]]
+    res += [Change(fun, u, v, verdict(u, v)) for u, v in pairs]
+  return res
+
+# The loop changes between two versions of a file. Functions are matched by
+# name, and a function whose key (its text and its callees' keys) did not
+# change is not analyzed at all; the others share one summary cache, so a
+# loop that is the same in both versions is only analyzed once
+class Diff(object):
+  def __init__(self, old, new, cache=None):
+    self.old, self.new = old, new
+    self.cache = cache if cache is not None else CACHE.SummaryCache()
+    self.units = parse_unit(old), parse_unit(new)
+    self.calls = [link(unit) for unit in self.units]
+    self.errors = [(file, line, e) for file, unit, calls in zip((old, new), self.units, self.calls)
+                   for line, e in sorted(unit.errors + calls.errors, key=lambda e : e[0])]
+    self.same, self.changes = [], []
+    old_defs, new_defs = (calls.defs for calls in self.calls)
+    for fun in list(old_defs) + [f for f in new_defs if f not in old_defs]:
+      if fun in old_defs and fun in new_defs and self.calls[0].keys[fun] == self.calls[1].keys[fun]:
+        self.same.append(fun); continue
+      versions = [loops(calls.defs[fun], calls, self.cache, file) if fun in calls.defs else []
+                  for file, calls in zip((old, new), self.calls)]
+      self.changes += align(fun, *versions)
+
+  def regressed(self):
+    return [c for c in self.changes if c.verdict == 'regressed']
+
+  def report(self):
+    lines, fun = [], None
+    for change in self.changes:
+      if change.fun != fun:
+        fun = change.fun
+        where = [f for f, calls in zip(('removed', 'added'), self.calls[::-1]) if fun not in calls.defs]
+        lines.append(f'Function {fun}' + (f' ({where[0]})' if where else '') + ':')
+      lines.append(str(change))
+    if self.same: lines.append(f'Unchanged function{"" if len(self.same) == 1 else "s"}: {", ".join(self.same)}')
+    counts = {}
+    for change in self.changes: counts[change.verdict] = counts.get(change.verdict, 0) + 1
+    lines.append(', '.join(f'{n} {v}' for v, n in sorted(counts.items())) or 'No loops changed')
+    return '\n'.join(lines)
+
+def diff(old, new, cache=None):
+  return Diff(old, new, cache)
+
+# Test on a simple program
+if __name__ == '__main__':
+  import os, tempfile
+  old = """
+    def sum (n) -> (x) {
+      x := 0;
+      for i in [1 .. n] {x := x + i;}
+    }
+    def main (a b) -> (x) {
+      x := 0;
+      for i in [1 .. a] {x := x + i;}
+      while x < b {x := x + 1;}
+      for j in [1 .. b] {x := x + sum(j);}
+    }
+  """
+  new = """
+    def sum (n) -> (x) {
+      x := 0;
+      for i in [1 .. n] {x := x + i;}
+    }
+    def main (a b) -> (x) {
+      x := 0;
+      for i in [1 .. a] {x := x + i;}
+      while x < b {x := x * 2 + 1;}
+      for j in [1 .. b] {x := x + sum(j);}
+      for k in [a .. b] {x := x - k;}
+    }
+  """
+  with tempfile.TemporaryDirectory() as folder:
+    files = [os.path.join(folder, name) for name in ('old.ewl', 'new.ewl')]
+    for file, code in zip(files, (old, new)):
+      with open(file, 'w') as f: f.write(code)
+    changes = diff(*files)
+    print(changes.report().replace(folder + os.sep, ''))
+    print(changes.cache.report())
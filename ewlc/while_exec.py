@@ -0,0 +1,217 @@
+# ------------------------------------------------------------
+# while_exec.py
+#
+# Interpreter over the extended WHILE language CFG
+# ------------------------------------------------------------
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_expr as E
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_expr as E
+from collections import Counter
+from fractions import Fraction
+from math import ceil
+
+class ExecutionError(Exception): pass
+
+def value(e, env, invoke=None):
+  if isinstance(e, bool): return e
+  op = e.op
+  if op == E.NUM: return e.value
+  if op == E.VAR:
+    if e not in env: raise ExecutionError(f'Variable {e} is read before it is assigned')
+    return env[e]
+  args = [value(v, env, invoke) for v in e.args]
+  if op == E.ADD: return sum(args)
+  if op == E.MUL:
+    res = 1
+    for v in args: res *= v
+    return res
+  if op == E.DIV:
+    if args[1] == 0: raise ExecutionError(f'Division by zero in {e}')
+    return E.normal(Fraction(args[0]) / args[1])
+  if op == E.CALL:
+    if invoke is None: raise ExecutionError(f'Call to {e.name} without the functions of its unit')
+    return invoke(e.name, args)
+  if op == E.LT: return args[0] < args[1]
+  if op == E.GT: return args[0] > args[1]
+  if op == E.EQ: return args[0] == args[1]
+  return not args[0]
+
+# An expression as its constant and the coefficients of its variables, or
+# None if it is not affine in them
+def affine(e):
+  if not isinstance(e, E.Expr): return None
+  const, coeffs = E.linear([e])
+  if any(len(factors) != 1 or E.TABLE.ops[factors[0]] != E.VAR for factors in coeffs): return None
+  return const, {E.Expr(factors[0]) : c for factors, c in coeffs.items()}
+
+def product(A, B):
+  return [[sum(a * b for a, b in zip(row, col) if a and b) for col in zip(*B)] for row in A]
+
+def power(M, n):
+  res = [[int(i == j) for j in range(len(M))] for i in range(len(M))]
+  while n:
+    if n & 1: res = product(res, M)
+    M, n = product(M, M), n >> 1
+  return res
+
+# A loop whose body is a straight run of affine assignments, and whose
+# condition compares affine expressions whose difference (the gap) moves by
+# the same step every iteration. One iteration is an affine map of the
+# variables involved, kept as a matrix over them and a constant 1, so n
+# iterations are its n-th power and the trip count follows from the gap
+class Accelerated(object):
+  def __init__(self, header, body, names, matrix, gap, step):
+    self.header, self.body, self.names = header, body, names
+    self.matrix, self.gap, self.step = matrix, gap, step
+    self.edges = list(zip([header] + body, body + [header]))
+    # Variables that are written before they are read need no initial value
+    self.needed = [v for j, v in enumerate(names) if gap[j] or any(row[j] for row in matrix)]
+    self.written = set(u.node.var for u in body)
+
+  @staticmethod
+  def plan(header):
+    cond, body, u = header.node.cond, [], header.exit
+    while u is not header:
+      if not isinstance(u, CFG.ASSIGN) or u in body: return None
+      body.append(u); u = u.exit
+    if not isinstance(cond, E.Expr) or cond.op not in (E.LT, E.GT, E.EQ): return None
+    lhs, rhs = affine(cond.lhs), affine(cond.rhs)
+    updates = [(u.node.var, affine(u.node.aexp)) for u in body]
+    if lhs is None or rhs is None or any(f is None for _, f in updates): return None
+    if cond.op == E.LT: lhs, rhs = rhs, lhs
+    names = list(dict.fromkeys([v for v, _ in updates] + [v for _, f in updates for v in f[1]] + list(lhs[1]) + list(rhs[1])))
+    index, k = {v : j for j, v in enumerate(names)}, len(names)
+    def row(f):
+      res = [0] * (k + 1)
+      for v, c in f[1].items(): res[index[v]] += c
+      res[k] += f[0]
+      return res
+    matrix = [[int(i == j) for j in range(k + 1)] for i in range(k + 1)]
+    for var, f in updates:
+      matrix[index[var]] = product([row(f)], matrix)[0]
+    gap = [a - b for a, b in zip(row(lhs), row(rhs))]
+    moved = product([gap], matrix)[0]
+    if any(moved[j] != gap[j] for j in range(k)): return None
+    return Accelerated(header, body, names, matrix, gap, moved[k] - gap[k])
+
+  # The iterations left from env, None if the loop never ends, or False if
+  # a variable it needs is not assigned yet
+  def trips(self, env):
+    if any(v not in env for v in self.needed): return False
+    gap = sum(c * env[v] for c, v in zip(self.gap, self.names) if c) + self.gap[-1]
+    if self.header.node.cond.op == E.EQ:
+      if gap != 0: return 0
+      return None if self.step == 0 else 1
+    if gap <= 0: return 0
+    return None if self.step >= 0 else ceil(Fraction(gap) / -self.step)
+
+  def apply(self, env, n):
+    state = [env.get(v, 0) for v in self.names] + [1]
+    M = power(self.matrix, n)
+    for v, row in zip(self.names, M):
+      if v in self.written: env[v] = E.normal(sum(c * x for c, x in zip(row, state) if c))
+
+# Runs the CFG of a function one node at a time; `fuel` bounds the number of
+# nodes visited over the run (calls included) and `depth` the call depth.
+# With trace set, the number of times every edge (u, v) is taken is counted
+# in self.trace. With accelerate set, loops that Accelerated can plan are
+# run in closed form: their iterations still count as steps, but not
+# against the fuel
+class Machine(object):
+  def __init__(self, calls=None, fuel=100000, depth=64, trace=False, accelerate=False):
+    self.calls, self.fuel, self.depth = calls, fuel, depth
+    self.steps, self.cfgs, self.stack = 0, {}, []
+    self.trace = Counter() if trace else None
+    self.plans = {} if accelerate else None
+    self.skipped = 0 # steps run in closed form
+
+  def cfg(self, fun):
+    if fun not in self.cfgs:
+      if self.calls is None or fun not in self.calls.defs: raise ExecutionError(f'Function {fun} is undefined')
+      self.cfgs[fun] = CFG.construct_cfg(self.calls.defs[fun])
+    return self.cfgs[fun]
+
+  def invoke(self, fun, args):
+    if len(self.stack) >= self.depth: raise ExecutionError(f'Calls are nested deeper than {self.depth}')
+    cfg, ast = self.cfg(fun), self.calls.defs[fun]
+    self.stack.append(fun)
+    env = self.run(cfg, {v.sym : a for v, a in zip(ast.node.inp, args)})
+    self.stack.pop()
+    return env[ast.node.out[0].sym]
+
+  # Run the loop at header u in closed form if it can be, leaving env as
+  # the last test of its condition finds it
+  def accelerate(self, u, env):
+    if u not in self.plans: self.plans[u] = Accelerated.plan(u)
+    plan = self.plans[u]
+    if plan is None: return
+    n = plan.trips(env)
+    if n is None: raise ExecutionError(f'Ran out of fuel after {self.fuel} steps')
+    if not n: return
+    plan.apply(env, n)
+    steps = n * len(plan.edges)
+    self.steps += steps; self.skipped += steps
+    if self.trace is not None:
+      for edge in plan.edges: self.trace[edge] += n
+
+  def run(self, cfg, env):
+    env, u, end, trace = dict(env), cfg[0], cfg[-1], self.trace
+    while u is not end:
+      if self.plans is not None and isinstance(u, CFG.CONDJUMP) and u.loops: self.accelerate(u, env)
+      self.steps += 1
+      if self.steps - self.skipped > self.fuel: raise ExecutionError(f'Ran out of fuel after {self.fuel} steps')
+      if isinstance(u, CFG.ASSIGN):
+        env[u.node.var] = value(u.node.aexp, env, self.invoke)
+        v = u.exit
+      elif isinstance(u, CFG.CONDJUMP):
+        v = u.exit if value(u.node.cond, env, self.invoke) else u.diverge
+      elif isinstance(u, CFG.MEMO):
+        raise ExecutionError(f'Loop summary at label {cfg.index(u)+1} cannot be executed')
+      else:
+        v = u.exit
+      if trace is not None: trace[u, v] += 1
+      if v is None: raise ExecutionError('Control left the graph')
+      u = v
+    return env
+
+# Execute the function `ast` (or its given CFG) on the inputs, returning its outputs
+def execute(ast, inputs, cfg=None, calls=None, fuel=100000, accelerate=False):
+  machine = Machine(calls, fuel, accelerate=accelerate)
+  cfg = CFG.construct_cfg(ast) if cfg is None else cfg
+  env = machine.run(cfg, {v.sym : val for v, val in zip(ast.node.inp, inputs)})
+  missing = [v for v in ast.node.out if v.sym not in env]
+  if missing: raise ExecutionError(f'Output {missing[0]} is never assigned')
+  return tuple(env[v.sym] for v in ast.node.out)
+
+# Test on a simple program
+if __name__ == '__main__':
+  from while_parser import WhileParser
+  code = """
+    def func (a b) -> (x y) {
+      x := 0;
+      y := 1;
+      for i in [a .. b] {
+        x := x + i;
+        if x > 10 {break;}
+      }
+      while y < x {y := y * 2;}
+    }
+  """
+  ast = WhileParser().parse(code)
+  for inputs in [(1, 3), (0, 10), (5, 2)]:
+    print(inputs, '->', execute(ast, inputs), execute(ast, inputs, accelerate=True))
+
+  # Loops of affine updates run in closed form, whatever their trip count
+  code = """
+    def sums (n) -> (x y) {
+      x := 0;
+      y := 0;
+      for i in [1 .. n] {x := x + i; y := y + x / 2;}
+    }
+  """
+  ast = WhileParser().parse(code)
+  print(execute(ast, (10,)), execute(ast, (10,), accelerate=True))
+  print(execute(ast, (10**12,), accelerate=True)[0])
@@ -0,0 +1,392 @@
+# ------------------------------------------------------------
+# while_expr.py
+#
+# Hash-consed expressions for the extended WHILE language
+# ------------------------------------------------------------
+import threading
+from array import array
+from contextlib import contextmanager
+from fractions import Fraction
+
+# Operators are coded as small integers
+NUM, VAR, ADD, MUL, DIV, CALL, LT, GT, EQ, NOT = range(10)
+NAMES = ('Num', 'Var', 'Add', 'Mul', 'Div', 'Call', 'Lt', 'Gt', 'Eq', 'Not')
+COMMUTATIVE = (ADD, MUL)
+
+# Every distinct expression is stored once, as a row of flat arrays: its
+# operator, its atom (the value of a number, the name of a variable or of a
+# called function) and the slice of `kids` that holds its children. Rows are
+# found again by their operator, atom and children. Rows are only added
+# under the lock, and are found by their key only once they are complete,
+# so threads can share the table
+class Table(object):
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.ops = array('B')
+    self.data = array('i')
+    self.start = array('i')
+    self.count = array('i')
+    self.size = array('i')
+    self.kids = array('i')
+    self.atoms, self.interned = [], {}
+    self.nodes, self.keys = {}, []
+    self.scopes, self.floor = 0, None
+
+  def atom(self, value):
+    key = (type(value), value)
+    i = self.interned.get(key)
+    if i is None:
+      with self.lock:
+        i = self.interned.get(key)
+        if i is None:
+          i = len(self.atoms)
+          self.atoms.append(value)
+          self.interned[key] = i
+    return i
+
+  def find(self, op, data=-1, kids=()):
+    key = (op, data, tuple(kids))
+    i = self.nodes.get(key)
+    if i is None:
+      with self.lock:
+        i = self.nodes.get(key)
+        if i is None:
+          i = len(self.ops)
+          self.ops.append(op); self.data.append(data)
+          self.start.append(len(self.kids)); self.count.append(len(key[2]))
+          self.kids.extend(key[2])
+          self.size.append(1 + sum(self.size[k] for k in key[2]))
+          self.nodes[key] = i
+          self.keys.append(key)
+    return i
+
+  def make(self, op, data=-1, kids=()):
+    return Expr(self.find(op, data, kids))
+
+  def __len__(self):
+    return len(self.ops)
+
+  # Drop every row and atom added since the table had `rows` rows and `atoms`
+  # atoms; the expressions they back must not be used again
+  def truncate(self, rows=0, atoms=0):
+    with self.lock: self.cut(rows, atoms)
+
+  def cut(self, rows, atoms):
+    for key in self.keys[rows:]: del self.nodes[key]
+    for value in self.atoms[atoms:]: del self.interned[(type(value), value)]
+    if rows < len(self.ops): del self.kids[self.start[rows]:]
+    for column in (self.ops, self.data, self.start, self.count, self.size): del column[rows:]
+    del self.keys[rows:], self.atoms[atoms:]
+
+  # Expressions made while a scope is open belong to it, whichever thread
+  # makes them, and the table is cut back once the last open scope ends
+  def enter(self):
+    with self.lock:
+      if not self.scopes: self.floor = (len(self.ops), len(self.atoms))
+      self.scopes += 1
+
+  def leave(self):
+    with self.lock:
+      self.scopes -= 1
+      if not self.scopes: self.cut(*self.floor)
+
+TABLE = Table()
+
+# The table only grows, so a caller that keeps running (a service analyzing
+# one request after another) scopes its work; nothing made in the scope may
+# be used after it ends
+@contextmanager
+def scope():
+  TABLE.enter()
+  try: yield TABLE
+  finally: TABLE.leave()
+
+def reset():
+  TABLE.truncate()
+
+# A handle on a row of the table; since rows are unique, expressions are
+# equal exactly when their rows are. The attributes mirror the SymPy ones
+# the analyses read so that both can be walked alike.
+class Expr(object):
+  __slots__ = ('id',)
+  def __init__(self, i):
+    self.id = i
+
+  @property
+  def op(self): return TABLE.ops[self.id]
+  @property
+  def kids(self):
+    start = TABLE.start[self.id]
+    return TABLE.kids[start:start + TABLE.count[self.id]]
+  @property
+  def args(self): return tuple(map(Expr, self.kids))
+  @property
+  def value(self): return TABLE.atoms[TABLE.data[self.id]] if self.op == NUM else None
+  @property
+  def name(self): return TABLE.atoms[TABLE.data[self.id]] if self.op in (VAR, CALL) else None
+  @property
+  def lhs(self): return self.args[0]
+  @property
+  def rhs(self): return self.args[1]
+
+  is_Number = property(lambda self : self.op == NUM)
+  is_Integer = property(lambda self : self.op == NUM and isinstance(self.value, int))
+  is_Symbol = property(lambda self : self.op == VAR)
+  is_Add = property(lambda self : self.op == ADD)
+  is_Mul = property(lambda self : self.op == MUL)
+
+  @property
+  def free_symbols(self):
+    return set(e for e in walk(self) if e.op == VAR)
+  def xreplace(self, mapping):
+    return substitute(self, mapping)
+  subs = xreplace
+
+  def __eq__(self, obj):
+    if isinstance(obj, Expr): return self.id == obj.id
+    if isinstance(obj, (int, Fraction)) and not isinstance(obj, bool): return self.value == obj and self.op == NUM
+    return NotImplemented
+  def __hash__(self):
+    i = self.id
+    return hash(TABLE.atoms[TABLE.data[i]]) if TABLE.ops[i] == NUM else i
+
+  def __add__(self, obj): return add(self, obj)
+  def __radd__(self, obj): return add(obj, self)
+  def __sub__(self, obj): return sub(self, obj)
+  def __rsub__(self, obj): return sub(obj, self)
+  def __mul__(self, obj): return mul(self, obj)
+  def __rmul__(self, obj): return mul(obj, self)
+  def __truediv__(self, obj): return div(self, obj)
+  def __rtruediv__(self, obj): return div(obj, self)
+  def __neg__(self): return mul(-1, self)
+  def __invert__(self): return negate(self)
+  def __lt__(self, obj): return lt(self, obj)
+  def __gt__(self, obj): return gt(self, obj)
+  def __le__(self, obj): return negate(gt(self, obj))
+  def __ge__(self, obj): return negate(lt(self, obj))
+
+  def __str__(self):
+    return show(self)
+  __repr__ = __str__
+
+def normal(value):
+  value = Fraction(value)
+  return value.numerator if value.denominator == 1 else value
+
+def number(value):
+  return TABLE.make(NUM, TABLE.atom(normal(value)))
+
+def symbol(name):
+  return TABLE.make(VAR, TABLE.atom(str(name)))
+
+def expr(v):
+  if isinstance(v, Expr): return v
+  if isinstance(v, (int, Fraction)) and not isinstance(v, bool): return number(v)
+  raise TypeError(f'{v!r} is not an arithmetic expression')
+
+def call(fun, args):
+  return TABLE.make(CALL, TABLE.atom(str(fun)), tuple(expr(v).id for v in args))
+
+# Split a term into its numeric coefficient and the ids of its other factors
+def coefficient(e):
+  if e.op == NUM: return e.value, ()
+  if e.op != MUL: return 1, (e.id,)
+  kids = e.kids
+  if TABLE.ops[kids[0]] == NUM: return Expr(kids[0]).value, tuple(kids[1:])
+  return 1, tuple(kids)
+
+def term(c, factors):
+  if c == 1 and len(factors) == 1: return Expr(factors[0])
+  return TABLE.make(MUL, -1, factors if c == 1 else (number(c).id,) + factors)
+
+# A sum as its constant and the coefficients of its terms
+def linear(terms):
+  const, coeffs = 0, {}
+  work = [expr(v) for v in terms]
+  while work:
+    e = work.pop()
+    if e.op == ADD: work.extend(e.args); continue
+    c, factors = coefficient(e)
+    if not factors: const += c
+    else: coeffs[factors] = coeffs.get(factors, 0) + c
+  return const, {factors : c for factors, c in coeffs.items() if c != 0}
+
+# Sums are kept flat with like terms collected, so that x + 1 - x is 1
+def add(*terms):
+  const, coeffs = linear(terms)
+  kids = sorted(term(c, factors).id for factors, c in coeffs.items())
+  if const != 0: kids.insert(0, number(const).id)
+  if not kids: return number(0)
+  if len(kids) == 1: return Expr(kids[0])
+  return TABLE.make(ADD, -1, tuple(kids))
+
+# Products are kept flat with their numeric coefficient first; a coefficient
+# is distributed over a single sum, as SymPy does
+def mul(*factors):
+  const, kids = 1, []
+  work = [expr(v) for v in factors]
+  while work:
+    e = work.pop()
+    if e.op == MUL: work.extend(e.args)
+    elif e.op == NUM: const *= e.value
+    else: kids.append(e.id)
+  if const == 0 or not kids: return number(const)
+  if len(kids) == 1 and const != 1 and TABLE.ops[kids[0]] == ADD:
+    return add(*[mul(const, v) for v in Expr(kids[0]).args])
+  return term(const, tuple(sorted(kids)))
+
+def sub(a, b):
+  return add(a, mul(-1, b))
+
+def div(a, b):
+  a, b = expr(a), expr(b)
+  if b.op == NUM and b.value != 0: return mul(Fraction(1) / b.value, a)
+  if a.op == NUM and a.value == 0: return a
+  return TABLE.make(DIV, -1, (a.id, b.id))
+
+# Relations between expressions that differ by a constant are decided,
+# without interning their difference
+def difference(a, b):
+  (ca, ta), (cb, tb) = linear([a]), linear([b])
+  return ca - cb if ta == tb else None
+
+def lt(a, b):
+  d = difference(b, a)
+  return d > 0 if d is not None else TABLE.make(LT, -1, (expr(a).id, expr(b).id))
+
+def gt(a, b):
+  d = difference(a, b)
+  return d > 0 if d is not None else TABLE.make(GT, -1, (expr(a).id, expr(b).id))
+
+def eq(a, b):
+  d = difference(a, b)
+  return d == 0 if d is not None else TABLE.make(EQ, -1, (expr(a).id, expr(b).id))
+
+def negate(cond):
+  if isinstance(cond, bool): return not cond
+  if cond.op == NOT: return cond.args[0]
+  return TABLE.make(NOT, -1, (cond.id,))
+
+def rebuild(e, kids):
+  op = e.op
+  if op == ADD: return add(*kids)
+  if op == MUL: return mul(*kids)
+  if op == DIV: return div(*kids)
+  if op == CALL: return call(e.name, kids)
+  if op == LT: return lt(*kids)
+  if op == GT: return gt(*kids)
+  if op == EQ: return eq(*kids)
+  if op == NOT: return negate(kids[0])
+  return e
+
+# Yield every distinct subexpression of e once
+def walk(e):
+  if not isinstance(e, Expr): return
+  seen, work = set(), [e]
+  while work:
+    v = work.pop()
+    if v.id in seen: continue
+    seen.add(v.id); yield v
+    work.extend(v.args)
+
+def size(e):
+  return TABLE.size[e.id] if isinstance(e, Expr) else 1
+
+# Replace subexpressions by the mapping, which is only looked into with `in`
+# and `[]` so that persistent states map without being copied. Once a SymPy
+# expression is involved the substitution is done in SymPy
+def substitute(e, mapping):
+  if isinstance(mapping, dict) and not mapping: return e
+  if not isinstance(e, Expr):
+    if not hasattr(e, 'xreplace'): return e
+    found = {s : mapping[v] for s in e.free_symbols for v in [symbol(s.name)] if v in mapping}
+    return e.xreplace({s : to_sympy(v) for s, v in found.items()}) if found else e
+  memo, symbolic = {}, []
+  def visit(v):
+    if v in mapping:
+      w = mapping[v]
+      if isinstance(w, Expr): return w
+      if isinstance(w, (int, Fraction)) and not isinstance(w, bool): return number(w)
+      symbolic.append(v)
+      return v
+    if v.id not in memo:
+      args = v.args
+      memo[v.id] = rebuild(v, [visit(w) for w in args]) if args else v
+    return memo[v.id]
+  res = visit(e)
+  if not symbolic: return res
+  return to_sympy(e).xreplace({to_sympy(v) : to_sympy(mapping[v]) for v in walk(e) if v in mapping})
+
+# Conversion to SymPy, only where symbolic solving is needed
+def to_sympy(e, memo=None):
+  if not isinstance(e, Expr): return e
+  import sympy
+  memo = {} if memo is None else memo
+  if e.id in memo: return memo[e.id]
+  args = [to_sympy(v, memo) for v in e.args]
+  op = e.op
+  if op == NUM: res = sympy.Rational(e.value.numerator, e.value.denominator) if isinstance(e.value, Fraction) else sympy.Integer(e.value)
+  elif op == VAR: res = sympy.Symbol(e.name)
+  elif op == ADD: res = sympy.Add(*args)
+  elif op == MUL: res = sympy.Mul(*args)
+  elif op == DIV: res = args[0] / args[1]
+  elif op == CALL: res = sympy.Function(e.name)(*args)
+  elif op == LT: res = sympy.Lt(*args)
+  elif op == GT: res = sympy.Gt(*args)
+  elif op == EQ: res = sympy.Eq(*args)
+  else: res = sympy.Not(args[0])
+  memo[e.id] = res
+  return res
+
+def product(c, factors, wrap):
+  powers = {}
+  for v in factors: powers[v] = powers.get(v, 0) + 1
+  text = '*'.join(sorted(wrap(Expr(v)) + (f'**{n}' if n > 1 else '') for v, n in powers.items()))
+  c, den = (c.numerator, f'/{c.denominator}') if isinstance(c, Fraction) else (c, '')
+  return (text if c == 1 else f'-{text}' if c == -1 else f'{c}*{text}') + den
+
+def show(e):
+  if not isinstance(e, Expr): return str(e)
+  op, args = e.op, e.args
+  wrap = lambda v : f'({show(v)})' if v.op in (ADD, DIV) or (v.op == MUL and v.args[0].op == NUM) else show(v)
+  if op == NUM: return str(e.value)
+  if op == VAR: return e.name
+  if op == ADD:
+    terms = sorted((v for v in args if v.op != NUM), key=show) + [v for v in args if v.op == NUM]
+    res = ''
+    for v in terms:
+      c, factors = coefficient(v)
+      text = show(v) if c > 0 else product(-c, factors, wrap) if factors else str(-c)
+      res += (f' - {text}' if c < 0 else f' + {text}') if res else (f'-{text}' if c < 0 else text)
+    return res
+  if op == MUL: return product(*coefficient(e), wrap)
+  if op == DIV: return f'{wrap(args[0])}/{wrap(args[1])}'
+  if op == CALL: return f'{e.name}({", ".join(map(show, args))})'
+  if op == LT: return f'{show(args[0])} < {show(args[1])}'
+  if op == GT: return f'{show(args[0])} > {show(args[1])}'
+  if op == EQ: return f'Eq({show(args[0])}, {show(args[1])})'
+  return f'~({show(args[0])})'
+
+# A printout that does not depend on the order expressions were created in,
+# for keys that must be stable between runs
+def srepr(e, memo=None):
+  if not isinstance(e, Expr): return repr(e)
+  memo = {} if memo is None else memo
+  if e.id not in memo:
+    if e.op == NUM: text = f'Num({e.value!r})'
+    elif e.op in (VAR, CALL): text = f'{NAMES[e.op]}({e.name!r}' + ''.join(f', {srepr(v, memo)}' for v in e.args) + ')'
+    else:
+      args = [srepr(v, memo) for v in e.args]
+      if e.op in COMMUTATIVE: args.sort()
+      text = f'{NAMES[e.op]}({", ".join(args)})'
+    memo[e.id] = text
+  return memo[e.id]
+
+# Test on a simple program
+if __name__ == '__main__':
+  x, y, n = symbol('x'), symbol('y'), symbol('n')
+  e = (x + 1) * 2 - 2 * x
+  print(e, (x + y) == (y + x), (x + 1 - x) == 1)
+  print(x * y + n / 2, 3 - y, call('f', [x, y + 1]), ~(x < n), x < x + 1)
+  print(srepr(e + x * y), to_sympy(e + x * y), size(e + x * y))
+  print(substitute(x * y + n, {x : number(3), n : y}), len(TABLE), 'nodes')
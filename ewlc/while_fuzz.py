@@ -0,0 +1,125 @@
+# ------------------------------------------------------------
+# while_fuzz.py
+#
+# Random programs for testing the extended WHILE language front end
+# ------------------------------------------------------------
+import random, re
+
+# Valid programs follow the scoping rules of the parser: a variable is read
+# only once it is assigned in an enclosing scope, loop indices are fresh and
+# break / continue only appear inside loops. Every while loop counts up a
+# fresh counter first thing in its body, and every for loop has literal
+# bounds, so all programs terminate on any input
+class Generator(object):
+  def __init__(self, seed, size=12, depth=3):
+    self.random, self.size, self.depth = random.Random(seed), size, depth
+
+  def fresh(self, prefix):
+    self.names += 1
+    return f'{prefix}{self.names}'
+
+  def defined(self):
+    return [v for scope in self.scopes for v in scope]
+
+  def number(self):
+    return str(self.random.randint(0, 9))
+
+  def aexp(self, depth=2):
+    r = self.random.random()
+    if depth == 0 or r < 0.3:
+      return self.random.choice(self.defined()) if self.random.random() < 0.7 else self.number()
+    left = self.aexp(depth - 1)
+    if r < 0.6: return f'{left} + {self.aexp(depth - 1)}'
+    if r < 0.8: return f'{left} - ({self.aexp(depth - 1)})'
+    if r < 0.9: return f'({left}) * {self.random.randint(0, 3)}'
+    if r < 0.95: return f'({left}) / {self.random.randint(1, 4)}'
+    return f'-({left})'
+
+  def bexp(self):
+    if self.random.random() < 0.1: return self.random.choice(['true', 'false'])
+    return f'{self.aexp()} {self.random.choice(["<", ">", "=="])} {self.aexp()}'
+
+  def assign(self):
+    # Either update a variable in scope or define a new one in this scope
+    known = [v for v in self.defined() if v not in self.readonly]
+    var = self.random.choice(known) if known and self.random.random() < 0.7 else self.fresh('v')
+    line = f'{var} := {self.aexp()};'
+    self.scopes[-1].add(var)
+    return line
+
+  def block(self, depth, loops):
+    self.scopes.append(set())
+    lines = [self.stmt(depth, loops) for _ in range(self.random.randint(1, 3))]
+    self.scopes.pop()
+    return '{' + ' '.join(lines) + '}'
+
+  def stmt(self, depth, loops):
+    r = self.random.random()
+    if depth == 0 or r < 0.45: return self.assign()
+    if r < 0.5: return 'skip;'
+    if r < 0.55 and loops: return self.random.choice(['break;', 'continue;'])
+    if r < 0.7:
+      cond = self.bexp()
+      if self.random.random() < 0.5: return f'if {cond} {self.block(depth - 1, loops)}'
+      return f'if {cond} {self.block(depth - 1, loops)} else {self.block(depth - 1, loops)}'
+    if r < 0.85:
+      # The counter lives in the enclosing scope and is only written here
+      counter = self.fresh('c')
+      self.scopes[-1].add(counter); self.readonly.add(counter)
+      bound = self.random.randint(0, 4)
+      self.scopes.append({counter})
+      body = self.block(depth - 1, loops + 1)[1:]
+      self.scopes.pop()
+      cond = f'{counter} < {bound}' if self.random.random() < 0.5 else f'{counter} < {bound} + 0 * ({self.aexp(1)})'
+      return f'{counter} := 0; while {cond} {{{counter} := {counter} + 1; {body}'
+    idx = self.fresh('i')
+    start, end = self.random.randint(-2, 2), self.random.randint(-2, 4)
+    self.scopes.append({idx}); self.readonly.add(idx)
+    body = self.block(depth - 1, loops + 1)
+    self.scopes.pop()
+    return f'for {idx} in [{start} .. {end}] {body}'
+
+  # A valid function with the given name
+  def program(self, fun='f'):
+    self.names, self.readonly = 0, set()
+    inputs = ['a', 'b', 'c'][:self.random.randint(1, 3)]
+    outputs = ['x', 'y'][:self.random.randint(1, 2)]
+    self.scopes = [set(inputs), set()]
+    lines = [f'{out} := {self.aexp()};' for out in outputs]
+    for out in outputs: self.scopes[-1].add(out)
+    lines += [self.stmt(self.depth, 0) for _ in range(self.random.randint(1, self.size))]
+    return f'def {fun} ({" ".join(inputs)}) -> ({" ".join(outputs)}) {{\n  ' + '\n  '.join(lines) + '\n}'
+
+  def inputs(self, code):
+    arity = len(code[code.index('(')+1:code.index(')')].split())
+    return tuple(self.random.randint(-3, 5) for _ in range(arity))
+
+  # An invalid function, made by breaking a valid one in a way that no
+  # parse can recover from
+  def invalid(self, fun='f'):
+    code = self.program(fun)
+    head, body = code.split('{\n', 1)
+    breaks = [
+      lambda : code[:code.rindex('}')],                        # missing closing brace
+      lambda : f'{head}{{\n  break;\n{body}',                 # jump outside of a loop
+      lambda : f'{head}{{\n  v0 := undefined + 1;\n{body}',   # undefined variable
+      lambda : code.replace('(a', '(a a', 1),                  # repeated input
+      lambda : f'{head}{{\n  while := 1;\n{body}',            # reserved word as a variable
+      lambda : code.replace(') {', ') -> (z) {', 1),           # second output list
+      lambda : code.replace(':=', ':= :=', 1),                 # doubled assignment
+    ]
+    return self.random.choice(breaks)()
+
+  # A valid function with a few words dropped, which may break it anywhere
+  def mangled(self, fun='f', drops=3):
+    words = re.split(r'(\s+)', self.program(fun))
+    for _ in range(self.random.randint(1, drops)):
+      words[self.random.randrange(0, len(words), 2)] = ''
+    return ''.join(words)
+
+# Test on a simple program
+if __name__ == '__main__':
+  generator = Generator(0)
+  print(generator.program())
+  print(generator.invalid('g'))
+  print(generator.mangled('h'))
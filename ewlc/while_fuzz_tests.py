@@ -0,0 +1,326 @@
+# ------------------------------------------------------------
+# while_fuzz_tests.py
+#
+# Randomized tests for the extended WHILE language front end
+#
+#   pytest                    # EWLC_FUZZ_PROGRAMS programs per test
+#   pytest -n auto            # spread the seeds over every core (pytest-xdist)
+#
+# EWLC_MIN_PROGRAMS_PER_SECOND sets how many generated programs the front end
+# must lex, parse and unparse per second for the throughput test to pass, and
+# EWLC_MAX_IMPORT_SECONDS how long importing the ewlc package may take
+# ------------------------------------------------------------
+import os, re, subprocess, sys, time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import ewlc
+import while_cfg as CFG
+from while_calls import link
+from while_cost import instrument, CostModel
+from while_diff import diff, loops
+from while_exec import execute, ExecutionError, Machine
+from while_fuzz import Generator
+from while_interval import intervals, Interval
+from while_opt import optimize
+from while_search import Search
+from while_ssa import construct_ssa
+from while_structure import Structure
+from while_parser import WhileParser, WhileChecker, ParsingError
+from while_profile import record, save, load
+from while_unit import parse_unit
+
+PROGRAMS = int(os.environ.get('EWLC_FUZZ_PROGRAMS', 100))
+MIN_PROGRAMS_PER_SECOND = float(os.environ.get('EWLC_MIN_PROGRAMS_PER_SECOND', 50))
+MAX_IMPORT_SECONDS = float(os.environ.get('EWLC_MAX_IMPORT_SECONDS', 0.25))
+SEEDS = range(PROGRAMS)
+
+@pytest.fixture(scope='module')
+def parser():
+  return WhileParser()
+
+@pytest.fixture(scope='module')
+def checker():
+  return WhileChecker()
+
+def run(ast, inputs, cfg=None):
+  try: return execute(ast, inputs, cfg)
+  except ExecutionError as e: return type(e)
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_round_trip(parser, seed):
+  code = Generator(seed).program()
+  ast = parser.parse(code)
+  again = parser.parse(ast.unparse())
+  assert again == ast
+  assert again.unparse() == ast.unparse()
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_invalid(parser, seed):
+  code = Generator(seed).invalid()
+  with pytest.raises(ParsingError):
+    parser.parse(code)
+
+# The compilation unit front end splits the text before parsing, so every
+# function of a unit must come out as if it had been parsed on its own
+@pytest.mark.parametrize('seed', SEEDS[::10])
+def test_unit_backend(parser, seed):
+  generator = Generator(seed)
+  codes = [generator.program(f'f{k}') for k in range(5)]
+  unit = parse_unit(code='\n\n'.join(codes))
+  assert list(unit) == [parser.parse(code) for code in codes]
+  assert unit.errors == []
+
+# The checker runs the parser's driver with skeleton actions, so it must
+# accept what the parser accepts and report the error the parser stops at
+@pytest.mark.parametrize('seed', SEEDS)
+def test_checker(parser, checker, seed):
+  generator = Generator(seed)
+  assert checker.parse(generator.program()) == []
+  code = generator.invalid()
+  with pytest.raises(ParsingError) as expected:
+    parser.parse(code)
+  assert str(expected.value) in [str(e) for _, e in checker.parse(code)]
+
+# Recovering from errors must not change valid programs, and the checker
+# must recover from the same errors the parser does
+@pytest.mark.parametrize('seed', SEEDS)
+def test_recovery(parser, checker, seed):
+  generator = Generator(seed)
+  code = generator.program()
+  assert parser.recover(code) == (parser.parse(code), [])
+  code = generator.mangled()
+  ast, errors = parser.recover(code)
+  assert [(line, e.col, str(e)) for line, e in errors] == [(line, e.col, str(e)) for line, e in checker.parse(code)]
+  if not errors: assert ast == parser.parse(code)
+
+# Running a program, its unparsed text and its optimized graph must agree
+@pytest.mark.parametrize('seed', SEEDS)
+def test_execution(parser, seed):
+  generator = Generator(seed)
+  ast = parser.parse(generator.program())
+  again = parser.parse(ast.unparse())
+  for _ in range(3):
+    inputs = generator.inputs(ast.unparse())
+    expected = run(ast, inputs)
+    assert run(again, inputs) == expected
+    cfg = CFG.construct_cfg(ast)
+    optimize(cfg, out=ast.node.out)
+    assert [i for i, u in enumerate(cfg) if u.label == 'END'] == [len(cfg) - 1]
+    assert run(ast, inputs, cfg) == expected
+    assert all(cfg.spans()[0]) # every node keeps its source through the passes
+
+# Running loops in closed form must give the outputs, the steps and the
+# edge counts that stepping through them gives
+@pytest.mark.parametrize('seed', SEEDS)
+def test_acceleration(parser, seed):
+  generator = Generator(seed)
+  ast = parser.parse(generator.program())
+  cfg = CFG.construct_cfg(ast)
+  for _ in range(3):
+    env = {v.sym : x for v, x in zip(ast.node.inp, generator.inputs(ast.unparse()))}
+    runs = []
+    for machine in (Machine(trace=True), Machine(trace=True, accelerate=True)):
+      try: runs.append((machine.run(cfg, env), machine.steps, machine.trace))
+      except ExecutionError as e: runs.append(str(e))
+    assert runs[0] == runs[1]
+
+# A profile counts every step of its runs, the counts flow through the graph
+# (every label runs as often as control enters it) and survive its file
+@pytest.mark.parametrize('seed', SEEDS[::2])
+def test_profile(parser, tmp_path, seed):
+  generator = Generator(seed)
+  ast = parser.parse(generator.program())
+  cfg = CFG.construct_cfg(ast)
+  runs = [generator.inputs(ast.unparse()) for _ in range(3)]
+  profile = record(ast, cfg, runs, fuel=5000, key='k')
+  steps = 0
+  for inputs in runs:
+    machine = Machine(fuel=5000)
+    try: machine.run(cfg, {v.sym : x for v, x in zip(ast.node.inp, inputs)})
+    except ExecutionError: pass
+    steps += min(machine.steps, 5000)
+  assert profile.steps() == steps and profile.runs == 3
+  into = [0] * len(cfg)
+  for i, u in enumerate(cfg):
+    for k, v in enumerate([u.exit, u.diverge if isinstance(u, CFG.CONDJUMP) else None]):
+      if v is not None: into[cfg.index(v)] += profile.edges[2*i + k]
+  if not profile.failed: assert [into[0] + 3] + into[1:] == profile.nodes.tolist()
+  save([profile], tmp_path / 'profile')
+  again = load(tmp_path / 'profile')['f']
+  assert (again.nodes, again.edges, again.runs, again.fits(cfg, 'k')) == (profile.nodes, profile.edges, 3, True)
+  assert [steps for _, _, steps in profile.hottest(cfg)] == sorted((steps for _, _, steps in profile.hottest(cfg)), reverse=True)
+
+# The interval analysis must cover every value a concrete run produces
+@pytest.mark.parametrize('seed', SEEDS)
+def test_intervals(parser, seed):
+  generator = Generator(seed)
+  ast = parser.parse(generator.program())
+  inputs = generator.inputs(ast.unparse())
+  outputs = run(ast, inputs)
+  if outputs is ExecutionError: pytest.skip('the program fails on these inputs')
+  cfg = CFG.construct_cfg(ast)
+  ranges = intervals(cfg, {v : Interval(x, x) for v, x in zip(ast.node.inp, inputs)})
+  for var, value in zip(ast.node.out, outputs):
+    bound = ranges.range(cfg[-1], var)
+    assert bound is not None and bound.lo <= value <= bound.hi
+
+# Counting the cost of a program must not change what it computes, and the
+# interval analysis must bound the cost a concrete run counts
+@pytest.mark.parametrize('seed', SEEDS)
+def test_cost(parser, seed):
+  generator = Generator(seed)
+  ast = parser.parse(generator.program())
+  counted = instrument(ast, CostModel(ops={'*' : 2, 'call' : 5}))
+  assert parser.parse(counted.unparse()) == counted
+  inputs = generator.inputs(ast.unparse())
+  outputs, costs = run(ast, inputs), run(counted, inputs)
+  if outputs is ExecutionError: return
+  assert costs[:-1] == outputs and costs[-1] > 0
+  cfg = CFG.construct_cfg(counted)
+  bound = intervals(cfg).range(cfg[-1], counted.node.out[-1])
+  assert bound is not None and bound.lo <= costs[-1] <= bound.hi
+
+# The slowest inputs found stay within the bound, are at least as slow as
+# every seed and take the steps they are reported to take
+@pytest.mark.parametrize('seed', SEEDS[::5])
+def test_search(seed):
+  code = Generator(seed).program()
+  finder = Search(code, 'f', 5, workers=1, fuel=5000, seed=seed)
+  seeds = [finder.measure(inputs) for inputs in finder.seeds(8)]
+  best = finder.run(rounds=3, batch=8)
+  assert all(abs(x) <= 5 for x in best.inputs)
+  assert best.steps >= max(run.steps for run in seeds)
+  assert finder.measure(best.inputs).steps == best.steps
+  assert finder.covered <= {(i+1, taken) for i, u in enumerate(finder.cfg) if isinstance(u, CFG.CONDJUMP) for taken in (True, False)}
+
+# Loops run in closed form change how long a search takes, not what it
+# measures of a run that does not run out of fuel
+@pytest.mark.parametrize('seed', SEEDS[::5])
+def test_search_accelerate(seed):
+  code = Generator(seed).program()
+  plain, fast = (Search(code, 'f', 5, workers=1, fuel=5000, seed=seed, accelerate=a) for a in (False, True))
+  for inputs in plain.seeds(8):
+    run, again = plain.measure(inputs), fast.measure(inputs)
+    if run.error is None: assert (again.steps, again.branches, again.loops, again.error) == (run.steps, run.branches, run.loops, None)
+
+# A search measures its own function whatever searches were made after it,
+# and its pool workers measure what it measures in this process
+def test_search_isolation():
+  first, second = Generator(SEEDS[0]).program(), Generator(SEEDS[1]).program()
+  finder = Search(link(list(parse_unit(code=first))), 'f', 5, workers=1, fuel=5000, passes=('fold', 'dce'))
+  runs = [finder.measure(inputs) for inputs in finder.seeds(8)]
+  Search(second, 'f', 5, workers=1, fuel=5000)
+  assert [repr(finder.measure(run.inputs)) for run in runs] == [repr(run) for run in runs]
+  alone, pooled = (Search(finder.function.calls, 'f', 5, workers=n, fuel=5000, passes=('fold', 'dce')) for n in (1, 2))
+  assert repr(pooled.run(rounds=2, batch=8)) == repr(alone.run(rounds=2, batch=8))
+  assert pooled.covered == alone.covered
+
+# Comparing a file with itself analyzes nothing, and comparing it with an
+# edited copy gives every loop of the copy the summary that analyzing the
+# copy alone gives it, and pairs up every loop of the original once
+@pytest.mark.parametrize('seed', SEEDS[::5])
+def test_diff(tmp_path, seed):
+  old = Generator(seed).program()
+  head, body = old.split('{', 1)
+  new = head + '{' + re.sub(r'\b\d', lambda m : str(int(m.group()) % 9 + 1), body, count=1)
+  files = [tmp_path / 'old.ewl', tmp_path / 'new.ewl']
+  for file, code in zip(files, (old, new)): file.write_text(code)
+  same = diff(files[0], files[0])
+  assert same.changes == [] and same.same == ['f'] and same.cache.recomputed == []
+  changes = diff(*files)
+  old_loops, new_loops = (loops(calls.defs['f'], calls, None, file) for calls, file in zip(changes.calls, files))
+  if changes.same: assert changes.changes == [] and new == old
+  else:
+    assert [c.new.summary for c in changes.changes if c.new] == [u.summary for u in new_loops]
+    assert [c.old for c in changes.changes if c.old] == old_loops
+
+# A loop whose bound grows faster regresses, which makes diff exit with 1,
+# and one whose bound grows slower improves
+def test_diff_growth(tmp_path):
+  folder = os.path.dirname(os.path.abspath(__file__))
+  linear, square = tmp_path / 'linear.ewl', tmp_path / 'square.ewl'
+  for file, bound in ((linear, 'n'), (square, 'n * n')):
+    file.write_text(f'def f (n) -> (x) {{\n  x := 0;\n  while x < {bound} {{x := x + 1;}}\n}}\n')
+  def diff(old, new):
+    return subprocess.run([sys.executable, folder, 'diff', str(old), str(new)], cwd=tmp_path, capture_output=True, text=True)
+  worse, better = diff(linear, square), diff(square, linear)
+  assert worse.returncode == 1 and 'Max(0, n**2) iterations (regressed)' in worse.stdout
+  assert better.returncode == 0 and 'Max(0, n) iterations (improved)' in better.stdout
+
+# The size limit of the command line applies to the bounds analyze finds: a
+# trip bound that outgrows it leaves its loop unbounded
+def test_max_size(tmp_path):
+  file = tmp_path / 'square.ewl'
+  file.write_text('def f (n) -> (x) {\n  x := 0;\n  for i in [1 .. n * n] {x := x + i;}\n}\n')
+  folder = os.path.dirname(os.path.abspath(__file__))
+  def analyze(*options):
+    return subprocess.run([sys.executable, folder, str(file), '--analyze', *options], cwd=tmp_path,
+                          capture_output=True, text=True, check=True).stdout
+  assert 'at most Max(0, n**2) iterations' in analyze()
+  out = analyze('--max-size', '1')
+  assert f'({file}:3:3) hit the limit on expression size' in out and 'iterations' not in out
+
+# The loops lowering records must be the loops found from the back edges
+@pytest.mark.parametrize('seed', SEEDS)
+def test_lowered_loops(parser, seed):
+  cfg = CFG.construct_cfg(parser.parse(Generator(seed).program()))
+  index = Structure(cfg)
+  assert cfg.lowered() is not None
+  lowered, searched = index.loops, index.search_loops()
+  assert lowered.keys() == searched.keys()
+  assert all(lowered[h].body == searched[h].body for h in lowered)
+
+# Every generated program, as lowered and as optimized, has a valid SSA form
+@pytest.mark.parametrize('seed', SEEDS)
+def test_ssa(parser, seed):
+  ast = parser.parse(Generator(seed).program())
+  cfg = CFG.construct_cfg(ast)
+  assert construct_ssa(cfg).verify()
+  optimize(cfg, out=ast.node.out)
+  assert construct_ssa(cfg).verify()
+
+# Front end throughput, so that a slower lexer or parser fails the suite
+def test_throughput(parser):
+  codes = [Generator(seed).program() for seed in range(200)]
+  start = time.perf_counter()
+  for code in codes:
+    parser.parse(parser.parse(code).unparse())
+  rate = 2 * len(codes) / (time.perf_counter() - start)
+  assert rate >= MIN_PROGRAMS_PER_SECOND, f'{rate:.0f} programs per second'
+
+# Importing the package must stay cheap: no module of it, nor PLY or SymPy,
+# is loaded until it is used
+def test_import_time():
+  script = ('import sys, time; start = time.perf_counter(); import ewlc; print(time.perf_counter() - start); '
+            'print(sorted(m for m in sys.modules if m.split(".")[0] in ("ply", "sympy") or m.startswith("ewlc.")))')
+  root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+  out = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True).stdout.split('\n')
+  assert float(out[0]) <= MAX_IMPORT_SECONDS, f'import ewlc took {float(out[0]):.3f} seconds'
+  assert out[1] == '[]', f'import ewlc loaded {out[1]}'
+
+# The package API must give what the modules give
+@pytest.mark.parametrize('seed', SEEDS[::10])
+def test_api(parser, seed):
+  generator = Generator(seed)
+  code = generator.program()
+  assert ewlc.parse(code).unparse() == parser.parse(code).unparse()
+  assert str(ewlc.lower(code)) == str(CFG.construct_cfg(parser.parse(code)))
+  code = generator.mangled()
+  ast, errors = ewlc.parse(code, recover=True)
+  assert [(line, str(e)) for line, e in errors] == [(line, str(e)) for line, e in parser.recover(code)[1]]
+  summaries = ewlc.analyze(generator.program())
+  assert all(('trips' in s) != ('breaks' in s) for s in summaries.values())
+
+# Threads parsing at once with one parser must each get the AST of their
+# own program, errors included
+def test_concurrent_parsing(parser):
+  generator = Generator(0)
+  codes = [generator.program() for _ in range(50)] + [generator.mangled() for _ in range(50)]
+  shared = WhileParser()
+  def recover(parser, code):
+    ast, errors = parser.recover(code)
+    return ast, [(line, e.col, str(e)) for line, e in errors]
+  with ThreadPoolExecutor(4) as threads:
+    results = list(threads.map(lambda code : recover(shared, code), codes))
+  assert results == [recover(parser, code) for code in codes]
+  assert WhileParser().action is shared.action # the tables are built once
@@ -0,0 +1,299 @@
+# ------------------------------------------------------------
+# while_interval.py
+#
+# Interval analysis and loop trip counts for the extended WHILE language
+# ------------------------------------------------------------
+import heapq, math
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_structure as STRUCT
+  from . import while_expr as E
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_structure as STRUCT
+  import while_expr as E
+from fractions import Fraction
+
+INF = float('inf')
+
+def mul(a, b):
+  return 0 if a == 0 or b == 0 else a * b
+
+class Interval(object):
+  __slots__ = ('lo', 'hi')
+  def __init__(self, lo=-INF, hi=INF):
+    self.lo, self.hi = lo, hi
+  def __repr__(self):
+    show = lambda v : '-oo' if v == -INF else 'oo' if v == INF else str(v)
+    return f'[{show(self.lo)}, {show(self.hi)}]'
+  def __eq__(self, obj):
+    return isinstance(obj, Interval) and (self.lo, self.hi) == (obj.lo, obj.hi)
+  def __hash__(self):
+    return hash((self.lo, self.hi))
+  def __add__(self, obj):
+    return Interval(self.lo + obj.lo, self.hi + obj.hi)
+  def __neg__(self):
+    return Interval(-self.hi, -self.lo)
+  def __sub__(self, obj):
+    return self + (-obj)
+  def __mul__(self, obj):
+    ends = [mul(a, b) for a in (self.lo, self.hi) for b in (obj.lo, obj.hi)]
+    return Interval(min(ends), max(ends))
+  def inverse(self):
+    if self.lo <= 0 <= self.hi: return Interval()
+    ends = [0 if abs(v) == INF else Fraction(1) / v for v in (self.lo, self.hi)]
+    return Interval(min(ends), max(ends))
+  def is_top(self):
+    return self.lo == -INF and self.hi == INF
+  def join(self, obj):
+    return Interval(min(self.lo, obj.lo), max(self.hi, obj.hi))
+  def meet(self, obj):
+    lo, hi = max(self.lo, obj.lo), min(self.hi, obj.hi)
+    return Interval(lo, hi) if lo <= hi else None
+  def widen(self, obj):
+    return Interval(self.lo if obj.lo >= self.lo else -INF, self.hi if obj.hi <= self.hi else INF)
+  def narrow(self, obj):
+    return Interval(obj.lo if self.lo == -INF else self.lo, obj.hi if self.hi == INF else self.hi)
+
+TOP = Interval()
+
+# Environments map variables to intervals; missing variables are unbounded
+def join(a, b):
+  if a is None: return b
+  if b is None: return a
+  return {k : v.join(b[k]) for k, v in a.items() if k in b}
+
+def widen(a, b):
+  if a is None or b is None: return b
+  return {k : v.widen(b[k]) for k, v in a.items() if k in b}
+
+def narrow(a, b):
+  if a is None or b is None: return b
+  res = dict(b)
+  for k, v in a.items(): res[k] = v.narrow(b[k]) if k in b else v
+  return res
+
+# Calls evaluate to the range their callee's summary gives, if any
+def evaluate(expr, env, calls=None):
+  if isinstance(expr, int): return Interval(expr, expr)
+  op = expr.op
+  if op == E.NUM: return Interval(expr.value, expr.value)
+  if op == E.VAR: return env.get(expr, TOP)
+  if op == E.ADD:
+    res = Interval(0, 0)
+    for arg in expr.args: res = res + evaluate(arg, env, calls)
+    return res
+  if op == E.MUL:
+    # A factor repeated an even number of times is a square
+    res, powers = Interval(1, 1), {}
+    for arg in expr.args: powers[arg] = powers.get(arg, 0) + 1
+    for arg, n in powers.items():
+      base, power = evaluate(arg, env, calls), Interval(1, 1)
+      for _ in range(n): power = power * base
+      if n % 2 == 0 and power.lo < 0: power = Interval(0, power.hi)
+      res = res * power
+    return res
+  if op == E.DIV: return evaluate(expr.args[0], env, calls) * evaluate(expr.args[1], env, calls).inverse()
+  if op == E.CALL and calls is not None: return calls.apply(expr.name)
+  return TOP
+
+class Intervals(object):
+  def __init__(self, cfg, inputs=None, narrowing=2, calls=None):
+    self.cfg, self.index, self.calls = cfg, STRUCT.structure(cfg), calls
+    self.heads = set(self.index.loops)
+    self.fractional = self.find_fractional()
+    root = self.index.dom.root
+    self.entry = {getattr(k, 'sym', k) : v for k, v in (inputs or {}).items()}
+    self.env = {u : None for u in self.index.order}
+    self.env[root] = dict(self.entry)
+    self.ascend()
+    for _ in range(narrowing): self.descend()
+    self.trips = {h : self.trip_count(loop) for h, loop in self.index.loops.items()}
+
+  # A variable may hold a non-integer once it is assigned a division
+  def find_fractional(self):
+    fractional, changed = set(), True
+    while changed:
+      changed = False
+      for u in self.cfg:
+        if isinstance(u, CFG.ASSIGN) and u.node.var not in fractional and not self.integral(u.node.aexp, fractional):
+          fractional.add(u.node.var); changed = True
+    return fractional
+
+  def integral(self, expr, fractional=None):
+    fractional = self.fractional if fractional is None else fractional
+    if isinstance(expr, int): return True
+    op = expr.op
+    if op == E.NUM: return isinstance(expr.value, int)
+    if op == E.VAR: return expr not in fractional
+    if op == E.CALL: return self.calls is not None and self.calls.integral(expr.name)
+    if op == E.DIV: return False
+    return all(self.integral(arg, fractional) for arg in expr.args)
+
+  def inline(self, expr):
+    return expr if self.calls is None else self.calls.inline(expr)
+
+  def refine(self, env, cond, branch):
+    if isinstance(cond, bool): return env if cond == branch else None
+    if cond.op == E.NOT: return self.refine(env, cond.args[0], not branch)
+    if cond.op == E.LT: a, b, rel = cond.lhs, cond.rhs, '<'
+    elif cond.op == E.GT: a, b, rel = cond.rhs, cond.lhs, '<'
+    elif cond.op == E.EQ: a, b, rel = cond.lhs, cond.rhs, '=='
+    else: return env
+    if not branch:
+      if rel == '<': a, b, rel = b, a, '<='
+      else: rel = '!='
+
+    A, B, res = evaluate(a, env, self.calls), evaluate(b, env, self.calls), dict(env)
+    if rel == '!=':
+      return None if A.lo == A.hi == B.lo == B.hi else env
+    if rel == '==':
+      C = A.meet(B)
+      if C is None: return None
+      if a.is_Symbol: res[a] = C
+      if b.is_Symbol: res[b] = C
+      return {k : v for k, v in res.items() if not v.is_top()}
+    gap = 1 if rel == '<' and self.integral(a) and self.integral(b) else 0
+    if A.lo + gap > B.hi or (rel == '<' and A.lo >= B.hi): return None
+    if a.is_Symbol: res[a] = A.meet(Interval(-INF, B.hi - gap))
+    if b.is_Symbol: res[b] = B.meet(Interval(A.lo + gap, INF))
+    return {k : v for k, v in res.items() if not v.is_top()}
+
+  def transfer(self, u, v):
+    env = self.env[u]
+    if env is None: return None
+    if isinstance(u, CFG.ASSIGN):
+      res = dict(env)
+      val = evaluate(u.node.aexp, env, self.calls)
+      if val.is_top(): res.pop(u.node.var, None)
+      else: res[u.node.var] = val
+      return res
+    if isinstance(u, CFG.CONDJUMP):
+      if u.exit is u.diverge: return env
+      return self.refine(env, u.node.cond, v is u.exit)
+    return env
+
+  # Chaotic iteration in reverse postorder, widening at loop headers
+  def ascend(self):
+    rank = {u : i for i, u in enumerate(self.index.order)}
+    queue = [(0, self.index.dom.root)]
+    while queue:
+      _, u = heapq.heappop(queue)
+      for v in self.index.succ[u]:
+        new = join(self.env[v], self.transfer(u, v))
+        if v in self.heads and self.env[v] is not None: new = widen(self.env[v], new)
+        if new != self.env[v]:
+          self.env[v] = new
+          heapq.heappush(queue, (rank[v], v))
+
+  def descend(self):
+    root = self.index.dom.root
+    for v in self.index.order:
+      new = dict(self.entry) if v is root else None
+      for u in self.index.pred[v]:
+        if u in self.env: new = join(new, self.transfer(u, v))
+      self.env[v] = narrow(self.env[v], new) if v in self.heads else new
+
+  def range(self, u, var):
+    env = self.env.get(u)
+    if env is None: return None
+    return env.get(getattr(var, 'sym', var), TOP)
+
+  # Trip counts of `for` loops and of `while` loops stepping a counter
+  # towards a loop-invariant limit
+  def trip_count(self, loop):
+    h = loop.header
+    if not isinstance(h, CFG.CONDJUMP): return None
+    if self.env[h] is None or self.refine(self.env[h], h.node.cond, True) is None: return TripCount(h, 0, 0)
+    if not loop.latches: return TripCount(h, 1, 1)
+
+    cond = h.node.cond
+    if isinstance(cond, bool): return None
+    if cond.op == E.LT: a, b = cond.lhs, cond.rhs
+    elif cond.op == E.GT: a, b = cond.rhs, cond.lhs
+    else: return None
+
+    assigned = {}
+    for u in loop.body:
+      if isinstance(u, CFG.ASSIGN): assigned.setdefault(u.node.var, []).append(u)
+    def step(var, sign):
+      nodes = assigned.get(var, [])
+      if len(nodes) != 1: return None
+      delta = sign * (nodes[0].node.aexp - var)
+      if not (delta.is_Number and delta.value > 0): return None
+      if not all(self.index.dominates(nodes[0], w) for w in loop.latches): return None
+      return delta
+    for counter, sign, limit in [(a, 1, b), (b, -1, a)]:
+      if not counter.is_Symbol: continue
+      fixed = a if counter is b else b
+      if any(var in assigned for var in fixed.free_symbols): continue
+      delta = step(counter, sign)
+      if delta is not None: break
+    else:
+      return None
+
+    # The bound is solved symbolically, so it is built in SymPy, with calls
+    # replaced by what their callees return
+    from sympy import Max, ceiling
+    diff = E.to_sympy(self.inline(b - a))
+    bound = Max(0, diff if delta == 1 else ceiling(diff / E.to_sympy(delta)))
+    entry, preds = None, [u for u in self.index.pred[h] if u not in loop.body and u in self.env]
+    for u in preds: entry = join(entry, self.transfer(u, h))
+    if h is self.index.dom.root: entry = join(entry, dict(self.entry))
+    span = (evaluate(b, entry, self.calls) - evaluate(a, entry, self.calls)).hi if entry is not None else INF
+    limit = INF if span == INF else max(0, math.ceil(Fraction(span) / delta.value))
+
+    # Express the bound in terms of the values before the loop was entered
+    if len(preds) == 1 and h is not self.index.dom.root:
+      u = preds[0]
+      while isinstance(u, CFG.ASSIGN):
+        bound = bound.xreplace({E.to_sympy(u.node.var) : E.to_sympy(self.inline(u.node.aexp))})
+        preds = [w for w in self.index.pred[u] if w in self.env]
+        if len(preds) != 1 or u is self.index.dom.root: break
+        u = preds[0]
+    return TripCount(h, bound, limit)
+
+class TripCount(object):
+  def __init__(self, header, bound, limit):
+    self.header, self.bound, self.limit = header, bound, limit
+  def __repr__(self):
+    if self.limit != INF and (self.bound == self.limit or not getattr(self.bound, 'free_symbols', None)): return str(self.limit)
+    if self.limit == INF: return str(self.bound)
+    return f'{self.bound} <= {self.limit}'
+
+def intervals(cfg, inputs=None, calls=None):
+  cache = getattr(cfg, 'cache', None)
+  if inputs or calls is not None or cache is None: return Intervals(cfg, inputs, calls=calls)
+  if 'intervals' not in cache: cache['intervals'] = Intervals(cfg)
+  return cache['intervals']
+
+def trip_counts(cfg, inputs=None, calls=None):
+  return {h : trips for h, trips in intervals(cfg, inputs, calls).trips.items() if trips is not None}
+
+# Test on a simple program
+if __name__ == '__main__':
+  from while_parser import WhileParser
+  code = """
+    def func (a b n) -> (x y) {
+      x := 0;
+      y := 0;
+      for i in [a .. b] {
+        x := x + i;
+      }
+      while y < n {
+        y := y + 2;
+        if x < 0 {break;}
+      }
+      for j in [1 .. 10] {
+        x := j;
+      }
+    }
+  """
+  parser = WhileParser()
+  cfg = CFG.construct_cfg(parser.parse(code))
+  ranges = intervals(cfg)
+  for i, u in enumerate(cfg):
+    env = ranges.env.get(u)
+    print(f'{i+1:>3}  {str(u):<20} {env if env is None else {str(k) : v for k, v in env.items()}}')
+  for h, trips in trip_counts(cfg).items():
+    print(f'Loop at label {cfg.index(h)+1} ({cfg.cite(h)}) runs for at most {trips} iterations')
@@ -4,18 +4,34 @@
 # tokenizer for the extended WHILE language
 # ------------------------------------------------------------
 import ply.lex as lex
+import copy
 
 class WhileLexer(object):
   # Build the lexer
   def __init__(self, **kwargs):
     self.lexer = lex.lex(module=self, **kwargs)
+    self.lexer.report = None
+    self.first_line, self.first_col = 1, 1
   
+  # A lexer of its own for another input, sharing the rules of this one;
+  # illegal characters are passed to report if it is given
+  def clone(self, first_line=1, first_col=1, report=None):
+    res = copy.copy(self)
+    res.lexer, res.first_line, res.first_col = self.lexer.clone(), first_line, first_col
+    res.lexer.report = report
+    return res
+
   def input(self, *args, **kwargs):
-    self.lexer.lineno = 1
+    self.lexer.lineno = self.first_line
     return self.lexer.input(*args, **kwargs)
 
   def token(self):
     return self.lexer.token()
+
+  # The column (from 1) of a position in the input
+  def column(self, lexpos):
+    start = self.lexer.lexdata.rfind('\n', 0, lexpos)
+    return lexpos - start if start >= 0 else lexpos + self.first_col
   
   # List of reserved identifiers
   reserved = {
@@ -72,9 +88,11 @@ class WhileLexer(object):
     r'\n+'
     t.lexer.lineno += len(t.value)
 
-  # Error handling rule
+  # Error handling rule (the rules are shared by every clone, so what is
+  # told of an illegal character is up to the clone that met it)
   def t_error(self, t):
-    print("Illegal character '%s'" % t.value[0])
+    if t.lexer.report is None: print("Illegal character '%s'" % t.value[0])
+    else: t.lexer.report(t)
     t.lexer.skip(1)
 
 # Test on a simple program
@@ -0,0 +1,171 @@
+# ------------------------------------------------------------
+# while_opt.py
+#
+# Optimizing passes over the extended WHILE language CFG
+# ------------------------------------------------------------
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_structure as STRUCT
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_structure as STRUCT
+
+def symbols(expr):
+  return getattr(expr, 'free_symbols', set())
+
+def substitute(expr, env):
+  return expr.xreplace(env) if env and hasattr(expr, 'xreplace') else expr
+
+def literal(cond):
+  return cond if isinstance(cond, bool) else None
+
+# Forward must-analysis of the bindings var -> expr that hold on entry to
+# each node, keeping only the bindings accepted by `keep`
+def available(cfg, keep):
+  index = STRUCT.structure(cfg)
+  env = {u : None for u in index.order}
+  env[index.dom.root] = {}
+  def transfer(u, env):
+    if not isinstance(u, CFG.ASSIGN): return env
+    var, aexp = u.node.var, substitute(u.node.aexp, env)
+    res = {k : v for k, v in env.items() if k != var and var not in symbols(v)}
+    if keep(aexp) and aexp != var: res[var] = aexp
+    return res
+
+  changed = True
+  while changed:
+    changed = False
+    for u in index.order:
+      if env[u] is None: continue
+      out = transfer(u, env[u])
+      for v in index.succ[u]:
+        new = dict(out) if env[v] is None else {k : w for k, w in env[v].items() if out.get(k) == w}
+        if new != env[v]: env[v], changed = new, True
+  return env
+
+def propagate(cfg, keep):
+  changed = 0
+  for u, env in available(cfg, keep).items():
+    if not env: continue
+    if isinstance(u, CFG.ASSIGN):
+      aexp = substitute(u.node.aexp, env)
+      if aexp != u.node.aexp: u.node = u.node._replace(aexp=aexp); changed += 1
+    elif isinstance(u, CFG.CONDJUMP):
+      cond = substitute(u.node.cond, env)
+      if cond != u.node.cond: u.node = u.node._replace(cond=cond); changed += 1
+  return changed
+
+def fold_constants(cfg, out=None):
+  return propagate(cfg, lambda e : getattr(e, 'is_Number', False))
+
+def propagate_copies(cfg, out=None):
+  return propagate(cfg, lambda e : getattr(e, 'is_Symbol', False))
+
+def live_variables(cfg, out=None):
+  index = STRUCT.structure(cfg)
+  if out is None:
+    out = set(u.node.var for u in cfg if isinstance(u, CFG.ASSIGN))
+  live_in = {u : set() for u in index.order}
+  live_out = {u : set() for u in index.order}
+  changed = True
+  while changed:
+    changed = False
+    for u in reversed(index.order):
+      res = set(out) if u is cfg[-1] else set()
+      for v in index.succ[u]: res |= live_in[v]
+      live_out[u] = res
+      if isinstance(u, CFG.ASSIGN):
+        res = (res - {u.node.var}) | symbols(u.node.aexp)
+      elif isinstance(u, CFG.CONDJUMP):
+        res = res | symbols(u.node.cond)
+      if res != live_in[u]: live_in[u], changed = res, True
+  return live_out
+
+def eliminate_dead_code(cfg, out=None):
+  removed = 0
+  while True:
+    live = live_variables(cfg, out)
+    dead = [u for u in live if isinstance(u, CFG.ASSIGN)
+            and (u.node.var not in live[u] or u.node.aexp == u.node.var)]
+    if not dead: return removed
+    for u in dead: cfg.bypass(u)
+    removed += len(dead)
+
+def prune_branches(cfg, out=None):
+  removed = 0
+  for u in list(cfg):
+    if cfg[0] is cfg[-1]: break # the entry went straight to END
+    if not isinstance(u, CFG.CONDJUMP): continue
+    cond = literal(u.node.cond)
+    if u.exit is u.diverge and not u.loops: cond = True
+    if cond is None or (u.loops and cond): continue
+    cfg.bypass(u, u.exit if cond else u.diverge)
+    removed += 1
+  size = len(cfg)
+  cfg.prune()
+  return removed + size - len(cfg)
+
+PASSES = {
+  'fold' : fold_constants,
+  'copy' : propagate_copies,
+  'dce' : eliminate_dead_code,
+  'prune' : prune_branches
+}
+
+class PassManager(object):
+  def __init__(self, passes=('fold', 'copy', 'prune', 'dce'), out=None, rounds=8):
+    unknown = [name for name in passes if name not in PASSES]
+    if unknown: raise ValueError(f'Unknown passes: {", ".join(unknown)}')
+    self.passes, self.rounds = list(passes), rounds
+    self.out = None if out is None else set(getattr(v, 'sym', v) for v in out)
+    self.report = []
+
+  # Run the pipeline until it stops changing the graph, recording the
+  # node count before and after every pass
+  def run(self, cfg):
+    for _ in range(self.rounds):
+      changed = 0
+      for name in self.passes:
+        before = len(cfg)
+        changes = PASSES[name](cfg, self.out)
+        self.report.append((name, before, len(cfg), changes))
+        changed += changes
+      if not changed: break
+    return cfg
+
+  def summary(self):
+    if not self.report: return '  No passes were run.'
+    lines = [f'  {name:<6} {before:>4} -> {after:<4} nodes ({changes} changes)'
+             for name, before, after, changes in self.report if changes]
+    lines.append(f'  total  {self.report[0][1]:>4} -> {self.report[-1][2]:<4} nodes')
+    return '\n'.join(lines)
+
+def optimize(cfg, passes=('fold', 'copy', 'prune', 'dce'), out=None):
+  manager = PassManager(passes, out)
+  manager.run(cfg)
+  return manager
+
+# Test on a simple program
+if __name__ == '__main__':
+  from while_parser import WhileParser
+  code = """
+    def func (a b) -> (x y) {
+      x := a;
+      x := x;
+      k := 3;
+      y := k + 1;
+      if true {y := y * 2}
+      else {y := 0;}
+      while false {x := x + 1;}
+      for i in [1 .. b] {
+        x := x + k;
+      }
+    }
+  """
+  parser = WhileParser()
+  ast = parser.parse(code)
+  cfg = CFG.construct_cfg(ast)
+  print(cfg)
+  manager = optimize(cfg, out=ast.node.out)
+  print(cfg)
+  print(manager.summary())
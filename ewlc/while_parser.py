@@ -4,37 +4,95 @@
 # parser for the extended WHILE language
 # ------------------------------------------------------------
 import ply.yacc as yacc
-import while_ast as AST
+import threading
+from collections import namedtuple
 
 # Get the token map and build the lexer
-from while_lexer import WhileLexer
+if __package__:
+  from . import while_ast as AST
+  from .while_lexer import WhileLexer
+else: # run as a script, or with ewlc/ on sys.path
+  import while_ast as AST
+  from while_lexer import WhileLexer
 
 # Extended While language parser
-class ParsingError(Exception): pass
+class ParsingError(Exception):
+  def __init__(self, msg, line=None, col=None):
+    super().__init__(msg)
+    self.line, self.col = line, col
+
+# What PLY's LR driver reads of a table and of a production
+LRTable = namedtuple('LRTable', 'lr_productions lr_action lr_goto')
+Rule = namedtuple('Rule', 'name len callable')
+
 class WhileParser(object):
   tokens = WhileLexer.tokens
+  nodes = AST
+  errors = None # a list collects errors instead of raising them
+  TABLES, LOCK = {}, threading.Lock() # the tables of every parser class
 
-  # Build the parser
+  # Build the parser. The LR tables (read from parsetab.py) and the lexer
+  # are built by the first parser of a class and shared by every parser of
+  # it after that; nothing changes them once they are built
   def __init__(self, **kwargs):
-    self.lexer = WhileLexer()
-    self.parser = yacc.yacc(module=self, **kwargs)
-  
-  def parse(self, *args, **kwargs):
-    self.context = [dict()]
-    self.last_scope = None
-    self.indices = []
-    self.loop_depth = 0
-    return self.parser.parse(*args, lexer=self.lexer, **kwargs)
+    with WhileParser.LOCK:
+      if type(self) not in self.TABLES:
+        parser = yacc.yacc(module=self, **kwargs)
+        self.TABLES[type(self)] = (WhileLexer(), parser.action, parser.goto,
+                                   tuple((p.name, p.len, p.func) for p in parser.productions))
+    self.lexer, self.action, self.goto, self.productions = self.TABLES[type(self)]
+
+  # A parse session is a parser of the same class for a single parse: it
+  # shares the tables, and holds the state of the parse (the scopes, loop
+  # indices and loop depth the scoping rules track, whether it is recovering
+  # from an error and where errors go) with a lexer of its own, which
+  # reports illegal characters as errors if they are collected. Every parse
+  # runs in a new session, so one parser can be used by any number of
+  # threads at once
+  def session(self, lineno=1, col=1, errors=None):
+    session = object.__new__(type(self))
+    session.__dict__.update(self.__dict__)
+    session.lexer = self.lexer.clone(lineno, col, None if errors is None else session.illegal)
+    session.context, session.last_scope, session.indices, session.loop_depth = [dict()], None, [], 0
+    session.recovering, session.errors = False, errors
+    return session
+
+  # PLY's LR driver over the shared tables, running the rules of this session
+  def driver(self):
+    rules = [Rule(name, n, func and getattr(self, func)) for name, n, func in self.productions]
+    driver = yacc.LRParser(LRTable(rules, self.action, self.goto), self.p_error)
+    # A state that can only reduce does so without looking at the next token
+    # by default, which makes recovering from an error reduce the empty
+    # scope and loop markers over and over
+    driver.disable_defaulted_states()
+    return driver
+
+  def parse(self, data, lineno=1, col=1, **kwargs):
+    session = self.session(lineno, col)
+    return session.driver().parse(data, lexer=session.lexer, **kwargs)
+
+  # Parse on past errors instead of stopping at the first one: a syntax
+  # error skips to the end of the statement (or of the condition or header)
+  # it is in. Returns the AST of what could be parsed (None if the header
+  # or the end of the input is broken) and every error as (line,
+  # ParsingError) pairs
+  def recover(self, data, lineno=1, col=1, **kwargs):
+    session = self.session(lineno, col, errors=[])
+    ast = session.driver().parse(data, lexer=session.lexer, **kwargs)
+    return ast, sorted(session.errors, key=lambda e : e[0])
   
   # Starting symbol
   # AST > DEF(fun, inp, out, body)
   def p_prog(self, p):
     '''prog : DEF ID LPAREN vars RPAREN TO LPAREN _begin_scope vars _end_scope RPAREN body'''
-    p[0] = AST.DEF(p[2], p[4], p[9], p[12], p.lineno(1))
-    missing = list(set(map(repr,p[0].node.out)) - set(self.last_scope))
-    if missing:
-      if len(missing) == 1: self.p_error(f'Output variable {missing[0]} is undefined')
-      else: self.p_error(f'Output variables {", ".join(missing)} are undefined')
+    p[0] = self.nodes.DEF(p[2], p[4], p[9], p[12], p.lineno(1), self.col(p, 1))
+    missing = [v for v in p[9] if v.id not in self.last_scope]
+    if len(missing) == 1: self.error(f'Output variable {missing[0].id} is undefined', missing[0].line, missing[0].col)
+    elif missing: self.error(f'Output variables {", ".join(v.id for v in missing)} are undefined', missing[0].line, missing[0].col)
+
+  def p_prog_error(self, p):
+    '''prog : DEF error body'''
+    p[0] = None
 
   # Parse input / output variables
   # AST > [id_1, ..., id_n]
@@ -44,19 +102,20 @@ class WhileParser(object):
 
   def p_vars_chain(self, p):
     '''vars : var vars'''
-    if p[1] in p[2]:
+    if any(v.id == p[1].id for v in p[2]):
       kind = "Input" if len(self.context) == 1 else "Output"
-      self.p_error(f'{kind} variable {p[1]} at line {p[1].line} is repeated')
+      self.error(f'{kind} variable {p[1].id} at line {p[1].line} is repeated', p[1].line, p[1].col)
     p[0] = [p[1]] + p[2]
   
   # Parse body
   # AST > BODY(exp)
   def p_body(self, p):
     '''body : LCURLY _begin_scope exp _end_scope RCURLY'''
-    p[0] = AST.BODY(p[3])
+    p[0] = self.nodes.BODY(p[3])
   
   def p__begin_scope(self, p):
     '''_begin_scope :'''
+    if self.recovering: self.resync(p.stack)
     self.context.append(dict())
   
   def p__end_scope(self, p):
@@ -68,40 +127,55 @@ class WhileParser(object):
   def p_exp(self, p):
     '''exp :
            | stmt'''
-    p[0] = [] if len(p) == 1 else [p[1]]
+    p[0] = [] if len(p) == 1 or p[1] is None else [p[1]]
 
   def p_exp_chain(self, p):
     '''exp : ctrl exp
            | stmt SEMICOLON exp'''
     end = p[2] if len(p) == 3 else p[3]
-    p[0] = [p[1]] + end
+    p[0] = end if p[1] is None else [p[1]] + end
 
   # Parse statement
   # AST > SKIP() | ASSIGN(var, aexp) | BREAK() | CONTINUE()
   def p_stmt(self, p):
     '''stmt : SKIP
             | var ASSIGN aexp'''
-    p[0] = AST.SKIP(p.lineno(1)) if len(p) == 2 else AST.ASSIGN(p[1], p[3], p.lineno(2))
+    if len(p) == 2: p[0] = self.nodes.SKIP(p.lineno(1), self.col(p, 1))
+    else: p[0] = self.nodes.ASSIGN(p[1], p[3], p.lineno(2), self.col(p, 2))
 
   def p_stmt_jump(self, p):
     '''stmt : BREAK
             | CONTINUE'''
-    if self.loop_depth < 1: self.p_error(f'{p[1].capitalize()} at line {p.lineno(1)} is outside of a loop')
-    p[0] = AST.JUMP(p[1], p.lineno(1))
+    if self.loop_depth < 1: self.error(f'{p[1].capitalize()} at line {p.lineno(1)} is outside of a loop', p.lineno(1), self.col(p, 1))
+    p[0] = self.nodes.JUMP(p[1], p.lineno(1), self.col(p, 1))
+
+  # A statement, condition or loop header with a syntax error is dropped
+  def p_stmt_error(self, p):
+    '''stmt : error'''
+    self.resync(p.stack)
+    p[0] = None
+
+  def p_ctrl_error(self, p):
+    '''ctrl : IF error body
+            | IF error body ELSE body
+            | WHILE error body
+            | FOR error body
+            | FOR idx IN LBRACK error RBRACK _push_idx _begin_loop body _end_loop _pop_idx'''
+    p[0] = None
 
   # Parse control
   # AST > IF(cond, if_true, if_false) | WHILE(cond, while_true) | FOR(var, start, end, for_each)
   def p_ctrl(self, p):
     '''ctrl : IF bexp body
             | IF bexp body ELSE body'''
-    if_false = AST.BODY([]) if len(p) == 4 else p[5]
-    p[0] = AST.IF(p[2], p[3], if_false, p.lineno(1))
+    if_false = self.nodes.BODY([]) if len(p) == 4 else p[5]
+    p[0] = self.nodes.IF(p[2], p[3], if_false, p.lineno(1), self.col(p, 1))
     
   def p_ctrl_loop(self, p):
     '''ctrl : WHILE bexp _begin_loop body _end_loop
             | FOR idx IN LBRACK aexp ELLIPSES aexp RBRACK _push_idx _begin_loop body _end_loop _pop_idx'''
-    if len(p) == 6: p[0] = AST.WHILE(p[2], p[4], p.lineno(1))
-    else: p[0] = AST.FOR(p[2], p[5], p[7], p[11], p.lineno(1))
+    if len(p) == 6: p[0] = self.nodes.WHILE(p[2], p[4], p.lineno(1), self.col(p, 1))
+    else: p[0] = self.nodes.FOR(p[2], p[5], p[7], p[11], p.lineno(1), self.col(p, 1))
   
   def p__begin_loop(self, p):
     '''_begin_loop :'''
@@ -111,52 +185,88 @@ class WhileParser(object):
     '''_end_loop :'''
     self.loop_depth = self.loop_depth - 1
 
+  # The index is only in scope in the body of the loop, not in its bounds
   def p_idx(self, p):
     '''idx : new_var'''
     p[0] = p[1]
-    self.indices.append(self.context[-1].pop(p[1].id))
+    self.indices.append((p[1], None, None))
 
   def p__pop_idx(self, p):
     '''_pop_idx :'''
-    idx = self.indices.pop()
-    self.context[-1].pop(idx.id)
+    self.unbind(self.indices.pop())
 
   def p__push_idx(self, p):
     '''_push_idx :'''
-    idx = self.indices[-1]
+    idx = self.indices[-1][0]
+    self.indices[-1] = (idx, self.context[-1].get(idx.id), len(self.context)-1)
     self.context[-1][idx.id] = idx
 
+  def unbind(self, index):
+    idx, shadowed, scope = index
+    if shadowed is None: self.context[scope].pop(idx.id)
+    else: self.context[scope][idx.id] = shadowed
+
+  # Recovering from a syntax error drops symbols from the parser's stack,
+  # and with them maybe the end of scopes, loops and indices; the symbols
+  # left on the stack tell what is still open
+  def resync(self, stack):
+    names = [getattr(s, 'type', s) for s in stack]
+    del self.context[1 + names.count('_begin_scope') - names.count('_end_scope'):]
+    self.loop_depth = names.count('WHILE') + names.count('FOR')
+    count = names.count('idx')
+    for index in reversed(self.indices[count:]):
+      if index[2] is not None and index[2] < len(self.context): self.unbind(index)
+    del self.indices[count:]
+
   # Parse arithmetic expression following PEMDAS and associating on the left
-  # AST > id | num | AEXP(left, op, right) | NEG(operand)
+  # AST > id | num | AEXP(left, op, right) | NEG(operand) | CALL(fun, args)
   def p_aexp(self, p):
     '''aexp : term
             | aexp PLUS term
             | aexp MINUS term'''
-    p[0] = p[1] if len(p) == 2 else AST.AEXP(p[1], p[2], p[3])
+    p[0] = p[1] if len(p) == 2 else self.nodes.AEXP(p[1], p[2], p[3])
 
   def p_term(self, p):
     '''term : fact
             | term TIMES fact
             | term DIVIDE fact'''
-    p[0] = p[1] if len(p) == 2 else AST.AEXP(p[1], p[2], p[3])
+    p[0] = p[1] if len(p) == 2 else self.nodes.AEXP(p[1], p[2], p[3])
 
   def p_fact(self, p):
     '''fact : old_var
             | num
             | MINUS aexp
             | LPAREN aexp RPAREN'''
-    p[0] = p[len(p)//2] if len(p) != 3 else AST.AEXP(0, '-', p[2])
+    p[0] = p[len(p)//2] if len(p) != 3 else self.nodes.AEXP(self.nodes.NUM(0), '-', p[2])
+
+  # Parse function call (the callee is resolved against the other functions
+  # of the compilation unit once it has been parsed)
+  # AST > CALL(fun, args)
+  def p_fact_call(self, p):
+    '''fact : ID LPAREN args RPAREN'''
+    p[0] = self.nodes.CALL(p[1], p[3], p.lineno(1), self.col(p, 1))
+
+  def p_args(self, p):
+    '''args :
+            | arg args'''
+    p[0] = [] if len(p) == 1 else [p[1]] + p[2]
+
+  def p_arg(self, p):
+    '''arg : old_var
+           | num
+           | LPAREN aexp RPAREN'''
+    p[0] = p[len(p)//2]
   
   def p_num(self, p):
     '''num : NUMBER'''
-    p[0] = AST.NUM(p[1])
+    p[0] = self.nodes.NUM(p[1])
 
   # Parse boolean expression
   # AST > bool | BEXP(left, rel, right)
   def p_bexp(self, p):
     '''bexp : BOOL
             | aexp rel aexp'''
-    p[0] = AST.BOOL(p[1]) if len(p) == 2 else AST.BEXP(p[1], p[2], p[3])
+    p[0] = self.nodes.BOOL(p[1]) if len(p) == 2 else self.nodes.BEXP(p[1], p[2], p[3])
 
   def p_rel(self, p):
     '''rel : EQUALS
@@ -171,16 +281,14 @@ class WhileParser(object):
       if p[1] in scope:
         p[0] = scope[p[1]]
         return
-    self.context[-1][p[1]] = AST.VAR(p[1], p.lineno(1))
+    self.context[-1][p[1]] = self.nodes.VAR(p[1], p.lineno(1), self.col(p, 1))
     p[0] = self.context[-1][p[1]]
 
   def p_new_var(self, p):
     '''new_var : ID'''
-    for scope in self.context:
-      if p[1] in scope:
-        self.p_error(f'Index {p[1]} at line {p.lineno(1)} already exists')
-    self.context[-1][p[1]] = AST.VAR(p[1], p.lineno(1))
-    p[0] = self.context[-1][p[1]]
+    if any(p[1] in scope for scope in self.context):
+      self.error(f'Index {p[1]} at line {p.lineno(1)} already exists', p.lineno(1), self.col(p, 1))
+    p[0] = self.nodes.VAR(p[1], p.lineno(1), self.col(p, 1))
   
   def p_old_var(self, p):
     '''old_var : ID'''
@@ -188,13 +296,47 @@ class WhileParser(object):
       if p[1] in scope:
         p[0] = scope[p[1]]
         return
-    self.p_error(f'Variable {p[1]} at line {p.lineno(1)} is undefined')
+    self.error(f'Variable {p[1]} at line {p.lineno(1)} is undefined', p.lineno(1), self.col(p, 1))
+    p[0] = self.nodes.VAR(p[1], p.lineno(1), self.col(p, 1))
+
+  # The column of the n-th symbol of a production, or of a position
+  def col(self, p, n):
+    return self.column(p.lexpos(n))
+
+  def column(self, lexpos):
+    return self.lexer.column(lexpos)
 
   # Handle errors
+  def error(self, msg, line, col=None):
+    if self.errors is None: raise ParsingError(msg, line, col)
+    self.errors.append((line, ParsingError(msg, line, col)))
+
+  def illegal(self, t):
+    self.error(f'Character "{t.value[0]}" at line {t.lineno} is illegal', t.lineno, self.column(t.lexpos))
+
   def p_error(self, p):
-    if isinstance(p, str): raise ParsingError(p)
-    if p == None: raise ParsingError('Input ended unexpectedly')
-    raise ParsingError(f'Token "{p.value}" at line {p.lineno} was unexpected')
+    self.recovering = True
+    if p == None: self.error('Input ended unexpectedly', self.lexer.lexer.lineno)
+    else: self.error(f'Token "{p.value}" at line {p.lineno} was unexpected', p.lineno, self.column(p.lexpos))
+
+# Stand-ins for the AST constructors when a program is only checked: the
+# scoping rules need the name and place of every variable, and nothing else
+# is built
+def nothing(*args): return None
+class SKELETON(object):
+  VAR = namedtuple('VAR', 'id line col')
+  DEF = BODY = SKIP = ASSIGN = JUMP = IF = WHILE = FOR = AEXP = NUM = BOOL = BEXP = CALL = staticmethod(nothing)
+
+# Checks a program against the grammar and the scoping rules without
+# building its AST: PLY's driver runs over the parser's tables and the
+# parser's lexer as it does for any parse, but the actions build the
+# skeleton nodes, which hold only what the scoping rules need. parse returns
+# every error as (line, ParsingError) pairs
+class WhileChecker(WhileParser):
+  nodes = SKELETON
+
+  def parse(self, data, lineno=1, col=1):
+    return self.recover(data, lineno, col)[1]
 
 # Test on a simple program
 if __name__ == '__main__':
@@ -0,0 +1,141 @@
+# ------------------------------------------------------------
+# while_profile.py
+#
+# Execution profiles of extended WHILE programs
+# ------------------------------------------------------------
+import json, math, sys
+from array import array
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_structure as STRUCT
+  from .while_exec import Machine, ExecutionError
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_structure as STRUCT
+  from while_exec import Machine, ExecutionError
+
+MAGIC = b'EWLP 1\n'
+
+# How often each label of a function's graph ran and each of its edges was
+# taken, over some number of runs. Edge 2i is the exit edge of label i+1 and
+# edge 2i+1 its diverging edge; the key ties the counts to the graph they
+# were taken on
+class Profile(object):
+  def __init__(self, fun, key, labels, runs=0, failed=0):
+    self.fun, self.key, self.runs, self.failed = fun, key, runs, failed
+    self.nodes, self.edges = array('q', [0]) * labels, array('q', [0]) * (2 * labels)
+
+  def __len__(self):
+    return len(self.nodes)
+
+  def fits(self, cfg, key=None):
+    return len(self) == len(cfg) and (key is None or key == self.key)
+
+  # Add the edges counted by Machine(trace=True) on the graph
+  def add(self, cfg, trace):
+    index = {u : i for i, u in enumerate(cfg)}
+    for (u, v), count in trace.items():
+      i = index.get(u)
+      if i is None: continue # an edge of a callee
+      self.edges[2*i + (v is not u.exit)] += count
+      self.nodes[i] += count
+      if v is cfg[-1]: self.nodes[-1] += count
+
+  # The steps the runs took, as Machine counts them (reaching the end of
+  # the graph is not a step)
+  def steps(self):
+    return sum(self.nodes[:-1])
+
+  # The loops that take the most steps, as (header, iterations, steps)
+  def hottest(self, cfg, top=5):
+    loops = STRUCT.structure(cfg).loops
+    res = []
+    for h, loop in loops.items():
+      i = cfg.index(h)
+      res.append((h, self.edges[2*i], sum(self.nodes[cfg.index(u)] for u in loop.body)))
+    return sorted(res, key=lambda r : (-r[2], cfg.index(r[0])))[:top]
+
+  def summary(self, cfg, top=5):
+    total = self.steps() or 1
+    return [f'The loop at label {cfg.index(h)+1} ({cfg.cite(h)}) ran {iterations} iterations '
+            f'taking {steps} steps ({100 * steps / total:.1f}% of all steps)'
+            for h, iterations, steps in self.hottest(cfg, top)]
+
+  # The attributes visualize_cfg overlays on the graph: edges grow thicker
+  # and go from blue to red as they are taken more often (on a log scale),
+  # edges never taken are dotted, and every node is labelled with its count
+  def heat(self, cfg, top=5):
+    hottest = math.log1p(max(self.edges, default=0)) or 1
+    nodes = {i : {'xlabel' : str(count)} for i, count in enumerate(self.nodes)}
+    edges = {}
+    for i, u in enumerate(cfg):
+      for k, v in enumerate([u.exit, u.diverge if isinstance(u, CFG.CONDJUMP) else None]):
+        if v is None: continue
+        count = self.edges[2*i + k]
+        t = math.log1p(count) / hottest
+        if not count: edges[i, cfg.index(v)] = {'color' : 'gray', 'style' : 'dotted'}
+        else: edges[i, cfg.index(v)] = {'color' : f'{0.66 * (1 - t):.3f} 1.000 0.900', 'penwidth' : f'{1 + 5 * t:.2f}', 'label' : str(count)}
+    title = f'{self.fun}: {self.steps()} steps over {self.runs} run{"" if self.runs == 1 else "s"}'
+    label = '\\l'.join([title] + self.summary(cfg, top)) + '\\l'
+    return nodes, edges, label
+
+# Run the graph of function `ast` on every input tuple, counting what every
+# run does; a run that fails still counts what it did before it failed
+def record(ast, cfg, runs, calls=None, fuel=100000, accelerate=False, key=None):
+  profile = Profile(ast.node.fun, key, len(cfg))
+  machine = Machine(calls, fuel, trace=True, accelerate=accelerate)
+  for inputs in runs:
+    machine.steps = machine.skipped = 0
+    try: machine.run(cfg, {v.sym : x for v, x in zip(ast.node.inp, inputs)})
+    except ExecutionError: profile.failed += 1
+    profile.runs += 1
+  profile.add(cfg, machine.trace)
+  return profile
+
+# A profile file is a line of JSON listing the profiles in it, followed by
+# the counts of each as raw 64-bit integers in the byte order it names
+def save(profiles, file):
+  header = {'byteorder' : sys.byteorder, 'profiles' : [[p.fun, p.key, len(p), p.runs, p.failed] for p in profiles]}
+  with open(file, 'wb') as f:
+    f.write(MAGIC)
+    f.write(json.dumps(header).encode() + b'\n')
+    for p in profiles:
+      p.nodes.tofile(f); p.edges.tofile(f)
+
+def load(file):
+  with open(file, 'rb') as f:
+    if f.readline() != MAGIC: raise ValueError(f'{file} is not a profile file')
+    header, profiles = json.loads(f.readline()), {}
+    for fun, key, labels, runs, failed in header['profiles']:
+      p = Profile(fun, key, 0, runs, failed)
+      p.nodes.fromfile(f, labels); p.edges.fromfile(f, 2 * labels)
+      if header['byteorder'] != sys.byteorder: p.nodes.byteswap(); p.edges.byteswap()
+      profiles[fun] = p
+  return profiles
+
+# Test on a simple program
+if __name__ == '__main__':
+  import os, tempfile
+  from while_parser import WhileParser
+  code = """
+    def func (a b) -> (x) {
+      x := 0;
+      for i in [1 .. a] {
+        if i > 3 {x := x + i;}
+        else {
+          j := 0;
+          while j < b {j := j + 1;}
+        }
+      }
+    }
+  """
+  ast = WhileParser().parse(code)
+  cfg = CFG.construct_cfg(ast)
+  profile = record(ast, cfg, [(5, 10), (10, 100), (2, 3)])
+  with tempfile.TemporaryDirectory() as folder:
+    save([profile], os.path.join(folder, 'profile'))
+    print(os.path.getsize(os.path.join(folder, 'profile')), 'bytes')
+    again = load(os.path.join(folder, 'profile'))['func']
+  print(again.nodes.tolist(), again.edges.tolist() == profile.edges.tolist())
+  print('\n'.join(again.summary(cfg)))
+  CFG.visualize_cfg(cfg, 'cfg_profile.png', again.heat(cfg))
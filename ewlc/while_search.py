@@ -0,0 +1,178 @@
+# ------------------------------------------------------------
+# while_search.py
+#
+# Search for the inputs that make an extended WHILE program slowest
+# ------------------------------------------------------------
+import os, random
+from multiprocessing import Pool
+if __package__:
+  from . import while_cfg as CFG
+  from .while_exec import Machine, ExecutionError
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  from while_exec import Machine, ExecutionError
+
+# A run of the function on some inputs: the steps it took, the branches it
+# covered as (label, taken) pairs, the iterations of every loop it entered by
+# the label of its header, and why it stopped early if it did
+class Run(object):
+  def __init__(self, inputs, steps, branches, loops, error=None):
+    self.inputs, self.steps, self.branches, self.loops, self.error = inputs, steps, branches, loops, error
+  def __repr__(self):
+    return f'Run({self.inputs}, steps={self.steps}' + (f', error={self.error!r})' if self.error else ')')
+
+# The function a search runs: its AST and graph, the label of every node of
+# the graph, the calls of its unit, the fuel of a run and whether its loops
+# run in closed form where they can (Machine's accelerate)
+class Function(object):
+  def __init__(self, ast, cfg, calls, fuel, accelerate=False):
+    self.ast, self.cfg, self.calls, self.fuel, self.accelerate = ast, cfg, calls, fuel, accelerate
+    self.labels = {u : i+1 for i, u in enumerate(cfg)}
+
+  # The function `fun` of the unit in `code`, with the given passes run over
+  # its graph
+  @staticmethod
+  def parse(code, fun, fuel, passes=(), accelerate=False):
+    if __package__:
+      from .while_unit import parse_unit
+      from .while_calls import link
+    else:
+      from while_unit import parse_unit
+      from while_calls import link
+    calls = link(list(parse_unit(code=code)))
+    if fun not in calls.defs: raise ValueError(f'Function {fun} is undefined')
+    return Function(calls.defs[fun], lower(calls.defs[fun], passes), calls, fuel, accelerate)
+
+  def measure(self, inputs):
+    machine, error = Machine(self.calls, self.fuel, trace=True, accelerate=self.accelerate), None
+    try: machine.run(self.cfg, {v.sym : x for v, x in zip(self.ast.node.inp, inputs)})
+    except ExecutionError as e: error = str(e)
+    branches, loops = set(), {}
+    for (u, v), count in machine.trace.items():
+      if not isinstance(u, CFG.CONDJUMP) or u not in self.labels: continue
+      branches.add((self.labels[u], v is u.exit))
+      if u.loops and v is u.exit: loops[self.labels[u]] = count
+    return Run(inputs, min(machine.steps, self.fuel + machine.skipped), frozenset(branches), loops, error)
+
+def lower(ast, passes=()):
+  cfg = CFG.construct_cfg(ast)
+  if passes:
+    if __package__: from .while_opt import optimize
+    else: from while_opt import optimize
+    optimize(cfg, passes, out=ast.node.out)
+  return cfg
+
+# Pool workers are sent the text of the function and of what it calls, which
+# each parses once into a function of its own; a search in this process
+# measures its own function instead
+FUNCTION = None
+def load(code, fun, fuel, passes=(), accelerate=False):
+  global FUNCTION
+  FUNCTION = Function.parse(code, fun, fuel, passes, accelerate)
+
+def measure(inputs):
+  return FUNCTION.measure(inputs)
+
+# Hill climbing over the inputs of a function, every one of which stays in
+# [-bound, bound]. Each round mutates a batch of inputs drawn from the corpus
+# and runs it over the pool; a run joins the corpus if it covers a branch no
+# run covered before or is among the `keep` slowest, and parents are drawn
+# from the slowest runs half of the time. Runs that exhaust their fuel count
+# as taking all of it, and the search stops once a run does (unless loops
+# run in closed form, whose steps do not count against the fuel).
+#
+# The unit is its text or its linked calls; with the calls, the graph of the
+# function may be given as well, which must be the one the passes give
+class Search(object):
+  def __init__(self, unit, fun, bound, workers=None, fuel=100000, seed=0, keep=8, cfg=None, passes=(), accelerate=False):
+    self.fun, self.bound, self.fuel, self.keep, self.passes = fun, bound, fuel, keep, tuple(passes)
+    self.accelerate = accelerate
+    self.workers = os.cpu_count() if workers is None else workers
+    self.random = random.Random(seed)
+    if isinstance(unit, str): self.code, self.function = unit, Function.parse(unit, fun, fuel, passes, accelerate)
+    elif fun not in unit.defs: raise ValueError(f'Function {fun} is undefined')
+    else:
+      self.code = '\n'.join(unit.defs[f].unparse() for f in unit.reach(fun))
+      ast = unit.defs[fun]
+      self.function = Function(ast, cfg if cfg is not None else lower(ast, passes), unit, fuel, accelerate)
+    self.cfg = self.function.cfg
+    self.arity = len(self.function.ast.node.inp)
+    self.branches = 2 * sum(isinstance(u, CFG.CONDJUMP) for u in self.cfg)
+    self.covered, self.novel, self.slowest, self.runs = set(), [], [], 0
+
+  def clamp(self, x):
+    return max(-self.bound, min(self.bound, x))
+
+  def mutate(self, inputs):
+    x, k, r = list(inputs), self.random.randrange(self.arity), self.random.random()
+    if r < 0.4: x[k] += self.random.choice((-1, 1))
+    elif r < 0.7: x[k] += self.random.randint(-self.bound, self.bound) // 2
+    elif r < 0.85: x[k] = self.random.choice((-self.bound, 0, self.bound))
+    else: x[k] = self.random.randint(-self.bound, self.bound)
+    return tuple(map(self.clamp, x))
+
+  def seeds(self, batch):
+    corners = [tuple([x] * self.arity) for x in (0, self.bound, -self.bound)]
+    rest = [tuple(self.random.randint(-self.bound, self.bound) for _ in range(self.arity)) for _ in range(batch)]
+    return list(dict.fromkeys(corners + rest))[:max(batch, len(corners))]
+
+  def children(self, batch):
+    corpus = self.novel + self.slowest
+    parents = [self.random.choice(self.slowest if self.random.random() < 0.5 else corpus) for _ in range(batch)]
+    return [self.mutate(run.inputs) for run in parents]
+
+  # Slower runs first, and runs that finish before those that fail
+  def rank(self, run):
+    return (-run.steps, run.error is not None, run.inputs)
+
+  def admit(self, runs):
+    self.runs += len(runs)
+    for run in runs:
+      if run.branches - self.covered: self.novel.append(run)
+      self.covered |= run.branches
+    self.slowest = sorted(self.slowest + runs, key=self.rank)[:self.keep]
+
+  def best(self):
+    return self.slowest[0]
+
+  def measure(self, inputs):
+    return self.function.measure(inputs)
+
+  def run(self, rounds=20, batch=32):
+    if self.arity == 0: rounds, batch = 0, 1
+    if self.workers > 1:
+      with Pool(self.workers, initializer=load, initargs=(self.code, self.fun, self.fuel, self.passes, self.accelerate)) as pool:
+        self.climb(lambda xs : pool.map(measure, xs), rounds, batch)
+    else: self.climb(lambda xs : list(map(self.measure, xs)), rounds, batch)
+    return self.best()
+
+  def climb(self, evaluate, rounds, batch):
+    self.admit(evaluate(self.seeds(batch) if self.arity else [()]))
+    for _ in range(rounds):
+      if not self.accelerate and self.best().steps >= self.fuel: break # nothing can be slower
+      self.admit(evaluate(self.children(batch)))
+
+# The slowest inputs of function `fun` of the unit in `code` found within
+# the given number of rounds
+def search(code, fun, bound, rounds=20, batch=32, workers=None, fuel=100000, seed=0, accelerate=False):
+  return Search(code, fun, bound, workers, fuel, seed, accelerate=accelerate).run(rounds, batch)
+
+# Test on a simple program
+if __name__ == '__main__':
+  code = """
+    def func (a b) -> (x) {
+      x := 0;
+      for i in [a .. b] {
+        if i > 3 {x := x + i;}
+        else {
+          j := 0;
+          while j < i * i {j := j + 1;}
+        }
+      }
+    }
+  """
+  finder = Search(code, 'func', 10, workers=2)
+  best = finder.run(rounds=10)
+  print(best, f'covers {len(finder.covered)} of {finder.branches} branches in {finder.runs} runs')
+  for label, count in sorted(best.loops.items()):
+    print(f'  loop at label {label} ({finder.cfg.cite(finder.cfg[label-1])}) ran {count} iterations')
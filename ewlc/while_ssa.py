@@ -0,0 +1,186 @@
+# ------------------------------------------------------------
+# while_ssa.py
+#
+# Static single assignment form for the extended WHILE language
+# ------------------------------------------------------------
+if __package__:
+  from . import while_cfg as CFG
+  from . import while_structure as STRUCT
+  from . import while_expr as E
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+  import while_structure as STRUCT
+  import while_expr as E
+from collections import defaultdict
+
+class SSAError(Exception): pass
+
+def symbols(expr):
+  return getattr(expr, 'free_symbols', set())
+
+def rename(expr, names):
+  return expr.xreplace(names) if hasattr(expr, 'xreplace') else expr
+
+class PHI(object):
+  def __init__(self, var, node):
+    self.var, self.node = var, node
+    self.target, self.args = None, {}
+  def __repr__(self):
+    return f'{self.target} := phi({", ".join(map(str, self.args.values()))})'
+
+class SSA(object):
+  def __init__(self, cfg):
+    self.cfg, self.index = cfg, STRUCT.structure(cfg)
+    self.phis = defaultdict(dict)   # node -> {var : PHI}
+    self.code = {}                  # node -> renamed ASSIGN / CONDJUMP operands
+    self.defs = {}                  # version -> defining node or PHI (None at entry)
+    self.facts = defaultdict(dict)  # version -> facts attached by analyses
+    self.count = defaultdict(int)
+
+    # Variables are assigned at ASSIGN nodes, including the i_k / i_lim
+    # counters and the index copy introduced by desugaring FOR loops.
+    nodes = [u for u in cfg if u in self.index.dom]
+    sites, used = defaultdict(set), set()
+    for u in nodes:
+      if isinstance(u, CFG.ASSIGN):
+        sites[u.node.var].add(u)
+        used |= symbols(u.node.aexp)
+      elif isinstance(u, (CFG.CONDJUMP, CFG.MEMO)):
+        used |= symbols(u.node.cond)
+    self.vars = sorted(set(sites) | used, key=str)
+    self.place_phis(sites)
+    self.rename_all()
+
+  def version(self, var, definition):
+    n = self.count[var]; self.count[var] += 1
+    res = E.symbol(f'{var}.{n}')
+    if res in self.defs: raise SSAError(f'Version {res} is assigned twice')
+    self.defs[res] = definition
+    return res
+
+  # Phi functions go on the iterated dominance frontier of each definition
+  def place_phis(self, sites):
+    frontier = self.index.frontier
+    for var, nodes in sites.items():
+      work, placed = list(nodes), set()
+      while work:
+        u = work.pop()
+        for v in frontier[u]:
+          if v in placed: continue
+          placed.add(v); self.phis[v][var] = PHI(var, v)
+          if v not in nodes: work.append(v)
+
+  # Rename along the dominator tree, keeping a stack of versions per variable
+  def rename_all(self):
+    root, succ = self.index.dom.root, self.index.succ
+    stacks = {var : [self.version(var, None)] for var in self.vars}
+    for phi in self.phis[root].values(): phi.args[None] = stacks[phi.var][-1]
+
+    walk = [(root, None)]
+    while walk:
+      u, pushed = walk.pop()
+      if pushed is not None:
+        for var in pushed: stacks[var].pop()
+        continue
+
+      pushed = []
+      for var, phi in self.phis[u].items():
+        phi.target = self.version(var, phi)
+        stacks[var].append(phi.target); pushed.append(var)
+      names = {var : stack[-1] for var, stack in stacks.items()}
+      if isinstance(u, CFG.ASSIGN):
+        aexp = rename(u.node.aexp, names)
+        var = u.node.var
+        target = self.version(var, u)
+        stacks[var].append(target); pushed.append(var)
+        self.code[u] = (target, aexp)
+      elif isinstance(u, (CFG.CONDJUMP, CFG.MEMO)):
+        self.code[u] = (rename(u.node.cond, names),)
+
+      for v in succ[u]:
+        for var, phi in self.phis[v].items():
+          phi.args[u] = stacks[var][-1]
+      walk.append((u, pushed))
+      walk.extend((v, None) for v in reversed(self.index.dom.children[u]))
+
+  def definition(self, version):
+    return self.defs[version]
+
+  def uses(self, u):
+    return symbols(self.code[u][-1]) if u in self.code else set()
+
+  def verify(self):
+    errors = []
+    def dominated(version, u, strict):
+      d = self.defs.get(version, False)
+      if d is False: return False
+      if d is None: return True
+      d = d.node if isinstance(d, PHI) else d
+      return self.index.dominates(d, u) and not (strict and d is u and not isinstance(self.defs[version], PHI))
+
+    seen = set()
+    for u in self.code:
+      if isinstance(u, CFG.ASSIGN):
+        target = self.code[u][0]
+        if target in seen: errors.append(f'{target} is assigned twice')
+        seen.add(target)
+      for version in self.uses(u):
+        if not dominated(version, u, True):
+          errors.append(f'Use of {version} at label {self.cfg.index(u)+1} is not dominated by its definition')
+    for u, phis in self.phis.items():
+      preds = [v for v in self.index.pred[u] if v in self.index.dom]
+      if u is self.index.dom.root: preds.append(None)
+      for phi in phis.values():
+        if phi.target in seen: errors.append(f'{phi.target} is assigned twice')
+        seen.add(phi.target)
+        if set(phi.args) != set(preds):
+          errors.append(f'Phi for {phi.var} at label {self.cfg.index(u)+1} has {len(phi.args)} arguments for {len(preds)} predecessors')
+        for v, version in phi.args.items():
+          if v is not None and not dominated(version, v, False):
+            errors.append(f'Phi argument {version} at label {self.cfg.index(u)+1} is not available from label {self.cfg.index(v)+1}')
+    if errors: raise SSAError('\n'.join(errors))
+    return True
+
+  def __str__(self):
+    lines, label = [], lambda u : self.cfg.index(u)+1
+    for u in self.cfg:
+      if u not in self.index.dom: continue
+      for phi in self.phis[u].values():
+        args = ', '.join(f'{version} [{label(v) if v else "entry"}]' for v, version in phi.args.items())
+        lines.append(f'{label(u):>4}  {phi.target} := phi({args})')
+      if isinstance(u, CFG.ASSIGN):
+        target, aexp = self.code[u]
+        lines.append(f'{label(u):>4}  {target} := {aexp}')
+      elif isinstance(u, CFG.CONDJUMP):
+        lines.append(f'{label(u):>4}  if {self.code[u][0]} goto {label(u.exit)} else {label(u.diverge)}')
+      elif isinstance(u, CFG.MEMO):
+        lines.append(f'{label(u):>4}  LOOP({self.code[u][0]})')
+      else:
+        lines.append(f'{label(u):>4}  {u}')
+    return '\n'.join(lines)
+
+def construct_ssa(cfg):
+  return SSA(cfg)
+
+# Test on a simple program
+if __name__ == '__main__':
+  from while_parser import WhileParser
+  code = """
+    def func (a b c) -> (x y) {
+      x := a + 1;
+      y := b + 3;
+      if x == y {a := 4}
+      else {b := 5;}
+      while x < c {
+        x := x + y;
+        for i in [x .. b+4] {
+          y := y + i;
+        }
+      }
+    }
+  """
+  parser = WhileParser()
+  cfg = CFG.construct_cfg(parser.parse(code))
+  ssa = construct_ssa(cfg)
+  ssa.verify()
+  print(ssa)
@@ -0,0 +1,215 @@
+# ------------------------------------------------------------
+# while_structure.py
+#
+# Dominator trees and loop nesting for the extended WHILE language
+# ------------------------------------------------------------
+if __package__:
+  from . import while_cfg as CFG
+else: # run as a script, or with ewlc/ on sys.path
+  import while_cfg as CFG
+
+def structure(cfg):
+  # Computed once per graph and dropped by CFG.Graph whenever it changes
+  cache = getattr(cfg, 'cache', None)
+  if cache is None: return Structure(cfg)
+  if 'structure' not in cache: cache['structure'] = Structure(cfg)
+  return cache['structure']
+
+def postorder(root, succ):
+  order, seen, stack = [], set([root]), [(root, iter(succ[root]))]
+  while stack:
+    u, edges = stack[-1]
+    for v in edges:
+      if v not in seen:
+        seen.add(v); stack.append((v, iter(succ[v])))
+        break
+    else:
+      stack.pop(); order.append(u)
+  return order
+
+# Cooper, Harvey & Kennedy, "A Simple, Fast Dominance Algorithm"
+def immediate_dominators(root, succ, pred):
+  order = postorder(root, succ)
+  rank = {u : i for i, u in enumerate(order)}
+  def intersect(a, b):
+    while a is not b:
+      while rank[a] < rank[b]: a = idom[a]
+      while rank[b] < rank[a]: b = idom[b]
+    return a
+
+  idom, changed = {root : root}, True
+  while changed:
+    changed = False
+    for u in reversed(order[:-1]):
+      new = None
+      for v in pred[u]:
+        if v in idom: new = v if new is None else intersect(v, new)
+      if idom.get(u) is not new:
+        idom[u], changed = new, True
+  idom[root] = None
+  return idom, order
+
+class Tree(object):
+  def __init__(self, root, idom):
+    self.root, self.idom = root, idom
+    self.children = {u : [] for u in idom}
+    for u, v in idom.items():
+      if v is not None: self.children[v].append(u)
+
+    # Preorder intervals make ancestor queries constant time
+    self.enter, self.leave, clock = {}, {}, 0
+    stack = [(root, False)]
+    while stack:
+      u, done = stack.pop()
+      if done: self.leave[u] = clock; continue
+      self.enter[u] = clock; clock += 1
+      stack.append((u, True))
+      stack.extend((v, False) for v in reversed(self.children[u]))
+  def __contains__(self, u):
+    return u in self.enter
+  def __iter__(self):
+    return iter(self.enter)
+  def dominates(self, u, v):
+    if u not in self.enter or v not in self.enter: return False
+    return self.enter[u] <= self.enter[v] and self.leave[v] <= self.leave[u]
+  def subtree(self, u):
+    nodes, stack = [], [u]
+    while stack:
+      v = stack.pop(); nodes.append(v)
+      stack.extend(self.children[v])
+    return nodes
+
+class Loop(object):
+  def __init__(self, header):
+    self.header, self.body = header, set([header])
+    self.latches, self.exits, self.branches = [], [], []
+    self.parent, self.children, self.depth = None, [], 0
+  def __repr__(self):
+    return f'Loop({self.header}, size={len(self.body)}, depth={self.depth})'
+
+class Structure(object):
+  def __init__(self, cfg):
+    self.cfg = cfg
+    self.succ = {u : CFG.successors(u) for u in cfg}
+    self.pred = {u : [] for u in cfg}
+    for u in cfg:
+      for v in self.succ[u]: self.pred[v].append(u)
+
+    idom, order = immediate_dominators(cfg[0], self.succ, self.pred)
+    self.dom, self.order = Tree(cfg[0], idom), order[::-1]
+    ipdom, _ = immediate_dominators(cfg[-1], self.pred, self.succ)
+    self.postdom = Tree(cfg[-1], ipdom)
+
+    self.frontier = self.find_frontier()
+    self.back_edges = [(u, h) for u in self.order for h in self.succ[u] if self.dom.dominates(h, u)]
+    self.loops = self.find_loops()
+    self.forest = [loop for loop in self.loops.values() if loop.parent is None]
+
+    # Innermost loop of every node (outer loops are visited first)
+    self.loop_of = {}
+    for loop in sorted(self.loops.values(), key=lambda l : l.depth):
+      for u in loop.body: self.loop_of[u] = loop
+    for u in self.order:
+      if isinstance(u, CFG.CONDJUMP) and not u.loops and u in self.loop_of:
+        self.loop_of[u].branches.append(u)
+
+  def find_frontier(self):
+    frontier = {u : set() for u in self.dom}
+    for u in self.dom:
+      preds = [v for v in self.pred[u] if v in self.dom]
+      if len(preds) < 2 and u is not self.dom.root: continue
+      for v in preds:
+        while v is not None and v is not self.dom.idom[u]:
+          frontier[v].add(u); v = self.dom.idom[v]
+    return frontier
+
+  def find_loops(self):
+    lowered = self.cfg.lowered() if isinstance(self.cfg, CFG.Graph) else None
+    loops = self.lowered_loops(lowered) if lowered is not None else self.search_loops()
+
+    # Nest loops by walking down the dominator tree with a stack of open loops
+    stack, walk = [], [(self.dom.root, False)]
+    while walk:
+      u, done = walk.pop()
+      if done: stack.pop(); continue
+      if u in loops:
+        loop = loops[u]
+        for outer in reversed(stack):
+          if u in outer.body:
+            loop.parent, loop.depth = outer, outer.depth + 1
+            outer.children.append(loop)
+            break
+        stack.append(loop); walk.append((u, True))
+      walk.extend((v, False) for v in reversed(self.dom.children[u]))
+
+    for loop in loops.values():
+      loop.exits = [(u, v) for u in loop.body for v in self.succ[u] if v not in loop.body]
+    return loops
+
+  # A graph fresh from lowering comes with its loops, of which only the
+  # nodes that can be reached are kept
+  def lowered_loops(self, table):
+    loops = {}
+    for info in table:
+      h = info.header
+      if h not in self.dom: continue
+      loop = loops[h] = Loop(h)
+      loop.body.update(u for u in info.body if u in self.dom)
+      loop.latches = [u for u, v in self.back_edges if v is h]
+    return loops
+
+  # Otherwise loops are found from the back edges
+  def search_loops(self):
+    loops = {}
+    for u, h in self.back_edges:
+      loop = loops.setdefault(h, Loop(h))
+      loop.latches.append(u)
+      stack = [u]
+      while stack:
+        v = stack.pop()
+        if v in loop.body: continue
+        loop.body.add(v)
+        stack.extend(w for w in self.pred[v] if w in self.dom)
+
+    # Loop statements also own the paths in their body that end in a break,
+    # which is everything dominated by the first node of the body.
+    for h in self.order:
+      if not (isinstance(h, CFG.CONDJUMP) and h.loops): continue
+      loop = loops.setdefault(h, Loop(h))
+      if h.exit not in (h, h.diverge): loop.body.update(self.dom.subtree(h.exit))
+    return loops
+
+  def dominates(self, u, v):
+    return self.dom.dominates(u, v)
+  def postdominates(self, u, v):
+    return self.postdom.dominates(u, v)
+  def headers(self):
+    return [u for u in self.order if u in self.loops]
+
+# Test on a simple program
+if __name__ == '__main__':
+  from while_parser import WhileParser
+  code = """
+    def func (a b c) -> (x y) {
+      x := a + 1;
+      y := b + 3;
+      while true {
+        x := y;
+        for i in [x .. b+4] {
+          x := x + i;
+          if x == y {break;}
+          else {z := 1;}
+        }
+        if x < y {break;}
+      }
+    }
+  """
+  parser = WhileParser()
+  cfg = CFG.construct_cfg(parser.parse(code))
+  index = structure(cfg)
+  for h in index.headers():
+    loop = index.loops[h]
+    print(f'Loop at label {cfg.index(h)+1} (depth {loop.depth})')
+    print(f'  body: {sorted(cfg.index(u)+1 for u in loop.body)}')
+    print(f'  exits: {[(cfg.index(u)+1, cfg.index(v)+1) for u, v in loop.exits]}')
+    print(f'  back edges: {[cfg.index(u)+1 for u in loop.latches]}')
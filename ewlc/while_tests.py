@@ -5,6 +5,19 @@
 # ------------------------------------------------------------
 from while_parser import WhileParser
 from while_unparser import WhileUnparser
+from while_unit import parse_unit
+from while_calls import link, CallGraph
+from while_cfg import construct_cfg, ASSIGN
+from while_analysis import analyze, extract_BigO, Budget
+from while_cost import instrument, CostModel
+from while_exec import execute
+from while_search import Search
+from while_diff import diff
+from while_profile import record
+from while_opt import optimize
+from while_ssa import construct_ssa
+from while_cache import SummaryCache
+from while_structure import structure
 
 parser = WhileParser()
 unparser = WhileUnparser()
@@ -119,6 +132,337 @@ class positive_tests(object):
     ast = parser.parse(code)
     print(ast == parser.parse(unparser.unparse(ast)), end='\n\n')
 
+  def test_09():
+    print("Check many functions in one file work")
+    code = """
+      def f09 (a) -> (x) {
+        x := a;
+      }
+      # a broken function does not stop the others
+      def g09 (a) -> (x) {
+        x := ;
+      }
+      def h09 (a b) -> (y) {
+        y := 0;
+        for i in [a .. b] {y := y + i;}
+      }
+    """
+    unit = parse_unit(code=code, parser=parser)
+    asts = list(unit)
+    print([ast.node.fun for ast in asts] == ['f09', 'h09'] and len(unit.errors) == 1
+          and all(ast == parser.parse(unparser.unparse(ast)) for ast in asts), end='\n\n')
+
+  def test_10():
+    print("Check function calls work")
+    code = """
+      def f10 (a b) -> (x) {
+        x := a * b;
+      }
+      def g10 (a) -> (y) {
+        y := f10(a (a + 1)) + f10((f10(a 2)) 3);
+      }
+    """
+    asts = list(parse_unit(code=code, parser=parser))
+    calls = link(asts)
+    print(not calls.errors and calls.order == [['f10'], ['g10']]
+          and all(ast == parser.parse(unparser.unparse(ast)) for ast in asts), end='\n\n')
+
+  def test_11():
+    print("Check analysis budgets merge states")
+    ifs = ' '.join(f'if x == {k} {{y := y + x;}} else {{y := y * 2;}}' for k in range(6))
+    code = f'def f11 (a) -> (y) {{y := 0; x := a; {ifs}}}'
+    cfg = construct_cfg(parser.parse(code))
+    budget = Budget(states=4)
+    Os = extract_BigO(cfg[0], cfg, budget)
+    print(max(map(len, Os)) <= 4 and len(budget.report()) > 0, end='\n\n')
+
+  def test_12():
+    print("Check expressions are hash-consed")
+    code = """
+      def f12 (a b) -> (x y) {
+        x := a + 2 * b - a;
+        y := (b + b) / 1;
+      }
+    """
+    x, y = [u.node.aexp for u in construct_cfg(parser.parse(code))[:2]]
+    print(x == y and x.id == y.id and str(x) == '2*b', end='\n\n')
+
+  def test_13():
+    print("Check checking finds every error")
+    code = """
+      def f13 (a a) -> (x) {
+        x := b;
+        break;
+      }
+      def g13 (a) -> (y) {
+        y := a +;
+      }
+    """
+    errors = parse_unit(code=code).check()
+    print([line for line, error in errors] == [2, 3, 4, 7], end='\n\n')
+
+  def test_14():
+    print("Check recovery finds every error in one pass")
+    code = """
+      def f14 (a) -> (x) {
+        x := a +;
+        while x < {x := x + 1;}
+        for i in [1 .. ] {x := x + i; break;}
+        x := i;
+      }
+    """
+    ast, errors = parser.recover(code)
+    print([line for line, error in errors] == [3, 4, 5, 6]
+          and ast.unparse() == 'def f14 (a) -> (x) {x := i;}', end='\n\n')
+
+  def test_15():
+    print("Check lowering emits the loop table")
+    code = """
+      def f15 (a) -> (x) {
+        x := 0;
+        while x < a {
+          for i in [1 .. a] {
+            if i > 2 {break;}
+          }
+          x := x + 1;
+        }
+      }
+    """
+    cfg = construct_cfg(parser.parse(code))
+    outer, inner = cfg.lowered()
+    print([outer.line, inner.line] == [4, 5] and inner.parent is outer and outer.parent is None
+          and inner.depth() == 1 and len(inner.breaks) == 1 and outer.exit is cfg[-1], end='\n\n')
+
+  def test_16():
+    print("Check bytecode keeps the source line and column")
+    code = """
+def f16 (a) -> (x) {
+  x := 0;
+  for i in [1 .. a] {x := x + i;}
+}
+"""
+    cfg = construct_cfg(parser.parse(code))
+    lines, cols = cfg.spans()
+    print(list(zip(lines, cols)) == [(3, 5), (4, 3), (4, 3), (4, 3), (4, 3), (4, 3), (4, 24), (2, 1)], end='\n\n')
+
+  def test_17():
+    print("Check instrumentation counts the cost of a run")
+    code = """
+      def f17 (a) -> (x) {
+        x := 0;
+        for i in [1 .. a] {x := x + i;}
+        while x > 2 {x := x / 2;}
+      }
+    """
+    counted = instrument(parser.parse(code), CostModel(ops={'/' : 3}))
+    print(execute(counted, (3,)) == (1.5, 24) and counted.unparse() == parser.parse(counted.unparse()).unparse(), end='\n\n')
+
+  def test_18():
+    print("Check the search finds the slowest inputs")
+    code = """
+      def f18 (a b) -> (x) {
+        x := 0;
+        for i in [a .. b] {x := x + i;}
+      }
+    """
+    finder = Search(code, 'f18', 6, workers=2)
+    best = finder.run(rounds=10, batch=16)
+    print(best.inputs == (-6, 6) and best.loops == {4 : 13} and len(finder.covered) == finder.branches, end='\n\n')
+
+  def test_19():
+    print("Check affine loops run in closed form")
+    code = """
+      def f19 (n) -> (x y) {
+        x := 0;
+        y := 0;
+        for i in [1 .. n] {x := x + i; y := y + 2 * x;}
+      }
+    """
+    n = 10**15
+    print(execute(parser.parse(code), (n,), accelerate=True) == (n * (n+1) // 2, n * (n+1) * (n+2) // 3), end='\n\n')
+
+  def test_20():
+    print("Check threads parse with a single parser")
+    from concurrent.futures import ThreadPoolExecutor
+    codes = [f"def f20 (a) -> (x) {{x := a + {k}; while x < {k} {{x := x * 2;}}}}" for k in range(20)]
+    with ThreadPoolExecutor(4) as threads:
+      texts = list(threads.map(lambda code : parser.parse(code).unparse(), codes))
+    print(texts == [WhileParser().parse(code).unparse() for code in codes], end='\n\n')
+
+  def test_21():
+    print("Check loop changes between two versions of a program")
+    import os, tempfile
+    old = """
+      def f21 (a b) -> (x) {
+        x := 0;
+        for i in [1 .. a] {x := x + i;}
+        while x < b {x := x + 1;}
+      }
+    """
+    new = old.replace("x := x + 1;", "x := x * 2 + 1;").replace("x := 0;", "x := 0; for k in [a .. b] {x := x - k;}")
+    with tempfile.TemporaryDirectory() as folder:
+      files = [os.path.join(folder, name) for name in ('old.ewl', 'new.ewl')]
+      for file, code in zip(files, (old, new)):
+        with open(file, 'w') as f: f.write(code)
+      changes = diff(*files)
+    print([c.verdict for c in changes.changes] == ['added', 'unchanged', 'regressed'], end='\n\n')
+
+  def test_22():
+    print("Check execution profiles find the hottest loop")
+    code = """
+      def f22 (a b) -> (x) {
+        x := 0;
+        for i in [1 .. a] {x := x + i;}
+        for j in [1 .. b] {x := x - j;}
+      }
+    """
+    ast = parser.parse(code)
+    cfg = construct_cfg(ast)
+    profile = record(ast, cfg, [(2, 10), (3, 20)])
+    print([(cfg.index(h)+1, iterations) for h, iterations, _ in profile.hottest(cfg)] == [(10, 30), (4, 5)], end='\n\n')
+
+  def test_23():
+    print("Check callees are summarized when they are first called")
+    code = """
+      def f23 (a) -> (x) {
+        x := g23(a) + 1;
+      }
+      def g23 (a) -> (y) {
+        y := 2;
+      }
+      def h23 (a) -> (z) {
+        z := a;
+      }
+    """
+    calls, ready = CallGraph(), []
+    for ast in parse_unit(code=code, parser=parser):
+      calls.add(ast)
+      ready.append(calls.ready('f23'))
+    summary = calls.summary('f23')
+    print(ready == [False, True, True] and str(summary.value) == '[3, 3]' and calls.computed == 2
+          and 'h23' not in calls.keys and not calls.close().errors, end='\n\n')
+
+  def test_24():
+    print("Check calls take what their callee returns")
+    code = """
+      def f24 (n) -> (x) {
+        x := g24(n);
+        while x < g24((n + 1)) {x := x + 1;}
+      }
+      def g24 (a) -> (y) {
+        y := 0;
+        if a > 0 {y := a * a;}
+      }
+    """
+    calls = link(parse_unit(code=code, parser=parser))
+    cfg = construct_cfg(calls.defs['f24'])
+    x = [O[calls.defs['f24'].node.out[0].sym] for O in extract_BigO(cfg[0], cfg, calls=calls)[1]]
+    summaries = analyze(cfg, calls=calls, log=lambda *args : None, draw=False)
+    print(str(x[0]) == 'Max(0, n**2)' and summaries == {2 : {'trips' : 'Max(0, -Max(0, n**2) + Max(0, (n + 1)**2))'}}, end='\n\n')
+
+  def test_25():
+    print("Check the expression table keys every child and can be scoped")
+    from while_expr import TABLE, Table, CALL, scope, call, number, symbol
+    table = Table()
+    zero = table.find(0, table.atom(0))
+    many, none = table.find(CALL, table.atom('f'), [zero] * 256), table.find(CALL, table.atom('g'), ())
+    before = len(TABLE), len(TABLE.atoms)
+    with scope():
+      e = call('h25', [symbol('x25') + number(25)])
+      inside = len(TABLE) > before[0]
+    print(many != none and table.count[many] == 256 and table.count[none] == 0 and inside
+          and (len(TABLE), len(TABLE.atoms)) == before and str(call('h25', [number(1)])) == 'h25(1)', end='\n\n')
+
+  def test_26():
+    print("Check END stays last when optimizing bypasses the entry")
+    code = """
+      def f26 (a) -> () {
+        if false {a := a + 1; a := a * 2}
+      }
+    """
+    ast = parser.parse(code)
+    cfg = construct_cfg(ast)
+    optimize(cfg, out=ast.node.out)
+    print(len(cfg) == 1 and cfg[-1].label == 'END' and execute(ast, (3,), cfg) == (), end='\n\n')
+
+  def test_27():
+    print("Check SSA of a FOR loop nested in a WHILE loop")
+    code = """
+      def f27 (a n) -> (x) {
+        x := 0;
+        while x < n {
+          for j in [a .. n] {x := x + j;}
+          x := x + 1;
+        }
+      }
+    """
+    ssa = construct_ssa(construct_cfg(parser.parse(code)))
+    outer = [h for h, loop in ssa.index.loops.items() if loop.parent is None][0]
+    targets = [ssa.code[u][0] for u in ssa.code if isinstance(u, ASSIGN)]
+    targets += [phi.target for phis in ssa.phis.values() for phi in phis.values()]
+    print(ssa.verify() and {'j_k', 'j_lim'} <= set(map(str, ssa.phis[outer])) and len(ssa.index.loops) == 2
+          and len(targets) == len(set(targets)) and all(ssa.defs[t] is not None for t in targets), end='\n\n')
+
+  def test_28():
+    print("Check each optimizing pass rewrites the graph and keeps END last")
+    code = """
+      def f28 (a) -> (x) {
+        b := 2 * 3;
+        c := a;
+        x := c + b;
+        if b > 10 {x := 0;}
+        d := x;
+      }
+    """
+    ast = parser.parse(code)
+    cfg, steps = construct_cfg(ast), []
+    for name in ('fold', 'copy', 'prune', 'dce'):
+      optimize(cfg, [name], out=ast.node.out)
+      steps.append(str(list(cfg)) if cfg[-1].label == 'END' else None)
+    print(steps == ['[b := 6, c := a, x := c + 6, False, x := 0, d := x, END()]',
+                    '[b := 6, c := a, x := a + 6, False, x := 0, d := x, END()]',
+                    '[b := 6, c := a, x := a + 6, d := x, END()]',
+                    '[x := a + 6, END()]'] and execute(ast, (1,), cfg) == execute(ast, (1,)), end='\n\n')
+
+  def test_29():
+    print("Check edits reuse the summaries of the loops they leave alone")
+    code = """
+      def f29 (a b) -> (x) {
+        x := 0;
+        for i in [1 .. a] {x := x + i;}
+        while x < b {x := x + 1;}
+      }
+    """
+    cache, runs = SummaryCache(), []
+    for version in (code, code.replace("x := 0;", "x := 0; y := a;"), code.replace("x := x + 1;", "x := x + 2;")):
+      cache.reused, cache.recomputed = [], []
+      summaries = analyze(construct_cfg(parser.parse(version)), cache, log=lambda *args : None, draw=False)
+      fresh = analyze(construct_cfg(parser.parse(version)), log=lambda *args : None, draw=False)
+      runs.append((cache.reused, cache.recomputed, summaries == fresh))
+    print(runs == [([], [4, 8], True), ([5, 9], [], True), ([4], [8], True)], end='\n\n')
+
+  def test_30():
+    print("Check dominators, dominance frontiers and loops with a break")
+    code = """
+      def f30 (a n) -> (x) {
+        x := 0;
+        while x < n {
+          for i in [1 .. a] {
+            if i > x {break;}
+            x := x + i;
+          }
+          x := x + 1;
+        }
+      }
+    """
+    cfg = construct_cfg(parser.parse(code))
+    index, label = structure(cfg), lambda u : cfg.index(u)+1
+    idom = [label(index.dom.idom[u]) if index.dom.idom[u] is not None else None for u in cfg]
+    frontier = [sorted(map(label, index.frontier[u])) for u in cfg]
+    loops = {label(h) : sorted(map(label, loop.body)) for h, loop in index.loops.items()}
+    print(idom == [None, 1, 2, 3, 4, 5, 6, 7, 8, 5, 2]
+          and frontier == [[], [2], [2], [2], [2, 5], [5, 10], [5, 10], [5, 10], [5], [2], []]
+          and loops == {2 : [2, 3, 4, 5, 6, 7, 8, 9, 10], 5 : [5, 6, 7, 8, 9]}, end='\n\n')
 
 class negative_tests(object):
   def test_01():
@@ -222,6 +566,16 @@ class negative_tests(object):
     """
     parser.parse(code)
 
+  def test_12():
+    print("Fail check call to undefined function")
+    code = """
+      def g12 (a) -> (y) {
+        y := h12(a);
+      }
+    """
+    calls = link(parse_unit(code=code, parser=parser))
+    for line, error in calls.errors: raise error
+
 # Run test suites
 if __name__ == '__main__':
   # Run positive tests
@@ -0,0 +1,115 @@
+# ------------------------------------------------------------
+# while_unit.py
+#
+# compilation units of many functions for the extended WHILE language
+# ------------------------------------------------------------
+import mmap, re
+if __package__:
+  from .while_parser import WhileParser, WhileChecker, ParsingError
+else: # run as a script, or with ewlc/ on sys.path
+  from while_parser import WhileParser, WhileChecker, ParsingError
+
+# Only braces, comments, newlines and `def` matter for finding where one
+# function ends and the next begins, so the file is scanned rather than lexed
+SCAN = re.compile(rb'#[^\n]*|[{}\n]|(?<![A-Za-z0-9_])def(?![A-Za-z0-9_])')
+STRAY = re.compile(rb'(?:\s|#[^\n]*+)*+([^\s#])')
+
+def split_unit(data):
+  # Yield (start, end, line, stray) for every top-level `def` block in data,
+  # where stray marks text found between blocks instead of a block
+  start, line, depth, opened, gap, first = None, 1, 0, False, 0, 1
+  def stray(end):
+    found = STRAY.match(data, gap, end)
+    if not found: return None
+    return found.start(1), end, line - data[found.start(1):end].count(b'\n'), True
+
+  for match in SCAN.finditer(data):
+    token = match.group()
+    if token == b'\n': line += 1
+    elif token == b'def':
+      # def is reserved, so it starts a new function even inside open braces
+      if start is not None: yield start, match.start(), first, False
+      elif stray(match.start()): yield stray(match.start())
+      start, first, opened, depth = match.start(), line, False, 0
+    elif token == b'{':
+      depth += 1; opened = True
+    elif token == b'}':
+      depth = max(depth - 1, 0)
+      if depth == 0 and opened and start is not None:
+        yield start, match.end(), first, False
+        start, gap = None, match.end()
+  if start is not None: yield start, len(data), first, False
+  elif stray(len(data)): yield stray(len(data))
+
+# A function may start part way into a line, which shifts the columns of
+# its first line
+def column(data, start):
+  return start - data.rfind(b'\n', 0, start)
+
+class CompilationUnit(object):
+  def __init__(self, file=None, code=None, parser=None):
+    self.file, self.code, self.parser = file, code, parser
+    self.errors = []
+
+  def read(self):
+    if self.file is None:
+      yield self.code.encode() if isinstance(self.code, str) else self.code
+      return
+    with open(self.file, 'rb') as file:
+      try:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data: yield data
+      except ValueError: # empty files cannot be mapped
+        yield b''
+
+  # Parse lazily, one function at a time; every error of a broken function
+  # is recorded in self.errors in a single pass over it, and parsing
+  # continues with the next one
+  def __iter__(self):
+    parser = self.parser if self.parser is not None else WhileParser()
+    for data in self.read():
+      for start, end, line, stray in split_unit(data):
+        if stray:
+          self.errors.append((line, ParsingError(f'Text at line {line} is outside of a function', line)))
+          continue
+        ast, errors = parser.recover(bytes(data[start:end]).decode(), lineno=line, col=column(data, start))
+        if errors: self.errors += errors
+        else: yield ast
+
+  # Check every function against the grammar and the scoping rules without
+  # building any AST, collecting all of their errors
+  def check(self, checker=None):
+    checker = checker if checker is not None else WhileChecker()
+    for data in self.read():
+      for start, end, line, stray in split_unit(data):
+        if stray:
+          self.errors.append((line, ParsingError(f'Text at line {line} is outside of a function', line)))
+        else:
+          self.errors += checker.parse(bytes(data[start:end]).decode(), lineno=line, col=column(data, start))
+    return self.errors
+
+def parse_unit(file=None, code=None, parser=None):
+  return CompilationUnit(file, code, parser)
+
+# Test on a simple program
+if __name__ == '__main__':
+  code = """
+    def f (a) -> (x) {
+      x := a + 1;
+    }
+    # the next function is broken twice
+    def g (a) -> (y) {
+      y := a +;
+      z := b;
+    }
+    def h (a b) -> (z) {
+      z := 0;
+      for i in [a .. b] {z := z + i;}
+    }
+  """
+  unit = parse_unit(code=code)
+  for ast in unit:
+    print(ast.node.fun, '->', ast.unparse())
+  for line, error in unit.errors:
+    print(f'{type(error).__name__} at {line}:{error.col}: {error}')
+  for line, error in parse_unit(code=code + 'def k (a) -> (x) {x := b; break; y := a;}').check():
+    print(f'{line}:{error.col}: {error}')
@@ -4,7 +4,10 @@
 # unparser for the extended WHILE language
 # ------------------------------------------------------------
 # The unparser is part of the AST :D
-from while_ast import unparse as _unparse
+if __package__:
+  from .while_ast import unparse as _unparse
+else: # run as a script, or with ewlc/ on sys.path
+  from while_ast import unparse as _unparse
 
 class WhileUnparser(object):
   def unparse(self, ast):